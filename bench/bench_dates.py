@@ -0,0 +1,62 @@
+"""
+Times the vectorized date processors against their row-by-row versions
+
+    python -m bench.bench_dates --rows 1000000
+"""
+import time
+from datetime import datetime
+from pathlib import Path
+
+import click
+import numpy as np
+import pandas as pd
+from exifread.classes import IfdTag
+
+from cleanup.df.utils import scan_date, scan_pathdate
+from cleanup.processing import ConvertIfdTag, DateSelector
+
+
+def make_df(rows, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp('2005-01-01') + pd.to_timedelta(rng.integers(0, 5000, rows), unit='D')
+    text = dates.strftime('%Y:%m:%d 12:00:00')
+    folders = dates.strftime('%Y-%m-%d')
+    tags = [IfdTag(t, 0x132, 2, t, 0, len(t)) if keep else None for t, keep in zip(text, rng.random(rows) > .3)]
+    return pd.DataFrame({
+        'path': [Path('Pictures') / (f if keep else 'misc') / f'IMG_{i}.jpg'
+                 for i, (f, keep) in enumerate(zip(folders, rng.random(rows) > .5))],
+        'Image DateTime': tags,
+    })
+
+
+def timed(label, func, *args):
+    start = time.perf_counter()
+    res = func(*args)
+    print(f'{label}'.ljust(40) + f'{time.perf_counter() - start:.2f} s')
+    return res
+
+
+@click.command()
+@click.option('--rows', default=1_000_000, help='number of rows to generate')
+@click.option('--row-wise/--no-row-wise', default=True, help='also time the row by row versions')
+def main(rows, row_wise):
+    df = make_df(rows)
+    proc = ConvertIfdTag(cols=('Image DateTime',))
+    selector = DateSelector(['Image DateTime', 'pathdate'])
+    print(f'{rows} rows')
+
+    if row_wise:
+        ref = df.copy()
+        timed('ConvertIfdTag (row-wise)', lambda: ref['Image DateTime'].apply(proc.convert, formats=proc.formats))
+        timed('scan_pathdate (row-wise)', lambda: ref['path'].apply(lambda p: scan_date(p) or pd.NaT))
+        ref['pathdate'] = scan_pathdate(ref)
+        ref['Image DateTime'] = ConvertIfdTag.convert_series(ref['Image DateTime'], proc.formats)
+        timed('DateSelector (row-wise)', lambda: ref.apply(selector.select_from_row, cols=selector.source_cols, axis=1))
+
+    df = timed('ConvertIfdTag', proc.process, df)
+    df['pathdate'] = timed('scan_pathdate', scan_pathdate, df)
+    timed('DateSelector', selector.process, df)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Times the pipeline stage by stage on synthetic archives and appends the results to a JSON lines file
+
+    python -m bench.run --sizes 10000 --sizes 100000 --sizes 1000000 --out bench/results.jsonl
+
+Each result records the commit it was measured on, so results files can be compared across commits.
+"""
+import json
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import click
+import pandas as pd
+
+from cleanup.df import stat_df
+from cleanup.processing import BaseFilenameMaker, ConvertIfdTag, DateSelector, DestinationGenerator, \
+    FileIncluder, FolderExcluder, MinFileSize, ParentCol, ProcessChain, ScanPathDate, UniqueIDer
+from . import synth
+
+
+def make_chain() -> ProcessChain:
+    return ProcessChain([
+        FolderExcluder(synth.EXCLUDED),
+        FileIncluder(['.jpg']),
+        MinFileSize(50000),
+        ParentCol(),
+        BaseFilenameMaker([r'(?P<trim>_\d+)$']),
+        ConvertIfdTag(cols=('Image DateTime',)),
+        ScanPathDate(),
+        DateSelector(['Image DateTime', 'pathdate', 'st_mtime']),
+        UniqueIDer(['included_folder', 'included_filetype', 'above_min_filesize'], ['filename', 'st_size']),
+        DestinationGenerator('dest'),
+    ])
+
+
+def commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=Path(__file__).parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(func, *args, memory=True):
+    """
+    :return: (result, seconds, peak bytes allocated while running func or None)
+    """
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        res = func(*args)
+        seconds = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] if memory else None
+    finally:
+        if memory:
+            tracemalloc.stop()
+    return res, seconds, peak
+
+
+class Recorder:
+    def __init__(self, out, memory=True):
+        self.out = Path(out) if out is not None else None
+        self.memory = memory
+        self.common = {'commit': commit(), 'time': datetime.now().isoformat(timespec='seconds'),
+                       'python': platform.python_version(), 'pandas': pd.__version__}
+
+    def run(self, stage, name, rows, func, *args):
+        res, seconds, peak = measure(func, *args, memory=self.memory)
+        record = dict(self.common, stage=stage, name=name, rows=rows, seconds=round(seconds, 4),
+                      peak_mb=round(peak / 2 ** 20, 1) if peak is not None else None)
+        print(f'{stage:<10}{name:<40}{rows:>10}{seconds:>10.2f} s' +
+              (f'{record["peak_mb"]:>10.1f} MB' if peak is not None else ''))
+        if self.out is not None:
+            with self.out.open('a') as file:
+                file.write(json.dumps(record) + '\n')
+        return res
+
+
+def bench_scan(rec: Recorder, files: int, workers: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = synth.make_tree(tmp, files)
+        n = len(paths)
+        rec.run('scan', 'stat_df os', n, lambda: stat_df(tmp, min_size=None, workers=workers))
+        rec.run('scan', 'stat_df os+exif', n, lambda: stat_df(tmp, min_size=None, exif_meta=True, workers=workers))
+        rec.run('scan', 'stat_df os+fast exif', n,
+                lambda: stat_df(tmp, min_size=None, exif_meta=True, fast_exif=True, workers=workers))
+
+
+def bench_processing(rec: Recorder, rows: int):
+    chain = make_chain()
+    df = synth.make_df(rows)
+    rec.run('chain', 'process_all', rows, chain.process_all, df.copy())
+
+    # each processor gets the output of the ones before it, like in the chain
+    for p in chain.processors:
+        df = rec.run('processor', type(p).__name__, rows, p.process, df)
+
+
+@click.command()
+@click.option('--sizes', multiple=True, type=int, default=[10_000, 100_000, 1_000_000], help='rows to process')
+@click.option('--tree-files', default=2000, help='files in the tree written for the scan benchmark, 0 to skip it')
+@click.option('--workers', default=8, help='workers for the scan')
+@click.option('--out', default='bench/results.jsonl', help='JSON lines file the results are appended to')
+@click.option('--memory/--no-memory', default=True, help='trace the peak memory, which slows everything down')
+def main(sizes, tree_files, workers, out, memory):
+    rec = Recorder(out, memory)
+    if tree_files:
+        bench_scan(rec, tree_files, workers)
+    for rows in sizes:
+        bench_processing(rec, rows)
+
+
+if __name__ == '__main__':
+    main()
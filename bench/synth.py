@@ -0,0 +1,144 @@
+"""
+Synthetic photo archives for the benchmarks and tests
+
+:func:`make_tree` writes a folder tree to disk, :func:`make_df` builds the DataFrame that scanning such a tree would
+produce, for sizes that would take too long to write out as files.
+"""
+import os
+import shutil
+import struct
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from exifread.classes import IfdTag
+
+EXCLUDED = ['.thumbnails', 'Recycle Bin']
+DUPLICATES = ['backup', 'phone']
+
+
+def _ifd(entries, offset: int, next_ifd: int = 0):
+    """
+    Packs a little endian IFD that starts at offset
+
+    :param entries: list of (tag, type, count, value) where value is an int for LONG fields or ASCII bytes
+    :return: IFD bytes followed by the data that doesn't fit in the entries
+    """
+    data_offset = offset + 2 + 12 * len(entries) + 4
+    head, data = struct.pack('<H', len(entries)), b''
+    for tag, typ, count, value in entries:
+        if isinstance(value, bytes):
+            head += struct.pack('<HHLL', tag, typ, count, data_offset + len(data))
+            data += value
+        else:
+            head += struct.pack('<HHLL', tag, typ, count, value)
+    return head + struct.pack('<L', next_ifd) + data
+
+
+def jpeg_bytes(date: datetime = None, size: int = 0) -> bytes:
+    """
+    Makes a minimal JPEG with an EXIF segment, which is all the metadata readers look at
+
+    :param date: written as Image DateTime and EXIF DateTimeOriginal, None for a file without EXIF data
+    :param size: pad the file to this many bytes
+    """
+    res = b'\xff\xd8'
+    if date is not None:
+        text = date.strftime('%Y:%m:%d %H:%M:%S').encode('ascii') + b'\x00'
+        # IFD0 holds DateTime and the pointer to the EXIF IFD with DateTimeOriginal, which goes right after IFD0
+        exif_offset = 8 + len(_ifd([(0x0132, 2, len(text), text), (0x8769, 4, 1, 0)], 8))
+        ifd0 = _ifd([(0x0132, 2, len(text), text), (0x8769, 4, 1, exif_offset)], 8)
+        tiff = b'II*\x00' + struct.pack('<L', 8) + ifd0 + _ifd([(0x9003, 2, len(text), text)], exif_offset)
+        app1 = b'Exif\x00\x00' + tiff
+        res += b'\xff\xe1' + struct.pack('>H', len(app1) + 2) + app1
+    res += b'\xff\xd9'
+    return res + b'\x00' * max(size - len(res), 0)
+
+
+def make_tree(root, files=1000, dup_rate=.2, exclude_rate=.05, other_rate=.05, no_exif_rate=.1, seed=0,
+              sizes=(20000, 200000), start='2005-01-01', days=5000) -> list:
+    """
+    Writes a synthetic photo archive to root
+
+    The originals go to ``root/<year>/<year-month-day>/IMG_<n>.jpg``. A fraction of them are copied into one of the
+    :data:`DUPLICATES` folders under a flat name, some are put into one of the :data:`EXCLUDED` folders, and some
+    other files (``.txt``) are mixed in.
+
+    :param root: folder to write to, created if needed
+    :param files: number of original files
+    :param dup_rate: fraction of the originals that get a duplicate copy
+    :param exclude_rate: fraction of the originals written to an excluded folder
+    :param other_rate: fraction of non image files
+    :param no_exif_rate: fraction of the images without EXIF data
+    :param seed: seed of the random generator
+    :param sizes: range of the file sizes in bytes
+    :param start: first date of the archive
+    :param days: number of days the archive spans
+    :return: list of the paths that were written
+    """
+    root = Path(root)
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp(start) + pd.to_timedelta(rng.integers(0, days, files), unit='D') \
+        + pd.to_timedelta(rng.integers(0, 86400, files), unit='s')
+    sizes = rng.integers(sizes[0], sizes[1], files)
+    kind = rng.random(files)
+    written = []
+
+    for i, (date, size, k) in enumerate(zip(dates.to_pydatetime(), sizes, kind)):
+        if k < exclude_rate:
+            folder = root / EXCLUDED[i % len(EXCLUDED)] / date.strftime('%Y')
+        else:
+            folder = root / date.strftime('%Y') / date.strftime('%Y-%m-%d')
+        folder.mkdir(parents=True, exist_ok=True)
+
+        if k > 1 - other_rate:
+            path = folder / f'notes_{i}.txt'
+            path.write_bytes(b'x' * int(size))
+        else:
+            path = folder / f'IMG_{i:05d}.jpg'
+            path.write_bytes(jpeg_bytes(date if rng.random() > no_exif_rate else None, int(size)))
+            if rng.random() < dup_rate:
+                dup = root / DUPLICATES[i % len(DUPLICATES)] / f'IMG_{i:05d}.jpg'
+                dup.parent.mkdir(parents=True, exist_ok=True)
+                shutil.copy2(path, dup)
+                written.append(dup)
+        os.utime(path, (date.timestamp(), date.timestamp()))
+        written.append(path)
+    return written
+
+
+def make_df(rows, dup_rate=.2, exclude_rate=.05, other_rate=.05, no_exif_rate=.1, seed=0) -> pd.DataFrame:
+    """
+    Builds the DataFrame that :func:`cleanup.df.stat_df` would return for an archive like the ones from
+    :func:`make_tree`, with EXIF dates as ``IfdTag`` objects like :func:`cleanup.df.utils.read_exif` gives
+
+    :param rows: number of rows, duplicates included
+    """
+    rng = np.random.default_rng(seed)
+    originals = int(rows / (1 + dup_rate))
+    dates = pd.Timestamp('2005-01-01') + pd.to_timedelta(rng.integers(0, 5000 * 86400, originals), unit='s')
+    sizes = rng.integers(20000, 200000, originals).astype(float)
+    kind = rng.random(originals)
+    excluded = pd.Series(np.array(EXCLUDED)[np.arange(originals) % len(EXCLUDED)])
+    folders = pd.Series(dates.strftime('%Y/%Y-%m-%d')).where(kind >= exclude_rate, excluded + dates.strftime('/%Y'))
+    names = pd.Series([f'IMG_{i:05d}.jpg' for i in range(originals)]).where(
+        kind <= 1 - other_rate, pd.Series([f'notes_{i}.txt' for i in range(originals)]))
+
+    # duplicates keep the name, size and time of their original
+    dups = rng.choice(originals, rows - originals, replace=False) if rows > originals else np.array([], dtype=int)
+    dup_folders = pd.Series(np.array(DUPLICATES)[dups % len(DUPLICATES)])
+    idx = np.concatenate([np.arange(originals), dups])
+    folders = pd.concat([folders, dup_folders], ignore_index=True)
+    names = names.iloc[idx].reset_index(drop=True)
+
+    text = pd.Series(dates.strftime('%Y:%m:%d %H:%M:%S')).iloc[idx].reset_index(drop=True)
+    has_exif = (rng.random(idx.shape[0]) > no_exif_rate) & names.str.endswith('.jpg').to_numpy()
+    return pd.DataFrame({
+        'filename': names,
+        'path': [Path(f) / n for f, n in zip(folders, names)],
+        'st_size': sizes[idx],
+        'st_mtime': dates[idx],
+        'st_ctime': dates[idx],
+        'Image DateTime': [IfdTag(t, 0x132, 2, t, 0, len(t)) if e else None for t, e in zip(text, has_exif)],
+    })
@@ -1,6 +1,31 @@
-from . import log
-from . import processing
-from .df.statdf import stat_df, stat_df_yaml
-from .df.utils import scan_pathdate
-from .processing.chain import ProcessChain
-from .processing.unique import UniqueIDer
+"""
+The submodules and the names below are imported on first use, so that e.g. ``cleanup.log`` or ``cleanup.transfer``
+can be used without paying for pandas.
+"""
+import importlib
+
+_LAZY = {
+    'stat_df': '.df.statdf',
+    'stat_df_yaml': '.df.statdf',
+    'scan_pathdate': '.df.utils',
+    'ProcessChain': '.processing.chain',
+    'UniqueIDer': '.processing.unique',
+}
+_SUBMODULES = ['cli', 'df', 'log', 'logindex', 'mover', 'pipeline', 'processing', 'transfer', 'utils', 'watch']
+
+__all__ = list(_LAZY) + _SUBMODULES
+
+
+def __getattr__(name):
+    if name in _LAZY:
+        value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module(f'.{name}', __name__)
+    else:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,150 @@
+"""
+Command line interface, installed as the ``cleanup`` command
+
+Each command imports what it needs when it runs, so the commands that don't touch DataFrames (``grep``, ``pull``)
+start without loading pandas.
+"""
+import logging
+from pathlib import Path
+
+import click
+
+from . import log
+
+LEVELS = [logging.WARNING, logging.INFO, logging.DEBUG]
+# same as cleanup.pipeline.STAGES, repeated to keep the startup light
+STAGES = ['scan', 'process', 'transfer']
+
+
+@click.group()
+@click.option('--log-file', type=click.Path(dir_okay=False), help='file to write the log to')
+@click.option('--append/--overwrite', default=False, help='append to the log file')
+@click.option('--structured', is_flag=True, help='write the log file as JSON lines')
+@click.option('-v', '--verbose', count=True, help='log INFO (-v) or DEBUG (-vv) messages to stdout')
+def main(log_file, append, structured, verbose):
+    """
+    Cleans up large quantities of files
+    """
+    log.configure(log_file, append, LEVELS[min(verbose, len(LEVELS) - 1)], structured=structured, queue=True)
+
+
+@main.command()
+@click.argument('logfile', type=click.Path(exists=True, dir_okay=False))
+@click.argument('text', nargs=-1, required=True)
+def grep(logfile, text):
+    """
+    Prints the lines of a log file that contain all of TEXT
+    """
+    for line in log.filter(log.line_gen(logfile), list(text)):
+        click.echo(line)
+
+
+@main.command()
+@click.argument('host')
+@click.argument('port', type=int)
+@click.argument('dest', type=click.Path(file_okay=False))
+@click.option('--phone-path', help='folder on the phone to download from')
+@click.option('--ext', default='jpg', show_default=True, help='extension of the files to download')
+@click.option('--user', default='android', show_default=True)
+@click.option('--passwd', default='android', show_default=True)
+@click.option('--connections', default=4, show_default=True, help='parallel downloads')
+@click.option('--manifest', type=click.Path(dir_okay=False), help='JSON lines record of the listing and downloads')
+@click.option('--refresh', is_flag=True, help='list the phone again even if the manifest has a complete listing')
+def pull(host, port, dest, phone_path, ext, user, passwd, connections, manifest, refresh):
+    """
+    Downloads files from a phone's FTP server into DEST
+    """
+    from .transfer import pull_parallel
+    counts = pull_parallel(host, port, dest, phone_path, ext, user, passwd, connections,
+                           manifest=manifest, refresh=refresh)
+    click.echo(', '.join(f'{k}: {v}' for k, v in counts.items()))
+
+
+@main.command()
+@click.argument('source', type=click.Path(exists=True, file_okay=False))
+@click.argument('out', type=click.Path(dir_okay=False))
+@click.option('--min-size', default=50000, show_default=True, help='skip files up to this many bytes')
+@click.option('--exif/--no-exif', default=True, help='read the EXIF data of the files')
+@click.option('--fast-exif', is_flag=True, help='only read the EXIF date tags, with the built in parser')
+@click.option('--workers', type=int,
+              help='threads for reading the files, 8 by default, or with --async-io the most calls in flight, 256 by '
+                   'default')
+@click.option('--cache', type=click.Path(dir_okay=False), help='metadata cache database')
+@click.option('--async-io', is_flag=True, help='keep many reads in flight with asyncio, for network shares')
+@click.option('--per-mount', default=64, show_default=True,
+              help='with --async-io, the most calls in flight on one mount')
+def scan(source, out, min_size, exif, fast_exif, workers, cache, async_io, per_mount):
+    """
+    Scans SOURCE and saves the DataFrame to OUT, a .pkl, .parquet or .feather file
+    """
+    from .df import stat_df
+    if workers is None and not async_io:
+        workers = 8
+    df = stat_df(source, min_size=min_size, exif_meta=exif, fast_exif=fast_exif, workers=workers, cache=cache,
+                 async_io=async_io, per_mount=per_mount)
+    save(df, out)
+    click.echo(f'{df.shape[0]} files')
+
+
+@main.command()
+@click.argument('source', type=click.Path(exists=True, file_okay=False))
+@click.argument('config', type=click.Path(exists=True, dir_okay=False))
+@click.option('--polling', is_flag=True, help='poll the folder instead of using inotify')
+@click.option('--interval', default=5., show_default=True, help='seconds between polls')
+@click.option('--fast-exif', is_flag=True, help='only read the EXIF date tags, with the built in parser')
+@click.option('--workers', default=8, show_default=True, help='threads for reading the files')
+def watch(source, config, polling, interval, fast_exif, workers):
+    """
+    Keeps the processing of CONFIG applied to the files in SOURCE, see cleanup.watch
+    """
+    from .processing.chain import ProcessChain
+    from .watch import watch
+    watch(source, ProcessChain.from_yaml(config), polling=polling or None, interval=interval,
+          exif_meta=True, fast_exif=fast_exif, workers=workers)
+
+
+@main.command()
+@click.argument('config', type=click.Path(exists=True, dir_okay=False))
+@click.option('--stage', 'stages', multiple=True, type=click.Choice(STAGES),
+              help='only run these stages, the others are taken from their checkpoints')
+@click.option('--force', multiple=True, type=click.Choice(STAGES), help='rerun these stages even if checkpointed')
+@click.option('--work-dir', type=click.Path(file_okay=False), help='folder for the checkpoints, overrides the config')
+@click.option('--workers', type=int, help='threads for scanning and transferring, overrides the config')
+@click.option('--processes', type=int, help='processes for the row local processors')
+@click.option('--memory-limit', type=int, help='MB the processing should stay under, by processing in chunks')
+@click.option('--format', 'fmt', type=click.Choice(['parquet', 'feather', 'pickle']),
+              help='format of the checkpoints, defaults to parquet if pyarrow is installed')
+@click.option('--dry-run', is_flag=True, help='stop before transferring any files')
+def run(config, stages, force, work_dir, workers, processes, memory_limit, fmt, dry_run):
+    """
+    Runs scan -> processing -> transfer as set up in CONFIG, see cleanup.pipeline
+
+    Stages that have a checkpoint in the work folder aren't run again, so for a nightly run over a changing folder
+    use --force scan. Files that were already transferred are skipped through the transfer journal.
+    """
+    from .pipeline import Pipeline
+    kwargs = dict(work_dir=work_dir, workers=workers, processes=processes,
+                  memory_limit=memory_limit * 2 ** 20 if memory_limit else None)
+    if fmt is not None:
+        kwargs['fmt'] = fmt
+    pipeline = Pipeline.from_yaml(config, **kwargs)
+    try:
+        status = pipeline.run(list(stages) or None, list(force), dry_run)
+    except Exception as e:
+        logging.getLogger(__name__).exception(repr(e))
+        raise click.ClickException(repr(e))
+    for stage, info in status.items():
+        click.echo(f'{stage}: ' + ', '.join(f'{k}: {v}' for k, v in info.items()))
+
+
+def save(df, path):
+    path = Path(path)
+    if path.suffix == '.pkl':
+        df.to_pickle(path)
+    else:
+        from .df import store
+        store.save_df(df, path)
+
+
+if __name__ == '__main__':
+    main()
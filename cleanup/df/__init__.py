@@ -1,2 +1,30 @@
-from .statdf import stat_df
-from .utils import scan_pathdate, scan_date
\ No newline at end of file
+import importlib
+
+_LAZY = {
+    'ascan_df': '.ascan',
+    'MetadataCache': '.cache',
+    'read_exif_fast': '.exif',
+    'compact_paths': '.paths',
+    'scan_df': '.scan',
+    'walk': '.scan',
+    'stat_df': '.statdf',
+    'save_df': '.store',
+    'load_df': '.store',
+    'convert_pickles': '.store',
+    'scan_pathdate': '.utils',
+    'scan_date': '.utils',
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
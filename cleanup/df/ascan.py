@@ -0,0 +1,236 @@
+"""
+Asyncio version of :func:`~cleanup.df.scan.scan_df` for folders on network shares
+
+On an SMB/NFS mount every listing, ``stat()`` and EXIF header read waits for a round trip to the server, so a scan
+spends most of its time waiting. Here the blocking calls run in a large thread pool, driven by an event loop that
+keeps up to ``max_inflight`` of them outstanding at once:
+
+* folders are listed by a set of tasks that feed the files they find into a bounded queue, which holds the listing
+  back (backpressure) when the file tasks can't keep up
+* the file tasks stat each file and read its EXIF header if it's big enough
+* every call holds a semaphore of the mount point the file is on, so no single server gets more than ``per_mount``
+  requests at a time, however many mounts the scan spans
+
+The file system calls go through a :class:`LocalFS`, which :class:`LatencyFS` wraps to add an artificial delay, so
+the behaviour on a slow share can be tried out on a local folder.
+"""
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import exifread
+import pandas as pd
+
+from .exif import read_exif_fast
+from .scan import build_df
+from .utils import read_exif, stat_dict
+
+LOGGER = logging.getLogger(__name__)
+
+
+class LocalFS:
+    """
+    The blocking file system calls made by :func:`scan_async`, each of which is run in an executor thread
+    """
+    def listdir(self, folder: str) -> List[Tuple[str, bool]]:
+        """
+        :return: (path, is folder) of the entries of folder, without the files that have no extension
+        """
+        res = []
+        with os.scandir(folder) as it:
+            for entry in it:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        res.append((entry.path, True))
+                    elif '.' in entry.name and entry.is_file():
+                        res.append((entry.path, False))
+                except OSError as e:
+                    LOGGER.exception(repr(e))
+        return res
+
+    def stat(self, path: str) -> os.stat_result:
+        return os.stat(path)
+
+    def read_exif(self, path: str, stop_tag=exifread.DEFAULT_STOP_TAG, fast: bool = False) -> dict:
+        return read_exif_fast(Path(path)) if fast else read_exif(Path(path), stop_tag)
+
+    def ismount(self, folder: str) -> bool:
+        return os.path.ismount(folder)
+
+    def mount(self, folder: str) -> str:
+        """
+        :return: the mount point that folder is on
+        """
+        path = os.path.abspath(folder)
+        while not self.ismount(path):
+            parent = os.path.dirname(path)
+            if parent == path:
+                break
+            path = parent
+        return path
+
+
+class LatencyFS(LocalFS):
+    """
+    A :class:`LocalFS` that blocks for ``latency`` seconds before every call, like a network share would, and keeps
+    track of how many calls were running at the same time on each mount
+
+    :param latency: seconds every call takes at least
+    :param mounts: folders to treat as mount points, in addition to the real ones
+    """
+    def __init__(self, latency: float = .005, mounts=()):
+        self.latency = latency
+        self.mounts = {os.path.abspath(m) for m in mounts}
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.active: Dict[str, int] = {}
+        self.peak: Dict[str, int] = {}
+
+    def delay(self, path: str):
+        path = os.path.abspath(path)
+        # the longest mount that path is in, by whole folder names so '/x/a' doesn't take '/x/ab'
+        key = max((m for m in self.mounts if path == m or path.startswith(m.rstrip(os.sep) + os.sep)),
+                  key=len, default='')
+        with self.lock:
+            self.calls += 1
+            self.active[key] = self.active.get(key, 0) + 1
+            self.peak[key] = max(self.peak.get(key, 0), self.active[key])
+        try:
+            time.sleep(self.latency)
+        finally:
+            with self.lock:
+                self.active[key] -= 1
+
+    def listdir(self, folder: str) -> List[Tuple[str, bool]]:
+        self.delay(folder)
+        return super().listdir(folder)
+
+    def stat(self, path: str) -> os.stat_result:
+        self.delay(path)
+        return super().stat(path)
+
+    def read_exif(self, path: str, stop_tag=exifread.DEFAULT_STOP_TAG, fast: bool = False) -> dict:
+        self.delay(path)
+        return super().read_exif(path, stop_tag, fast)
+
+    def ismount(self, folder: str) -> bool:
+        return os.path.abspath(folder) in self.mounts or super().ismount(folder)
+
+
+async def scan_async(source,
+                     min_size=50000,
+                     os_meta=True,
+                     exif_meta=False,
+                     stop_tag=exifread.DEFAULT_STOP_TAG,
+                     fast_exif=False,
+                     fs: LocalFS = None,
+                     max_inflight: int = 256,
+                     per_mount: int = 64,
+                     listers: int = 16,
+                     queue_size: int = 1024) -> pd.DataFrame:
+    """
+    Scans one or more folders with up to max_inflight file system calls outstanding at once
+
+    :param source: top level folder, or a list of them
+    :param min_size: files need to be bigger than this (in bytes) to be included
+    :param os_meta: include the os stats as columns
+    :param exif_meta: include the EXIF tags as columns
+    :param stop_tag: passed through to :func:`exifread.process_file`
+    :param fast_exif: read only the date, dimension and camera tags with :func:`~cleanup.df.exif.read_exif_fast`
+    :param fs: file system to go through, defaults to :class:`LocalFS`
+    :param max_inflight: threads running file system calls, the most calls that can be outstanding at once
+    :param per_mount: most calls outstanding at once on a single mount point
+    :param listers: tasks listing folders
+    :param queue_size: files that can wait between the listing and the stat/EXIF reads before the listing pauses
+    :return: DataFrame with the same columns as :func:`~cleanup.df.scan.scan_df`, sorted by path
+    """
+    fs = fs or LocalFS()
+    sources = [source] if isinstance(source, (str, os.PathLike)) else list(source)
+    loop = asyncio.get_running_loop()
+    limits: Dict[str, asyncio.Semaphore] = {}
+    results = []
+
+    with ThreadPoolExecutor(max_workers=max_inflight, thread_name_prefix='ascan') as pool:
+        async def call(mount, func, *args):
+            if mount not in limits:
+                limits[mount] = asyncio.Semaphore(per_mount)
+            async with limits[mount]:
+                return await loop.run_in_executor(pool, func, *args)
+
+        folders = asyncio.Queue()
+        files = asyncio.Queue(maxsize=queue_size)
+        for folder in map(os.fspath, sources):
+            folders.put_nowait((folder, await loop.run_in_executor(pool, fs.mount, folder)))
+
+        async def list_folders():
+            while True:
+                folder, mount = await folders.get()
+                try:
+                    entries = await call(mount, fs.listdir, folder)
+                    subfolders = [path for path, is_dir in entries if is_dir]
+                    mounts = await asyncio.gather(*(call(mount, fs.ismount, path) for path in subfolders))
+                    for path, is_mount in zip(subfolders, mounts):
+                        folders.put_nowait((path, path if is_mount else mount))
+                    for path, is_dir in entries:
+                        if not is_dir:
+                            await files.put((path, mount))
+                except OSError as e:
+                    LOGGER.exception(repr(e))
+                finally:
+                    folders.task_done()
+
+        async def read_files():
+            while True:
+                item = await files.get()
+                if item is None:
+                    return
+                path, mount = item
+                try:
+                    st = stat_dict(await call(mount, fs.stat, path))
+                    if min_size is not None and st['st_size'] <= min_size:
+                        continue
+                    exif = await call(mount, fs.read_exif, path, stop_tag, fast_exif) if exif_meta else None
+                    results.append((path, st, exif))
+                except OSError as e:
+                    LOGGER.exception(repr(e))
+
+        LOGGER.info(f'scanning {sources} with {max_inflight} calls in flight, {per_mount} per mount')
+        start = time.perf_counter()
+        list_tasks = [asyncio.create_task(list_folders()) for _ in range(listers)]
+        read_tasks = [asyncio.create_task(read_files()) for _ in range(max_inflight)]
+        try:
+            await folders.join()
+            for _ in read_tasks:
+                await files.put(None)
+            await asyncio.gather(*read_tasks)
+        finally:
+            for task in list_tasks + read_tasks:
+                task.cancel()
+            await asyncio.gather(*list_tasks, *read_tasks, return_exceptions=True)
+        LOGGER.info(f'found {len(results)} files in {time.perf_counter() - start:.2f} s, '
+                    f'{len(limits)} mount points')
+
+    results.sort(key=lambda r: r[0])
+    return build_df([Path(r[0]) for r in results],
+                    [r[1] for r in results] if os_meta else None,
+                    [r[2] for r in results] if exif_meta else None)
+
+
+def ascan_df(source, *args, **kwargs) -> pd.DataFrame:
+    """
+    Runs :func:`scan_async` to completion, takes the same arguments
+
+    Works from inside a running event loop as well (e.g. in Jupyter), by running the scan's own loop in a separate
+    thread.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(scan_async(source, *args, **kwargs))
+    with ThreadPoolExecutor(max_workers=1) as runner:
+        return runner.submit(asyncio.run, scan_async(source, *args, **kwargs)).result()
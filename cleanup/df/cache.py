@@ -0,0 +1,117 @@
+import logging
+import os
+import pickle
+import sqlite3
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple
+
+LOGGER = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    stored: int = 0
+    deleted: int = 0
+
+    def __str__(self):
+        total = self.hits + self.misses
+        rate = self.hits / total if total else 0
+        return f'{self.hits} hits, {self.misses} misses ({rate:.1%} hit rate), {self.stored} stored, {self.deleted} deleted'
+
+
+class MetadataCache:
+    """
+    On-disk cache of per-file metadata (EXIF tags) stored in SQLite
+
+    Entries are keyed by the path and are only considered valid while the ``st_size`` and ``st_mtime_ns`` of the file
+    match the values recorded when the entry was stored, so modified files are re-read automatically. The ``reader``
+    column keeps results from different metadata readers apart.
+    """
+    def __init__(self, db_path):
+        self.db_path = Path(db_path)
+        self.conn = sqlite3.connect(str(self.db_path))
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS meta ('
+            'path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, reader TEXT, data BLOB)'
+        )
+        self.conn.commit()
+        self.stats = CacheStats()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({str(self.db_path)!r})'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM meta').fetchone()[0]
+
+    def _select(self, columns, prefix=None):
+        if prefix is None:
+            return self.conn.execute(f'SELECT {columns} FROM meta')
+        # every path under prefix sorts between prefix + sep and prefix + the character after sep
+        prefix = os.path.join(os.fspath(prefix), '')
+        return self.conn.execute(
+            f'SELECT {columns} FROM meta WHERE path >= ? AND path < ?',
+            (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        )
+
+    def entries(self, prefix=None) -> Dict[str, Tuple[int, int, str, bytes]]:
+        return {row[0]: row[1:] for row in self._select('path, size, mtime_ns, reader, data', prefix)}
+
+    def lookup(self, keys: List[Tuple[str, int, int]], reader: str, prefix=None) -> Tuple[Dict[str, dict], List[int]]:
+        """
+        Finds the cached metadata for a list of files
+
+        :param keys: list of (path, st_size, st_mtime_ns) tuples
+        :param reader: name of the metadata reader the entries need to have come from
+        :param prefix: only load the entries under this folder
+        :return: dict of the cached results by path and the positions in keys that missed
+        """
+        entries = self.entries(prefix)
+        found, missing = {}, []
+        for i, (path, size, mtime_ns) in enumerate(keys):
+            entry = entries.get(path)
+            if entry is not None and entry[0] == size and entry[1] == mtime_ns and entry[2] == reader:
+                found[path] = pickle.loads(entry[3])
+            else:
+                missing.append(i)
+        self.stats.hits += len(found)
+        self.stats.misses += len(missing)
+        return found, missing
+
+    def store(self, keys: Iterable[Tuple[str, int, int]], values: Iterable[dict], reader: str):
+        rows = [
+            (path, size, mtime_ns, reader, pickle.dumps(dict(value), protocol=pickle.HIGHEST_PROTOCOL))
+            for (path, size, mtime_ns), value in zip(keys, values)
+        ]
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?, ?, ?, ?)', rows)
+        self.stats.stored += len(rows)
+
+    def prune(self, prefix, seen: Iterable[str]) -> int:
+        """
+        Deletes the entries under prefix that weren't seen during the last walk, which removes deleted files
+
+        :param prefix: folder that was walked
+        :param seen: paths that were found during the walk
+        :return: number of entries deleted
+        """
+        stale = {row[0] for row in self._select('path', prefix)} - set(seen)
+        with self.conn:
+            self.conn.executemany('DELETE FROM meta WHERE path = ?', ((p,) for p in stale))
+        self.stats.deleted += len(stale)
+        return len(stale)
+
+    def report(self):
+        LOGGER.info(f'{repr(self)}: {self.stats}')
+        return self.stats
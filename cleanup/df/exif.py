@@ -0,0 +1,153 @@
+import logging
+import struct
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable
+
+LOGGER = logging.getLogger(__name__)
+
+# (ifd, tag id) -> column name, using the same names as exifread
+TAGS = {
+    ('Image', 0x010F): 'Image Make',
+    ('Image', 0x0110): 'Image Model',
+    ('Image', 0x0132): 'Image DateTime',
+    ('Image', 0x0100): 'Image ImageWidth',
+    ('Image', 0x0101): 'Image ImageLength',
+    ('EXIF', 0x9003): 'EXIF DateTimeOriginal',
+    ('EXIF', 0x9004): 'EXIF DateTimeDigitized',
+    ('EXIF', 0xA002): 'EXIF ExifImageWidth',
+    ('EXIF', 0xA003): 'EXIF ExifImageLength',
+}
+DATE_TAGS = {'Image DateTime', 'EXIF DateTimeOriginal', 'EXIF DateTimeDigitized'}
+DEFAULT_TAGS = ('Image DateTime', 'EXIF DateTimeOriginal', 'EXIF ExifImageWidth', 'EXIF ExifImageLength', 'Image Model')
+
+EXIF_OFFSET = 0x8769
+# field type -> (struct format, size in bytes)
+TYPES = {1: ('B', 1), 2: ('s', 1), 3: ('H', 2), 4: ('L', 4), 7: ('B', 1), 9: ('l', 4)}
+DATE_FORMATS = ('%Y:%m:%d %H:%M:%S', '%Y:%m:%d', '%d/%m/%Y', '%Y_%m_%d')
+
+
+class _Header:
+    """
+    Byte access to the TIFF structure inside a file, served from the initial read whenever possible
+    """
+    def __init__(self, file, buf: bytes, start: int):
+        self.file = file
+        self.buf = buf
+        self.start = start
+        self.endian = '<' if buf[start:start + 2] == b'II' else '>'
+
+    def read(self, offset: int, size: int) -> bytes:
+        pos = self.start + offset
+        if pos + size <= len(self.buf):
+            return self.buf[pos:pos + size]
+        self.file.seek(pos)
+        return self.file.read(size)
+
+    def unpack(self, fmt: str, offset: int, size: int):
+        return struct.unpack(self.endian + fmt, self.read(offset, size))
+
+    def ifd(self, offset: int) -> Dict[int, tuple]:
+        """
+        :return: dict of tag id -> (field type, count, raw 4 byte value/offset)
+        """
+        n = self.unpack('H', offset, 2)[0]
+        data = self.read(offset + 2, 12 * n)
+        entries = {}
+        for i in range(n):
+            tag, typ, count = struct.unpack(self.endian + 'HHL', data[12 * i:12 * i + 8])
+            entries[tag] = (typ, count, data[12 * i + 8:12 * i + 12])
+        return entries
+
+    def value(self, entry: tuple):
+        typ, count, raw = entry
+        if typ not in TYPES:
+            return None
+        fmt, size = TYPES[typ]
+        data = raw if count * size <= 4 else self.read(struct.unpack(self.endian + 'L', raw)[0], count * size)
+        if typ == 2:
+            return data[:count].split(b'\x00', 1)[0].decode('ascii', errors='replace').strip()
+        values = struct.unpack(f'{self.endian}{count}{fmt}', data[:count * size])
+        return values[0] if count == 1 else values
+
+
+def find_tiff(buf: bytes, file=None):
+    """
+    :param buf: the start of a JPEG or TIFF file
+    :param file: the file buf was read from, to follow the segments of a JPEG past the end of buf, e.g. when large
+        ICC profiles come before the EXIF segment
+    :return: position of the TIFF header in a JPEG or TIFF file, or None if there isn't one
+    """
+    if buf[:4] in (b'II*\x00', b'MM\x00*'):
+        return 0
+    if buf[:2] != b'\xff\xd8':
+        return None
+    pos = 2
+    while True:
+        head = buf[pos:pos + 10]
+        if len(head) < 10 and file is not None:
+            file.seek(pos)
+            head = file.read(10)
+        if len(head) < 4 or head[0] != 0xFF:
+            return None
+        marker = head[1]
+        if marker == 0xDA:
+            # start of the image data, there won't be any more metadata
+            return None
+        length = struct.unpack('>H', head[2:4])[0]
+        if marker == 0xE1 and head[4:10] == b'Exif\x00\x00':
+            return pos + 10
+        pos += 2 + length
+
+
+def parse_date(s: str):
+    for fmt in DATE_FORMATS:
+        try:
+            res = datetime.strptime(s, fmt)
+        except ValueError:
+            continue
+        return res if res.year <= 2100 else None
+    return None
+
+
+def read_exif_fast(path: Path, tags: Iterable[str] = DEFAULT_TAGS, size: int = 2 ** 16) -> dict:
+    """
+    Reads a handful of EXIF tags from the header of a JPEG or TIFF based file
+
+    The first ``size`` bytes of the file are read in one go, which covers the whole EXIF segment of most JPEGs, anything
+    past them is read as needed. The values are returned as Python types (dates as :class:`~datetime.datetime` with
+    the time of day, dimensions as int, text as str) instead of the ``IfdTag`` objects that
+    :func:`cleanup.df.utils.read_exif` returns. :class:`~cleanup.processing.processor.ConvertIfdTag` truncates the
+    dates of both readers to the day.
+
+    :param path: file to read
+    :param tags: column names of the tags to read, see :data:`TAGS`
+    :param size: number of bytes to read in one go
+    :return: dict of column name -> value for the tags that were found
+    """
+    LOGGER.debug('getting exif data: "%s"', path)
+    tags = set(tags)
+    res = {}
+    try:
+        with Path(path).open('rb') as file:
+            buf = file.read(size)
+            start = find_tiff(buf, file)
+            if start is None:
+                return res
+            hdr = _Header(file, buf, start)
+            ifds = {'Image': hdr.ifd(hdr.unpack('L', 4, 4)[0])}
+            if EXIF_OFFSET in ifds['Image'] and any(t.startswith('EXIF') for t in tags):
+                ifds['EXIF'] = hdr.ifd(hdr.value(ifds['Image'][EXIF_OFFSET]))
+
+            for (ifd, tag), name in TAGS.items():
+                if name in tags and ifd in ifds and tag in ifds[ifd]:
+                    val = hdr.value(ifds[ifd][tag])
+                    if name in DATE_TAGS:
+                        val = parse_date(val) if isinstance(val, str) else None
+                    if val is not None:
+                        res[name] = val
+    except PermissionError:
+        return {}
+    except (struct.error, OSError, TypeError) as e:
+        LOGGER.debug('bad exif header: "%s", %r', path, e)
+    return res
@@ -0,0 +1,178 @@
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+_SEPS = re.escape(os.sep + (os.altsep or ''))
+
+PATH_REGEX = re.compile(
+    f'^(?:(?P<parent>.*)[{_SEPS}])?'   # everything before the last separator
+    f'(?P<name>'
+    f'(?P<stem>[^{_SEPS}]+?)'          # shortest stem that leaves a valid suffix
+    f'(?P<suffix>\\.[^.{_SEPS}]+)?'     # same rules as Path.suffix
+    f')$'
+)
+
+
+# prefix of the hidden columns that hold the memoized path features, see cached()
+CACHE_PREFIX = '_cache_'
+FEATURES = ['parent', 'name', 'stem', 'suffix']
+# the features compact_paths adds as columns, with their dtypes
+COMPACT_DTYPES = {'parent': 'category', 'stem': 'string', 'suffix': 'category'}
+
+
+def cached(df: pd.DataFrame, key: str, col: str, func) -> pd.Series:
+    """
+    Memoizes a feature of a column as a hidden column of df, so that every processor of a chain that asks for it
+    after the first one gets it for free. Being a column, it follows df through filtering, concatenating and
+    chunking.
+
+    The values of col are kept next to the cache, and everything cached for col is recomputed if rows don't have the
+    cache (e.g. after new rows were added) or if col was replaced, which is checked on a sample of the rows. Code that
+    changes only some of the values of col in place should call :func:`invalidate`.
+
+    :param key: name of the feature
+    :param col: column the feature is derived from
+    :param func: computes the feature from df, returns a Series or a DataFrame with a column per feature
+    """
+    name = f'{CACHE_PREFIX}{col}_{key}'
+    source = f'{CACHE_PREFIX}{col}_source'
+    if name in df and source in df and same_values(df[col], df[source]):
+        return df[name]
+    invalidate(df, col)
+    res = func(df)
+    if isinstance(res, pd.DataFrame):
+        for k in res.columns:
+            df[f'{CACHE_PREFIX}{col}_{k}'] = res[k]
+        res = res[key]
+    else:
+        df[name] = res
+    df[source] = df[col]
+    return res
+
+
+def same_values(a: pd.Series, b: pd.Series, samples: int = 64) -> bool:
+    """
+    Cheap check whether b still holds the values of a: the missing values have to match everywhere, the others on
+    up to samples evenly spaced rows
+    """
+    missing = a.isna()
+    if not missing.equals(b.isna()):
+        return False
+    pos = np.flatnonzero(~missing.to_numpy())
+    pos = pos[np.unique(np.linspace(0, pos.shape[0] - 1, min(samples, pos.shape[0])).astype(int))]
+    return all(x == y for x, y in zip(a.iloc[pos], b.iloc[pos]))
+
+
+def invalidate(df: pd.DataFrame, col: str):
+    """
+    Removes everything :func:`cached` for col
+    """
+    prefix = f'{CACHE_PREFIX}{col}_'
+    cols = [c for c in df.columns if isinstance(c, str) and c.startswith(prefix)]
+    if cols:
+        df.drop(columns=cols, inplace=True)
+
+
+def drop_cached(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Removes the columns added by :func:`cached`
+    """
+    cols = [c for c in df.columns if isinstance(c, str) and c.startswith(CACHE_PREFIX)]
+    return df.drop(columns=cols) if cols else df
+
+
+def strings(df: pd.DataFrame, col: str = 'path') -> pd.Series:
+    s = df[col]
+    if pd.api.types.is_string_dtype(s) and not pd.api.types.is_object_dtype(s):
+        return s
+    return cached(df, 'str', col, lambda df: df[col].map(os.fspath, na_action='ignore').astype('string'))
+
+
+def split(s: pd.Series) -> pd.DataFrame:
+    """
+    Splits a Series of path strings into parent, name, stem and suffix columns with one vectorized regex
+    """
+    parts = s.str.extract(PATH_REGEX)
+    parts['suffix'] = parts['suffix'].fillna('')
+    parts['parent'] = parts['parent'].fillna('.').replace('', os.sep)
+    return parts
+
+
+def is_compact(df: pd.DataFrame, name: str, col: str = 'path') -> bool:
+    """
+    Whether df has the column for feature name of col that :func:`compact_paths` adds, told apart from other columns
+    of the same name (e.g. the 'parent' of ParentCol, or the Path objects of older pickles) by its dtype
+    """
+    if col != 'path' or name not in COMPACT_DTYPES or name not in df or col not in df:
+        return False
+    path_dtype = df[col].dtype
+    return (str(df[name].dtype) == COMPACT_DTYPES[name] and pd.api.types.is_string_dtype(path_dtype)
+            and not pd.api.types.is_object_dtype(path_dtype))
+
+
+def feature(df: pd.DataFrame, name: str, col: str = 'path') -> pd.Series:
+    """
+    Gets one of the parent, name, stem or suffix of the paths in col
+
+    The columns added by :func:`compact_paths` are used when they're available, see :func:`is_compact`. Otherwise all
+    four features are derived from the path strings together and cached on df, see :func:`cached`. The parents and
+    suffixes repeat a lot, so they're cached as categoricals.
+    """
+    if is_compact(df, name, col):
+        return df[name]
+
+    def derive(df):
+        parts = split(strings(df, col))
+        parts['parent'] = parts['parent'].astype('category')
+        parts['suffix'] = parts['suffix'].astype('category')
+        return parts[FEATURES]
+
+    return cached(df, name, col, derive)
+
+
+def parents(df: pd.DataFrame, col: str = 'path') -> pd.Series:
+    return feature(df, 'parent', col)
+
+
+def names(df: pd.DataFrame, col: str = 'path') -> pd.Series:
+    return feature(df, 'name', col)
+
+
+def stems(df: pd.DataFrame, col: str = 'path') -> pd.Series:
+    return feature(df, 'stem', col)
+
+
+def suffixes(df: pd.DataFrame, col: str = 'path') -> pd.Series:
+    return feature(df, 'suffix', col)
+
+
+def map_unique(s: pd.Series, func) -> pd.Series:
+    """
+    Applies a vectorized func to the unique values of s and broadcasts the results back, which is cheap for
+    categorical columns like the ones made by :func:`compact_paths`
+    """
+    codes, uniques = pd.factorize(s)
+    res = func(pd.Series(uniques))
+    res = pd.Series(res.to_numpy()[codes], index=s.index)
+    if (codes < 0).any():
+        res = res.where(codes >= 0)
+    return res
+
+
+def compact_paths(df: pd.DataFrame, path_col: str = 'path') -> pd.DataFrame:
+    """
+    Converts the Path objects in path_col to a string column and adds categorical parent and suffix columns and a
+    string stem column, which the processors in :mod:`cleanup.processing` use instead of re-deriving them for every row
+
+    :param df: DataFrame with a column of paths
+    :param path_col: name of the column with the paths
+    :return: the same DataFrame
+    """
+    df[path_col] = strings(df, path_col)
+    parts = split(df[path_col])
+    df['parent'] = parts['parent'].astype('category')
+    df['stem'] = parts['stem'].astype('string')
+    df['suffix'] = parts['suffix'].astype('category')
+    return df
@@ -0,0 +1,173 @@
+import functools
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterator
+
+import exifread
+import pandas as pd
+
+from .cache import MetadataCache
+from .exif import read_exif_fast
+from .utils import read_exif, stat_dict
+
+LOGGER = logging.getLogger(__name__)
+
+
+def walk(source) -> Iterator[os.DirEntry]:
+    """
+    Recursively yields the DirEntry of every file under source that has an extension
+
+    Equivalent to ``Path(source).glob('**/*.*')`` restricted to files, but uses ``os.scandir`` so that the stat
+    results cached on each DirEntry can be reused instead of stat'ing every path a second time.
+
+    :param source: top level folder to walk
+    """
+    stack = [os.fspath(source)]
+    while stack:
+        folder = stack.pop()
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif '.' in entry.name and entry.is_file():
+                            yield entry
+                    except OSError as e:
+                        LOGGER.exception(repr(e))
+        except OSError as e:
+            LOGGER.exception(repr(e))
+
+
+def scan_df(source,
+            min_size=50000,
+            os_meta=True,
+            exif_meta=False,
+            stop_tag=exifread.DEFAULT_STOP_TAG,
+            workers=8,
+            processes=False,
+            chunksize=64,
+            cache: MetadataCache = None,
+            fast_exif=False) -> pd.DataFrame:
+    """
+    Parallel version of :func:`cleanup.df.statdf.stat_df`
+
+    The os stats come from the DirEntry objects produced by :func:`walk`, which means the file size is known before
+    any EXIF data is read and files below ``min_size`` are never opened. The EXIF reads are spread over a pool of
+    ``workers`` threads, or processes if ``processes`` is True.
+
+    :param source: top level folder to scan
+    :param min_size: files need to be bigger than this (in bytes) to be included
+    :param os_meta: include the os stats as columns
+    :param exif_meta: include the EXIF tags as columns
+    :param stop_tag: passed through to :func:`exifread.process_file`
+    :param workers: number of threads/processes used for reading metadata
+    :param processes: use a process pool instead of a thread pool
+    :param chunksize: number of files sent to a worker process at a time
+    :param cache: :class:`~cleanup.df.cache.MetadataCache` used to skip the EXIF reads of unchanged files
+    :param fast_exif: read only the date, dimension and camera tags with :func:`~cleanup.df.exif.read_exif_fast`
+    :return: DataFrame with the same columns as :func:`cleanup.df.statdf.stat_df`, without the timestamp conversion
+    """
+    LOGGER.info(f'scanning "{source}" with {workers} {"processes" if processes else "threads"}')
+
+    paths, stats, seen = [], [], []
+    for entry in walk(source):
+        try:
+            st = stat_dict(entry.stat())
+        except OSError as e:
+            LOGGER.exception(repr(e))
+            continue
+        seen.append(entry.path)
+        if min_size is not None and st['st_size'] <= min_size:
+            continue
+        paths.append(Path(entry.path))
+        stats.append(st)
+
+    LOGGER.info(f'found {len(paths)} files')
+    exif = None
+    if exif_meta and cache is not None:
+        # also with no files left, so the entries of deleted files get pruned
+        exif = cached_read(cache, source, paths, stats, seen, stop_tag,
+                           workers=workers, processes=processes, chunksize=chunksize, fast_exif=fast_exif)
+    elif exif_meta and paths:
+        LOGGER.info(f'reading exif data: {len(paths)} files')
+        exif = read_many(paths, stop_tag, workers, processes, chunksize, fast_exif)
+    return build_df(paths, stats if os_meta else None, exif)
+
+
+def scan_paths(paths,
+               min_size=50000,
+               os_meta=True,
+               exif_meta=False,
+               stop_tag=exifread.DEFAULT_STOP_TAG,
+               workers=8,
+               fast_exif=False) -> pd.DataFrame:
+    """
+    Version of :func:`scan_df` for a given list of files, like the ones that changed since the last scan
+
+    Files that can't be stat'ed, e.g. because they were deleted again in the meantime, are left out.
+    """
+    found, stats = [], []
+    for path in map(Path, paths):
+        try:
+            st = stat_dict(path.stat())
+        except OSError as e:
+            LOGGER.debug('could not stat "%s": %r', path, e)
+            continue
+        if min_size is not None and st['st_size'] <= min_size:
+            continue
+        found.append(path)
+        stats.append(st)
+
+    exif = read_many(found, stop_tag, workers, fast_exif=fast_exif) if exif_meta and found else None
+    return build_df(found, stats if os_meta else None, exif)
+
+
+def build_df(paths, stats=None, exif=None) -> pd.DataFrame:
+    df = pd.DataFrame(
+        data={
+            'filename': [p.name for p in paths],
+            'path': paths
+        }
+    )
+    dfs = [df]
+    if stats is not None:
+        dfs.append(pd.DataFrame(stats, index=df.index))
+    if exif is not None:
+        dfs.append(pd.DataFrame(exif, index=df.index))
+    return pd.concat(dfs, axis=1)
+
+
+def cached_read(cache, source, paths, stats, seen, stop_tag=exifread.DEFAULT_STOP_TAG, **kwargs):
+    prefix = os.path.abspath(source)
+    reader = 'fast' if kwargs.get('fast_exif') else f'exifread:{stop_tag}'
+    keys = [(os.path.abspath(p), st['st_size'], st['st_mtime_ns']) for p, st in zip(paths, stats)]
+
+    found, missing = cache.lookup(keys, reader, prefix)
+    LOGGER.info(f'reading exif data: {len(missing)} files, {len(found)} cached')
+    new = read_many([paths[i] for i in missing], stop_tag, **kwargs)
+    cache.store([keys[i] for i in missing], new, reader)
+    cache.prune(prefix, [os.path.abspath(p) for p in seen])
+    cache.report()
+
+    res = [found.get(key[0]) for key in keys]
+    for i, val in zip(missing, new):
+        res[i] = val
+    return res
+
+
+def read_many(paths, stop_tag=exifread.DEFAULT_STOP_TAG, workers=8, processes=False, chunksize=64, fast_exif=False):
+    if not paths:
+        return []
+    func = read_exif_fast if fast_exif else functools.partial(read_exif, stop_tag=stop_tag)
+    if workers is None or workers <= 1:
+        return [func(p) for p in paths]
+
+    if processes:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(func, paths, chunksize=chunksize))
+    else:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(func, paths))
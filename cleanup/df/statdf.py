@@ -5,63 +5,140 @@ from types import GeneratorType
 
 import exifread
 import pandas as pd
-import yaml
 
+from .cache import MetadataCache
+from .exif import read_exif_fast
+from .paths import compact_paths
+from .scan import scan_df
 from .utils import read_os_stats, read_exif, timer
 
 LOGGER = logging.getLogger(__name__)
 
 @timer
 def stat_df_yaml(source, yaml_path, **kwargs):
+    import yaml
     with Path(yaml_path).open('r') as file:
         cfg = yaml.load(file, Loader=yaml.SafeLoader)
 
+    kwargs.update(scan_kwargs(cfg))
+    res = stat_df(source, **kwargs)
+
+    return res
+
+
+def scan_kwargs(cfg: dict) -> dict:
+    """
+    :return: the arguments of :func:`stat_df` that are set in a yaml config
+    """
+    kwargs = {}
     if 'filesize_min' in cfg:
         kwargs['min_size'] = cfg['filesize_min']
 
     if 'default_columns' in cfg:
         kwargs['keep_cols'] = cfg['keep_cols']
 
-    res = stat_df(source, **kwargs)
+    if 'exif' in cfg:
+        kwargs['exif_meta'] = cfg['exif']
 
-    return res
+    if 'scan_workers' in cfg:
+        kwargs['workers'] = cfg['scan_workers']
+
+    if 'scan_processes' in cfg:
+        kwargs['processes'] = cfg['scan_processes']
+
+    if 'cache' in cfg:
+        kwargs['cache'] = cfg['cache']
+
+    if 'compact' in cfg:
+        kwargs['compact'] = cfg['compact']
+
+    if 'fast_exif' in cfg:
+        kwargs['fast_exif'] = cfg['fast_exif']
+
+    if 'async_io' in cfg:
+        kwargs['async_io'] = cfg['async_io']
+
+    return kwargs
 
 def stat_df(source,
             keep_cols=None,
             min_size=50000,
             os_meta=True,
             exif_meta=False,
-            stop_tag=exifread.DEFAULT_STOP_TAG):
+            stop_tag=exifread.DEFAULT_STOP_TAG,
+            workers=None,
+            processes=False,
+            cache=None,
+            compact=False,
+            fast_exif=False,
+            async_io=False,
+            per_mount=64):
     LOGGER.info(f'constructing df from: "{source}"')
 
-    df = file_df(source)
-    if df is None:
-        return pd.DataFrame()
+    if async_io:
+        # for network shares, see cleanup.df.ascan
+        if cache is not None:
+            raise ValueError('the async scan does not use a metadata cache')
+        from .ascan import ascan_df
+        df = ascan_df(source, min_size, os_meta, exif_meta, stop_tag, fast_exif, max_inflight=workers or 256,
+                      per_mount=per_mount)
+    elif (workers is not None or cache is not None) and isinstance(source, (str, Path)):
+        if isinstance(cache, (str, Path)):
+            with MetadataCache(cache) as cache:
+                return stat_df(source, keep_cols, min_size, os_meta, exif_meta, stop_tag,
+                               workers, processes, cache, compact, fast_exif)
+        df = scan_df(source, min_size, os_meta, exif_meta, stop_tag,
+                     workers=workers or 1, processes=processes, cache=cache, fast_exif=fast_exif)
+    else:
+        df = file_df(source)
+        if df is None:
+            return pd.DataFrame()
+
+        df = df.reset_index(drop=True)
+        dfs = [df]
+
+        if os_meta:
+            LOGGER.info(f'reading os stats: {df.shape[0]} files')
+            dfs.append(pd.DataFrame([read_os_stats(f) for f in df['path']]))
 
-    df = df.reset_index(drop=True)
-    dfs = [df]
+        if exif_meta:
+            LOGGER.info(f'reading exif data: {df.shape[0]} files')
+            if fast_exif:
+                dfs.append(pd.DataFrame([read_exif_fast(f) for f in df['path']]))
+            else:
+                dfs.append(pd.DataFrame([read_exif(f, stop_tag=stop_tag) for f in df['path']]))
 
-    if os_meta:
-        LOGGER.info(f'reading os stats: {df.shape[0]} files')
-        dfs.append(pd.DataFrame([read_os_stats(f) for f in df['path']]))
+        df = pd.concat(dfs, axis=1)
 
-    if exif_meta:
-        LOGGER.info(f'reading exif data: {df.shape[0]} files')
-        dfs.append(pd.DataFrame([read_exif(f, stop_tag=stop_tag) for f in df['path']]))
+    return finish_df(df, keep_cols, min_size, compact)
 
-    df = pd.concat(dfs, axis=1)
 
+def finish_df(df: pd.DataFrame, keep_cols=None, min_size=None, compact=False) -> pd.DataFrame:
+    """
+    The steps :func:`stat_df` takes after reading the metadata, for frames that are read some other way
+    """
     if min_size is not None and 'st_size' in df.columns:
         df = df[df['st_size'] > min_size]
 
-    LOGGER.info(f'converting timestamps: {df.shape[0]} files')
-    for col in df:
-        if ('time' in col) and ('_ns' not in col):
-            df[col] = pd.to_datetime(df[col].apply(datetime.fromtimestamp))
+    df = convert_times(df)
 
     if keep_cols is not None:
         df = df[keep_cols]
 
+    if compact and 'path' in df:
+        df = compact_paths(df)
+
+    return df
+
+
+def convert_times(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts the st_*time columns from seconds since the epoch to local datetimes
+    """
+    LOGGER.info(f'converting timestamps: {df.shape[0]} files')
+    for col in df:
+        if ('time' in col) and ('_ns' not in col):
+            df[col] = pd.to_datetime(df[col].apply(datetime.fromtimestamp))
     return df
 
 
@@ -69,10 +146,9 @@ def file_df(source):
     try:
         if isinstance(source, GeneratorType):
             files = [f for f in source]
-        elif isinstance(source, Path):
-            files = [f for f in source.glob('**\*.*')]
-        elif isinstance(source, str):
-            files = [f for f in Path(source).glob('**\*.*')]
+        elif isinstance(source, (Path, str)):
+            # '/' works on every platform, folders with a '.' in their name are left out like in scan.walk
+            files = [f for f in Path(source).glob('**/*.*') if f.is_file()]
     except OSError as e:
         LOGGER.exception(repr(e))
     else:
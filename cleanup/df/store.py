@@ -0,0 +1,221 @@
+"""
+Saving and loading of scanned and processed DataFrames as Parquet or Feather files
+
+Unlike pickles, these files can be read column by column and memory mapped, and they don't depend on the versions of
+pandas or exifread that wrote them. Requires pyarrow, which is an optional dependency.
+"""
+import json
+import logging
+from pathlib import Path, PurePath
+from typing import Iterable, Iterator, List
+
+import pandas as pd
+from exifread.classes import IfdTag
+
+LOGGER = logging.getLogger(__name__)
+
+FORMATS = {'.parquet': 'parquet', '.pq': 'parquet', '.feather': 'feather', '.arrow': 'feather'}
+# key of the schema metadata that records which columns held Path objects
+META_KEY = b'cleanup'
+
+
+def _arrow():
+    try:
+        import pyarrow
+    except ImportError as e:
+        raise ImportError('saving and loading Parquet/Feather files requires pyarrow: pip install pyarrow') from e
+    return pyarrow
+
+
+def _format(path: Path, fmt: str = None) -> str:
+    if fmt is None:
+        try:
+            return FORMATS[path.suffix.lower()]
+        except KeyError:
+            raise ValueError(f'Unknown file type, use one of {list(FORMATS)}: {path}')
+    return fmt
+
+
+def tag_value(tag):
+    """
+    :return: the value of an IfdTag as a str or int, other values are returned unchanged
+    """
+    if not isinstance(tag, IfdTag):
+        return tag
+    if isinstance(tag.values, str):
+        return tag.values.strip()
+    if isinstance(tag.values, list) and len(tag.values) == 1 and isinstance(tag.values[0], int):
+        return tag.values[0]
+    return tag.printable
+
+
+def _first(s: pd.Series):
+    valid = s.dropna()
+    return valid.iloc[0] if not valid.empty else None
+
+
+def normalize(df: pd.DataFrame):
+    """
+    Converts the object columns of df to types that can be stored in a columnar file
+
+    Path objects become strings and IfdTag values become strings (text and dates) or ints (single numbers), which
+    :class:`~cleanup.processing.processor.ConvertIfdTag` reads the same way as the tags. Object columns that still
+    mix types are stored as strings.
+
+    :return: (normalized copy of df, names of the columns that held Path objects)
+    """
+    df = df.copy(deep=False)
+    path_cols = []
+    for col in df.columns[df.dtypes == object]:
+        first = _first(df[col])
+        if isinstance(first, PurePath):
+            df[col] = df[col].map(str, na_action='ignore')
+            path_cols.append(col)
+        elif isinstance(first, IfdTag):
+            df[col] = df[col].map(tag_value, na_action='ignore')
+
+        types = {type(v) for v in df[col].dropna()}
+        if len(types) > 1 and not types <= {int, float, bool}:
+            LOGGER.warning(f'storing the mixed types of "{col}" as strings: {types}')
+            df[col] = df[col].map(str, na_action='ignore')
+    return df, path_cols
+
+
+def save_df(df: pd.DataFrame, path, fmt: str = None, compression: str = None):
+    """
+    Saves a DataFrame from :func:`~cleanup.df.stat_df` or a :class:`~cleanup.processing.chain.ProcessChain` as a
+    Parquet or Feather file, see :func:`normalize` for how the values are stored
+
+    :param df: DataFrame to save
+    :param path: file to write, the format is taken from the suffix (.parquet, .pq, .feather or .arrow)
+    :param fmt: 'parquet' or 'feather' to override the suffix
+    :param compression: compression codec, defaults to snappy for Parquet and none for Feather so that it can be
+        memory mapped
+    """
+    pa = _arrow()
+    path = Path(path)
+    fmt = _format(path, fmt)
+    df, path_cols = normalize(df)
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    meta = dict(table.schema.metadata or {})
+    meta[META_KEY] = json.dumps({'paths': path_cols}).encode()
+    table = table.replace_schema_metadata(meta)
+
+    LOGGER.info(f'saving {df.shape[0]} rows to "{path}"')
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        pq.write_table(table, path, compression=compression or 'snappy')
+    else:
+        import pyarrow.feather as feather
+        feather.write_feather(table, path, compression=compression or 'uncompressed')
+
+
+def stored_columns(path, fmt: str = None) -> List[str]:
+    """
+    :return: the names of the columns stored in a file written by :func:`save_df`, without reading any data
+    """
+    _arrow()
+    path = Path(path)
+    if _format(path, fmt) == 'parquet':
+        import pyarrow.parquet as pq
+        schema = pq.read_schema(path)
+    else:
+        import pyarrow.ipc as ipc
+        with ipc.open_file(path) as reader:
+            schema = reader.schema
+    index = json.loads(schema.metadata.get(b'pandas', b'{}')).get('index_columns', [])
+    return [n for n in schema.names if n not in index]
+
+
+def load_df(path, columns: Iterable[str] = None, memory_map: bool = True, as_paths: bool = True,
+            fmt: str = None) -> pd.DataFrame:
+    """
+    Loads a file written by :func:`save_df`
+
+    :param path: file to read
+    :param columns: only read these columns, the ones that aren't in the file are left out. Pass
+        :meth:`ProcessChain.input_columns <cleanup.processing.chain.ProcessChain.input_columns>` to only load what a
+        chain reads.
+    :param memory_map: memory map the file instead of reading it into memory first
+    :param as_paths: turn the columns that were saved from Path objects back into Paths, otherwise they're left as
+        strings, which the processors handle as well
+    :param fmt: 'parquet' or 'feather' to override the suffix
+    """
+    _arrow()
+    path = Path(path)
+    fmt = _format(path, fmt)
+    if columns is not None:
+        available = set(stored_columns(path, fmt))
+        columns = [c for c in columns if c in available]
+
+    LOGGER.info(f'loading "{path}"')
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        table = pq.read_table(path, columns=columns, memory_map=memory_map)
+    else:
+        import pyarrow.feather as feather
+        table = feather.read_table(path, columns=columns, memory_map=memory_map)
+
+    return _to_pandas(table, table.schema, as_paths)
+
+
+def iter_df(path, chunksize: int, columns: Iterable[str] = None, as_paths: bool = True,
+            fmt: str = None) -> Iterator[pd.DataFrame]:
+    """
+    Reads a file written by :func:`save_df` in chunks of up to chunksize rows, without loading all of it at once
+
+    The chunks can be fed to :meth:`ProcessChain.process_chunks <cleanup.processing.chain.ProcessChain.process_chunks>`.
+    See :func:`load_df` for the other parameters.
+    """
+    _arrow()
+    path = Path(path)
+    fmt = _format(path, fmt)
+    if columns is not None:
+        available = set(stored_columns(path, fmt))
+        columns = [c for c in columns if c in available]
+
+    LOGGER.info(f'loading "{path}" in chunks of {chunksize} rows')
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        file = pq.ParquetFile(path, memory_map=True)
+        schema = file.schema_arrow
+        batches = file.iter_batches(chunksize, columns=columns)
+    else:
+        import pyarrow.feather as feather
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        schema = table.schema
+        batches = table.to_batches(chunksize)
+
+    for batch in batches:
+        yield _to_pandas(batch, schema, as_paths)
+
+
+def _to_pandas(data, schema, as_paths: bool) -> pd.DataFrame:
+    df = data.to_pandas()
+    if as_paths:
+        meta = json.loads((schema.metadata or {}).get(META_KEY, b'{}'))
+        for col in meta.get('paths', []):
+            if col in df:
+                df[col] = df[col].map(Path, na_action='ignore').astype(object)
+    return df
+
+
+def convert_pickles(files, fmt: str = 'parquet', dest=None) -> List[Path]:
+    """
+    Converts pickled DataFrames to Parquet or Feather files
+
+    :param files: folder with ``*.pkl`` files, or an iterable of pickle files
+    :param fmt: 'parquet' or 'feather'
+    :param dest: folder to write to, defaults to next to each pickle
+    :return: the files that were written
+    """
+    if isinstance(files, (str, Path)) and Path(files).is_dir():
+        files = sorted(Path(files).glob('*.pkl'))
+    suffix = {'parquet': '.parquet', 'feather': '.feather'}[fmt]
+    res = []
+    for file in map(Path, files):
+        out = (Path(dest) if dest is not None else file.parent) / (file.stem + suffix)
+        LOGGER.info(f'converting "{file}" to "{out}"')
+        save_df(pd.read_pickle(file), out, fmt)
+        res.append(out)
+    return res
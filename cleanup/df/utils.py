@@ -1,34 +1,48 @@
 import logging
+import os
 import re
 from datetime import datetime
 from pathlib import Path
 
 import exifread
+import numpy as np
 import pandas as pd
-import yaml
 
+from . import paths, store
 from ..utils import timer
 
 LOGGER = logging.getLogger(__name__)
 
 @timer
 def load_yaml(yaml_path):
+    """
+    Loads the DataFrame named by the ``df`` key of a yaml config, a pickle or a file written by
+    :func:`cleanup.df.store.save_df`. For the latter an optional ``columns`` key limits the columns that are read.
+    """
+    import yaml
     with Path(yaml_path).open('r') as file:
         cfg = yaml.load(file, Loader=yaml.SafeLoader)
     df_path = Path(cfg['df'])
     print(f'Loading {df_path.stat().st_size / (10 ** 6):.2f} MB...')
-    df = pd.read_pickle(df_path)
+    if df_path.suffix.lower() in store.FORMATS:
+        df = store.load_df(df_path, columns=cfg.get('columns'))
+    else:
+        df = pd.read_pickle(df_path)
     print(f'Loaded {df.shape[0]} rows')
+    return df
 
 
 def read_os_stats(path: Path):
-    LOGGER.debug(f'getting os stats: "{path}"')
-    stat_obj = Path(path).stat()
+    LOGGER.debug('getting os stats: "%s"', path)
+    return stat_dict(Path(path).stat())
+
+
+def stat_dict(stat_obj: os.stat_result):
     return {key: getattr(stat_obj, key) for key in dir(stat_obj) if key[:3] == 'st_'}
 
 
 def read_exif(path: Path, stop_tag=exifread.DEFAULT_STOP_TAG):
-    LOGGER.debug(f'getting exif data: "{path}"')
+    LOGGER.debug('getting exif data: "%s"', path)
     try:
         with Path(path).open('rb') as f:
             return exifread.process_file(f, details=False, stop_tag=stop_tag)
@@ -36,8 +50,44 @@ def read_exif(path: Path, stop_tag=exifread.DEFAULT_STOP_TAG):
         return {}
 
 
-def scan_pathdate(df, scan_col='path'):
-    return df[scan_col].apply(lambda p: scan_date(p) or pd.NaT)
+def scan_pathdate(df, scan_col='path', match_on='path'):
+    """
+    Vectorized version of :func:`scan_date` over a column of paths
+
+    Each parent folder is only searched once. Where the first match in a folder's path ends far enough from its end
+    that the file name can't change which match comes first, the folder's date is used for all of its files, so only
+    the remaining files are searched in full.
+
+    :param match_on: 'path' to search the whole path like :func:`scan_date`, or 'parent' to only search the folders
+    """
+    codes, folders = pd.factorize(paths.parents(df, scan_col))
+    folders = pd.Series(folders).astype('string')
+    folder_dates = parse_dates(folders).to_numpy()
+    res = pd.Series(folder_dates[codes], index=df.index).where(codes >= 0)
+    if match_on == 'parent':
+        return res
+    elif match_on != 'path':
+        raise ValueError(f'Invalid match_on: {match_on}')
+
+    starts = np.array([m.start() if m else -1 for m in map(date_regex.search, folders)], dtype=int)
+    settled = (starts >= 0) & (starts + DATE_LEN <= folders.str.len().to_numpy())
+    rest = ~((codes >= 0) & settled[codes])
+    if rest.any():
+        res[rest] = parse_dates(paths.strings(df, scan_col)[rest]).to_numpy()
+    return res
+
+
+def parse_dates(strings: pd.Series) -> pd.Series:
+    """
+    :return: the date of the first match of :data:`date_regex` in each string, NaT where there is none or it isn't
+        a valid date
+    """
+    parts = strings.str.extract(date_regex)[['year', 'month', 'day']].astype(float)
+    parts['day'] = parts['day'].replace(0, 1)
+    valid = (parts['year'].between(1950, 2050) &
+             parts['month'].between(1, 12) &
+             parts['day'].between(1, 31))
+    return pd.to_datetime(parts.where(valid), errors='coerce')
 
 
 date_regex = re.compile(
@@ -47,6 +97,8 @@ date_regex = re.compile(
     '([- _]?'                   # delimter between month and day
     '(?P<day>\d{2}))'          # day
 )
+# longest string date_regex can match, e.g. '2019-05-06'
+DATE_LEN = 10
 
 
 def scan_date(path):
@@ -1,52 +1,142 @@
+import atexit
+import json
 import logging
 import re
 import sys
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
+from queue import Queue
 
 
 PATH_REGEX = re.compile('"(.+?)"')
 
 
-def configure(file=None, append=False, stream_level=logging.WARNING, file_level=logging.DEBUG):
+def configure(file=None, append=False, stream_level=logging.WARNING, file_level=logging.DEBUG, structured=False,
+              queue=False):
     """
     Function for easily setting up logging
 
-    :param file:
-    :param append:
-    :param stream_level:
-    :param file_level:
-    :return:
+    The root logger is set to the lowest handler level, so debug messages aren't formatted unless a handler wants
+    them. With ``queue`` the records are handed to a background thread which does the formatting and writing, which
+    keeps the cost in the scanning and transfer threads down to putting a record on a queue.
+
+    :param file: log file, None to only log to stdout
+    :param append: append to the log file instead of overwriting it
+    :param stream_level: level of the stdout handler
+    :param file_level: level of the file handler
+    :param structured: write the log file as JSON lines, see :class:`JsonFormatter`
+    :param queue: write the records from a background thread
+    :return: the running :class:`~logging.handlers.QueueListener` if queue is set (stopped at exit), None otherwise
     """
     log_stream = logging.StreamHandler(sys.stdout)
     log_stream.setLevel(stream_level)
     handlers = [log_stream]
 
     if file is not None:
-        file_logger = logging.FileHandler(file, 'a' if append else 'w')
+        file_logger = logging.FileHandler(file, 'a' if append else 'w', encoding='utf-8')
         file_logger.setLevel(file_level)
+        if structured:
+            file_logger.setFormatter(JsonFormatter())
         handlers.append(file_logger)
 
-    logging.basicConfig(level=logging.DEBUG, handlers=handlers)
+    level = min(h.level for h in handlers)
+    if not queue:
+        logging.basicConfig(level=level, handlers=handlers)
+        return None
+
+    for handler in handlers:
+        if handler.formatter is None:
+            handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+    records = Queue()
+    listener = QueueListener(records, *handlers, respect_handler_level=True)
+    queue_handler = QueueHandler(records)
+    # the message gets merged with its args before going on the queue, the real formatting is done by the listener
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
+    # added directly, as basicConfig does nothing if the root logger already has handlers
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+    listener.start()
+    atexit.register(_stop, listener)
+    return listener
+
+
+def _stop(listener):
+    # flushes the queue at exit, unless the listener was already stopped
+    if listener._thread is not None:
+        listener.stop()
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one JSON object per line
+
+    Every object has the time, level, logger and message of the record, plus anything passed to the log call with
+    ``extra``. The helpers in this module read these lines the same way as the plain ``LEVEL:logger:message`` ones.
+    """
+    FIELDS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+    def format(self, record):
+        res = {
+            'time': record.created,
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        res.update((k, v) for k, v in vars(record).items() if k not in self.FIELDS)
+        if record.exc_info:
+            res['exc'] = self.formatException(record.exc_info)
+        return json.dumps(res, default=str)
+
+
+def render_json(line: str) -> str:
+    """
+    Turns a line written by :class:`JsonFormatter` back into ``asctime LEVEL:logger:message``
+    """
+    rec = json.loads(line)
+    asctime = datetime.fromtimestamp(rec['time']).strftime('%Y-%m-%d %H:%M:%S,%f')[:-3]
+    return f'{asctime} {rec["level"]}:{rec["logger"]}:{rec["msg"]}'
+
+
+def render_line(line: str) -> str:
+    """
+    Renders the lines written by :class:`JsonFormatter` with :func:`render_json` and returns every other line, e.g.
+    the continuation of a multi-line message, as it is
+    """
+    if not line.startswith('{'):
+        return line
+    try:
+        return render_json(line)
+    except (ValueError, KeyError, TypeError):
+        return line
+
+
+def index(logfile, workers=None, cache=True):
+    """
+    Gets the up to date :class:`~cleanup.logindex.LogIndex` of a log file, building or extending it if needed
+
+    :param cache: where to keep the index between calls, in the user's cache folder by default, so a repeated query
+        only reads what was added to the log, see :class:`~cleanup.logindex.LogIndex`
+    """
+    from .logindex import LogIndex
+    return LogIndex(logfile, cache, workers=workers)
 
 
-def keyword_paths(logfile, keyword):
-    yield from (tuple(get_paths(line)) for line in filter(line_gen(logfile), keyword))
+def keyword_paths(logfile, keyword, cache=True):
+    yield from index(logfile, cache=cache).keyword_paths(keyword)
 
 
-def new_files(logfile):
-    yield from (paths[1] for paths in keyword_paths(logfile, 'new file'))
+def new_files(logfile, cache=True):
+    yield from (paths[1] for paths in keyword_paths(logfile, 'new file', cache))
 
 
-def copied_files(logfile):
-    yield from keyword_paths(logfile, 'end copy')
+def copied_files(logfile, cache=True):
+    yield from keyword_paths(logfile, 'end copy', cache)
 
 
-def errors(logfile):
-    for line in line_gen(logfile):
-        if 'INFO' in line and 'read' in line:
-            last_read = line
-        elif 'ERROR' in line:
-            yield line, get_paths(last_read)[0]
+def errors(logfile, cache=True):
+    yield from index(logfile, cache=cache).errors()
 
 
 def filter(line_gen, filter_str):
@@ -66,7 +156,7 @@ def line_gen(logfile):
         line = True
         while line:
             line = file.readline()
-            yield line.strip()
+            yield render_line(line).strip()
 
 
 def get_paths(line):
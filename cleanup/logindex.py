@@ -0,0 +1,205 @@
+import hashlib
+import logging
+import os
+import pickle
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+from .log import render_line
+
+LOGGER = logging.getLogger(__name__)
+
+LINE_REGEX = re.compile(
+    r'(?:(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3}) )?'   # optional %(asctime)s
+    r'([A-Z]+):([^:]*):'                                    # level and logger
+    r'([^:"]*)'                                             # keyword
+    r'(?:[^"]*"([^"]+)"(?:[^"]*"([^"]+)")?)?'                 # first two quoted paths
+)
+COLUMNS = ['timestamp', 'level', 'logger', 'keyword', 'path1', 'path2']
+CATEGORIES = ['level', 'logger', 'keyword']
+
+
+def parse_lines(lines) -> pd.DataFrame:
+    """
+    Parses log lines into timestamp, level, logger, keyword and the first two quoted paths
+
+    The lines are matched with a single regex each, which is considerably faster than several passes of
+    ``Series.str.extract``.
+    """
+    empty = (None,) * len(COLUMNS)
+    records = [m.groups() if m is not None else empty for m in map(LINE_REGEX.match, lines)]
+    df = pd.DataFrame.from_records(records, columns=COLUMNS)
+    df['keyword'] = df['keyword'].str.strip()
+    for col in CATEGORIES:
+        df[col] = df[col].astype('category')
+    df['timestamp'] = pd.to_datetime(df['timestamp'], format='%Y-%m-%d %H:%M:%S,%f', errors='coerce')
+    return df
+
+
+def cache_file(logfile) -> Path:
+    """
+    :return: the file in the user's cache folder (``$XDG_CACHE_HOME`` or ``~/.cache``) that keeps the index of logfile
+    """
+    logfile = Path(logfile).resolve()
+    folder = Path(os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache') / 'cleanup' / 'logindex'
+    key = hashlib.blake2b(os.fsencode(logfile), digest_size=8).hexdigest()
+    return folder / f'{logfile.name}-{key}.idx'
+
+
+class LogIndex:
+    """
+    Columnar index of a log file written by :func:`cleanup.log.configure`, plain or structured
+
+    Each line is parsed once into one row with its byte offset, timestamp (if the format has one), level, logger,
+    keyword (the text of the message before the first ``:`` or ``"``) and the first two quoted paths. With a cache,
+    the index is pickled and later extended from the last indexed byte when the log grows, or rebuilt if the log was
+    rewritten.
+
+    :param cache: file to keep the index in, True for the one in the user's cache folder (see :func:`cache_file`),
+        or None to not keep it
+    """
+    def __init__(self, logfile, cache=None, block_size=2 ** 24, workers=None):
+        self.logfile = Path(logfile)
+        if cache is True:
+            cache = cache_file(self.logfile)
+        self.cache_path = Path(cache) if cache else None
+        self.block_size = block_size
+        self.workers = workers
+        self.df = None
+        self.offset = 0
+        self.head = b''
+        self.update()
+
+    def __len__(self):
+        return self.df.shape[0]
+
+    def load(self):
+        if self.cache_path is None or not self.cache_path.exists():
+            return
+        try:
+            with self.cache_path.open('rb') as file:
+                state = pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            LOGGER.warning('could not load the index "%s": %r', self.cache_path, e)
+            return
+        # the same cache file may have been used for another log
+        if state.get('logfile') == str(self.logfile.resolve()):
+            self.df, self.offset, self.head = state['df'], state['offset'], state['head']
+
+    def save(self):
+        if self.cache_path is None:
+            return
+        state = {'logfile': str(self.logfile.resolve()), 'df': self.df, 'offset': self.offset, 'head': self.head}
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            with self.cache_path.open('wb') as file:
+                pickle.dump(state, file, pickle.HIGHEST_PROTOCOL)
+        except OSError as e:
+            # the index is only a cache, e.g. the folder of the log may not be writable
+            LOGGER.warning('could not save the index "%s": %r', self.cache_path, e)
+
+    def update(self):
+        """
+        Indexes the lines that were added to the log since the last update
+        """
+        if self.df is None:
+            self.load()
+
+        with self.logfile.open('rb') as file:
+            head = file.read(1024)
+            size = file.seek(0, 2)
+            if self.df is None or size < self.offset or head[:len(self.head)] != self.head:
+                LOGGER.info(f'building index of {self.logfile}')
+                self.df, self.offset = None, 0
+            elif size == self.offset:
+                return self
+            self.head = head
+
+            file.seek(self.offset)
+            blocks = [self.df] if self.df is not None else []
+            if self.workers is not None and self.workers > 1:
+                blocks.extend(self.parse_parallel(self.read_blocks(file)))
+            else:
+                blocks.extend(self.parse_block(lines, offset) for lines, offset in self.read_blocks(file))
+
+        df = pd.concat(blocks, ignore_index=True) if blocks else self.parse_block([], 0)
+        for col in CATEGORIES:
+            # concat falls back to object if the categories of the blocks differ
+            df[col] = df[col].astype('category')
+        self.df = df
+        self.save()
+        return self
+
+    def read_blocks(self, file):
+        """
+        Reads the complete lines from the current position of file in blocks of about block_size bytes
+
+        :return: generator of (lines, offset of the first line)
+        """
+        while True:
+            lines = file.readlines(self.block_size)
+            if lines and not lines[-1].endswith(b'\n'):
+                # the last line is still being written, leave it for the next update
+                lines.pop()
+            if not lines:
+                break
+            yield lines, self.offset
+            self.offset += sum(len(line) for line in lines)
+
+    def parse_parallel(self, blocks):
+        """
+        Parses blocks in a process pool while keeping only a few of them in memory at a time
+        """
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            pending = deque()
+            for lines, offset in blocks:
+                pending.append(pool.submit(self.parse_block, lines, offset))
+                if len(pending) >= 2 * self.workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+
+    @staticmethod
+    def parse_block(lines, offset) -> pd.DataFrame:
+        lengths = pd.Series([len(line) for line in lines], dtype='int64')
+        text = [line.decode('utf-8', errors='replace').rstrip('\r\n') for line in lines]
+        df = parse_lines([render_line(line) for line in text])
+        df.insert(0, 'offset', offset + lengths.cumsum() - lengths)
+        return df
+
+    def matching(self, keyword: str) -> pd.DataFrame:
+        """
+        :return: the rows whose keyword contains the given text
+        """
+        cats = self.df['keyword'].cat.categories
+        return self.df[self.df['keyword'].isin(cats[cats.str.contains(keyword, regex=False)])]
+
+    def keyword_paths(self, keyword: str):
+        rows = self.matching(keyword)
+        for p1, p2 in zip(rows['path1'], rows['path2']):
+            yield tuple(Path(p) for p in (p1, p2) if isinstance(p, str))
+
+    def lines(self, rows: pd.DataFrame):
+        """
+        Reads the original text of the given rows back from the log
+        """
+        with self.logfile.open('rb') as file:
+            for offset in rows['offset']:
+                file.seek(offset)
+                line = file.readline().decode('utf-8', errors='replace').strip()
+                yield render_line(line)
+
+    def errors(self):
+        """
+        :return: generator of (error line, first path of the last INFO line about reading something before it)
+        """
+        df = self.df
+        read = (df['level'] == 'INFO') & df['keyword'].astype(str).str.contains('read', regex=False)
+        last_read = df['path1'].where(read).ffill()
+        rows = df[df['level'] == 'ERROR']
+        for line, path in zip(self.lines(rows), last_read[rows.index]):
+            yield line, Path(path) if isinstance(path, str) else None
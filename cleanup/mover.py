@@ -0,0 +1,274 @@
+import errno
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+LOGGER = logging.getLogger(__name__)
+
+# ioctl to make a copy-on-write clone of a file on btrfs/xfs, from linux/fs.h
+FICLONE = 0x40049409
+# errors that mean a zero-copy method isn't available for this pair of files
+UNSUPPORTED = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF, errno.EPERM}
+# errors that mean a hardlink can't be made between the two paths
+NO_LINK = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.EOPNOTSUPP, errno.ENOSYS}
+
+
+@dataclass
+class TransferStats:
+    done: int = 0
+    skipped: int = 0
+    resumed: int = 0
+    failed: int = 0
+    conflicts: int = 0
+
+    def __str__(self):
+        return (f'{self.done} done, {self.skipped} already existed, {self.resumed} resumed, {self.failed} failed, '
+                f'{self.conflicts} left out for sharing a destination')
+
+
+def _reflink(fsrc, fdst) -> bool:
+    try:
+        import fcntl
+        fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+        return True
+    except (ImportError, OSError):
+        return False
+
+
+def _complete(sent: int, size: int) -> bool:
+    """
+    :return: whether a zero-copy method that stopped after sent bytes copied the whole file, False if it didn't copy
+        anything so the next method can be tried
+    :raises OSError: if it stopped part way, e.g. because src got shorter
+    """
+    if sent == size:
+        return True
+    if sent == 0:
+        return False
+    raise OSError(errno.EIO, f'copied only {sent} of {size} bytes')
+
+
+def _copy_range(fsrc, fdst, size: int) -> bool:
+    func = getattr(os, 'copy_file_range', None)
+    if func is None:
+        return False
+    try:
+        sent = 0
+        while sent < size:
+            n = func(fsrc.fileno(), fdst.fileno(), size - sent)
+            if n == 0:
+                break
+            sent += n
+        return _complete(sent, size)
+    except OSError as e:
+        if e.errno in UNSUPPORTED and fdst.tell() == 0:
+            return False
+        raise
+
+
+def _sendfile(fsrc, fdst, size: int) -> bool:
+    if not hasattr(os, 'sendfile') or os.name == 'nt':
+        return False
+    try:
+        sent = 0
+        while sent < size:
+            n = os.sendfile(fdst.fileno(), fsrc.fileno(), sent, size - sent)
+            if n == 0:
+                break
+            sent += n
+        return _complete(sent, size)
+    except OSError as e:
+        if e.errno in UNSUPPORTED and sent == 0:
+            return False
+        raise
+
+
+def place(tmp: Path, dest: Path):
+    """
+    Renames tmp to dest without ever replacing an existing dest, raises :class:`FileExistsError` instead
+
+    ``os.rename`` and ``os.replace`` overwrite on POSIX, so the name is taken with a hardlink, which fails if dest
+    exists. Where hardlinks aren't supported, dest is claimed by creating it exclusively and then replaced.
+    """
+    try:
+        os.link(tmp, dest)
+    except OSError as e:
+        if e.errno not in NO_LINK:
+            raise
+        os.close(os.open(dest, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        os.replace(tmp, dest)
+    else:
+        os.unlink(tmp)
+
+
+def copy_file(src: Path, dest: Path, reflink: bool = True):
+    """
+    Copies a file to a temporary name next to dest and renames it into place once it's complete
+
+    The data is copied with the cheapest method available: a copy-on-write clone, ``copy_file_range``, ``sendfile``,
+    and finally a plain buffered copy. The timestamps of src are kept. An existing dest is never replaced, see
+    :func:`place`.
+    """
+    size = os.stat(src).st_size
+    # a name of its own for every copy, so copies to the same dest don't write into each other's file
+    fd, tmp = tempfile.mkstemp(suffix='.part', prefix=dest.name + '.', dir=dest.parent)
+    try:
+        with open(src, 'rb') as fsrc, open(fd, 'wb') as fdst:
+            if not ((reflink and _reflink(fsrc, fdst)) or _copy_range(fsrc, fdst, size)
+                    or _sendfile(fsrc, fdst, size)):
+                shutil.copyfileobj(fsrc, fdst, 2 ** 20)
+        shutil.copystat(src, tmp)
+        place(Path(tmp), dest)
+    except BaseException:
+        if os.path.lexists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def move_file(src: Path, dest: Path, reflink: bool = True):
+    try:
+        # a hardlink and an unlink, as a rename would replace an existing dest
+        os.link(src, dest)
+    except OSError as e:
+        if e.errno not in NO_LINK:
+            raise
+        copy_file(src, dest, reflink)
+    os.unlink(src)
+
+
+def link_file(src: Path, dest: Path, reflink: bool = True):
+    try:
+        os.link(src, dest)
+    except OSError as e:
+        if e.errno not in NO_LINK:
+            raise
+        LOGGER.warning('could not hardlink, copying instead: "%s", "%s"', src, dest)
+        copy_file(src, dest, reflink)
+
+
+MODES = {'copy': copy_file, 'move': move_file, 'link': link_file}
+
+
+class Journal:
+    """
+    Append-only record of the finished transfers, used to skip them when a run is repeated
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.done = set()
+        if self.path.exists():
+            with self.path.open('r', encoding='utf-8') as file:
+                self.done = {tuple(line.rstrip('\n').split('\t')) for line in file if '\t' in line}
+        self.file = self.path.open('a', encoding='utf-8')
+
+    def __contains__(self, item):
+        return item in self.done
+
+    def add(self, src: str, dest: str):
+        with self.lock:
+            self.file.write(f'{src}\t{dest}\n')
+            self.file.flush()
+            self.done.add((src, dest))
+
+    def close(self):
+        self.file.close()
+
+
+def transfer_files(df,
+                   mode='copy',
+                   workers=8,
+                   journal=None,
+                   src_col='path',
+                   dest_col='dest',
+                   mask_col='unique',
+                   reflink=True) -> TransferStats:
+    """
+    Copies, moves or hardlinks every selected file in a processed DataFrame to its destination
+
+    Destination folders are created up front, one call per folder, and the files are transferred by a pool of
+    ``workers`` threads. Existing destinations are never overwritten, and if more than one file has the same
+    destination only the first one is transferred. Rows without a source or a destination are skipped. Every finished transfer is logged as
+    ``new file: "src", "dest"`` and ``end copy: "src", "dest"`` (or ``end move``/``end link``) so the results can
+    be read back with :func:`cleanup.log.new_files` and :func:`cleanup.log.copied_files`.
+
+    :param df: DataFrame with source and destination columns
+    :param mode: 'copy', 'move' or 'link'
+    :param workers: number of transfers running at the same time
+    :param journal: file recording the finished transfers, a rerun with the same journal skips them
+    :param src_col: column with the source paths
+    :param dest_col: column with the destination paths
+    :param mask_col: only transfer rows where this column is True, None to transfer every row
+    :param reflink: try copy-on-write clones first when copying
+    :return: counts of what happened
+    """
+    func = MODES[mode]
+    if mask_col is not None:
+        df = df[df[mask_col].astype(bool)]
+    stats = TransferStats()
+    # str() would turn a missing destination into a file called 'nan' in the working directory
+    missing = df[src_col].isna() | df[dest_col].isna()
+    for src in df.loc[missing, src_col]:
+        LOGGER.warning('no destination: "%s"', src)
+    stats.skipped = int(missing.sum())
+    df = df[~missing]
+    pairs = list(dict.fromkeys((str(s), str(d)) for s, d in zip(df[src_col], df[dest_col])))
+
+    # only the first file for each destination is transferred, see DestinationPlanner for unique destinations
+    first = {}
+    for src, dest in pairs:
+        if first.setdefault(dest, src) != src:
+            LOGGER.error('destination already taken by "%s": "%s", "%s"', first[dest], src, dest)
+            stats.conflicts += 1
+    pairs = [(s, d) for s, d in pairs if first[d] == s]
+    journal = Journal(journal) if journal is not None else None
+    if journal is not None:
+        todo = [p for p in pairs if p not in journal]
+        stats.resumed = len(pairs) - len(todo)
+        pairs = todo
+    LOGGER.info(f'{mode}: {len(pairs)} files, {stats.resumed} already done')
+
+    for folder in {os.path.dirname(d) for s, d in pairs}:
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    lock = threading.Lock()
+
+    def run(pair):
+        src, dest = pair
+        if os.path.lexists(dest):
+            LOGGER.info('file already exists: "%s"', dest)
+            result = 'skipped'
+        else:
+            LOGGER.debug('start %s: "%s", "%s"', mode, src, dest)
+            try:
+                func(Path(src), Path(dest), reflink)
+            except FileExistsError:
+                LOGGER.info('file already exists: "%s"', dest)
+                result = 'skipped'
+            except OSError as e:
+                LOGGER.error('%s failed: "%s", "%s", %r', mode, src, dest, e)
+                result = 'failed'
+            else:
+                LOGGER.info('new file: "%s", "%s"', src, dest)
+                LOGGER.info('end %s: "%s", "%s"', mode, src, dest)
+                if journal is not None:
+                    journal.add(src, dest)
+                result = 'done'
+        with lock:
+            setattr(stats, result, getattr(stats, result) + 1)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(run, pairs))
+    finally:
+        if journal is not None:
+            journal.close()
+
+    LOGGER.info(f'{mode}: {stats}')
+    return stats
@@ -0,0 +1,220 @@
+"""
+Batch pipeline that runs scan -> processing -> transfer from a single yaml config, for unattended runs
+
+Example config::
+
+    source: D:/Pictures
+    work_dir: D:/cleanup/nightly      # checkpoints, log and status of the runs
+    filesize_min: 50000               # scan settings, see cleanup.df.statdf.scan_kwargs
+    exif: true
+    fast_exif: true
+    scan_workers: 8
+    cache: D:/cleanup/metadata.db
+    processing:                       # see ProcessChain.from_yaml, the de-duplication and destinations are processors
+      - exclude_folders: ['Recycle Bin', '.thumbnails']
+      - include_ext: ['.jpg']
+      - pathdate: {}
+      - convert_ifdtag: {cols: ['Image DateTime']}
+      - select_date: ['Image DateTime', 'pathdate', 'st_mtime']
+      - duplicates: {mask_cols: [included_folder, included_filetype], source_cols: [filename, st_size]}
+      - dest_gen: E:/Sorted
+      - plan_dest: {}                 # numbered names for files that would land on the same destination
+    transfer:                         # see cleanup.mover.transfer_files
+      mode: copy
+      workers: 8
+
+Each stage writes a checkpoint to the work folder: the scanned and the processed DataFrames (as Parquet if pyarrow is
+installed, otherwise as pickles) and a journal of the finished transfers. A stage with a checkpoint is loaded from it
+instead of being run again, unless it's forced; once a stage runs, every later stage runs as well.
+"""
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List
+
+LOGGER = logging.getLogger(__name__)
+
+STAGES = ['scan', 'process', 'transfer']
+
+
+def checkpoint_format() -> str:
+    try:
+        import pyarrow
+    except ImportError:
+        return 'pickle'
+    return 'parquet'
+
+
+@dataclass
+class Pipeline:
+    """
+    :param config: parsed yaml config, see the module docs
+    :param work_dir: folder for the checkpoints, defaults to the ``work_dir`` key of the config
+    :param workers: threads for the scan and the transfers, overrides the config
+    :param processes: processes for the row local processors, see :meth:`ProcessChain.process_parallel
+        <cleanup.processing.chain.ProcessChain.process_parallel>`
+    :param memory_limit: bytes the processing should stay under. If the scanned DataFrame would take more than a
+        quarter of it, the chain is run on chunks read from the scan checkpoint with
+        :meth:`~cleanup.processing.chain.ProcessChain.process_chunks` instead of on the whole DataFrame. Needs
+        Parquet or Feather checkpoints, a pickle can only be read as a whole.
+    :param fmt: format of the DataFrame checkpoints, 'parquet', 'feather' or 'pickle'
+    """
+    config: dict
+    work_dir: Path = None
+    workers: int = None
+    processes: int = None
+    memory_limit: int = None
+    fmt: str = field(default_factory=checkpoint_format)
+    status: Dict[str, dict] = field(default_factory=dict, init=False, repr=False)
+    # output of the last stage that ran, None if the next stage has to start from a checkpoint
+    df: object = field(default=None, init=False, repr=False)
+
+    def __post_init__(self):
+        if self.memory_limit is not None and self.fmt == 'pickle':
+            raise ValueError('a memory limit needs Parquet or Feather checkpoints to read the scan in chunks, '
+                             'install pyarrow')
+        self.work_dir = Path(self.work_dir or self.config.get('work_dir', '.'))
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_yaml(cls, yaml_path, **kwargs) -> 'Pipeline':
+        import yaml
+        with Path(yaml_path).open('r') as file:
+            config = yaml.load(file, Loader=yaml.SafeLoader)
+        return cls(config, **kwargs)
+
+    def checkpoint(self, stage: str) -> Path:
+        if stage == 'transfer':
+            return self.work_dir / 'transfer.json'
+        suffix = {'parquet': '.parquet', 'feather': '.feather', 'pickle': '.pkl'}[self.fmt]
+        return self.work_dir / f'{stage}{suffix}'
+
+    def save(self, df, stage: str):
+        file = self.checkpoint(stage)
+        tmp = file.with_name(f'{file.stem}.tmp{file.suffix}')
+        if self.fmt == 'pickle':
+            df.to_pickle(tmp)
+        else:
+            from .df import store
+            store.save_df(df, tmp, self.fmt)
+        # replaced in one step, so an interrupted save never leaves a truncated checkpoint behind
+        os.replace(tmp, file)
+
+    def load(self, stage: str):
+        file = self.checkpoint(stage)
+        if not file.exists():
+            raise FileNotFoundError(f'{stage} has no checkpoint to start from, run it first: "{file}"')
+        LOGGER.info(f'loading checkpoint of {stage}: "{file}"')
+        if self.fmt == 'pickle':
+            import pandas as pd
+            return pd.read_pickle(file)
+        from .df import store
+        return store.load_df(file)
+
+    def run(self, stages: List[str] = None, force: List[str] = None, dry_run: bool = False) -> dict:
+        """
+        Runs the stages in order
+
+        :param stages: stages to run, defaults to all of them. The ones that are left out are skipped and the next
+            stage starts from their checkpoint.
+        :param force: stages to run even if they have a checkpoint
+        :param dry_run: stop before transferring any files
+        :return: status of each stage, also written to ``status.json`` in the work folder
+        """
+        stages = stages or STAGES
+        force = set(force or [])
+        self.df, rerun = None, False
+        for stage in STAGES:
+            if stage == 'transfer' and dry_run:
+                LOGGER.info('dry run, not transferring any files')
+                self.set_status(stage, 'skipped')
+            elif stage in stages and (rerun or stage in force or not self.checkpoint(stage).exists()):
+                start = time.perf_counter()
+                info = getattr(self, stage)() or {}
+                if self.df is not None:
+                    info['rows'] = int(self.df.shape[0])
+                self.set_status(stage, 'done', seconds=round(time.perf_counter() - start, 3), **info)
+                rerun = True
+            else:
+                # the next stage loads the checkpoint if it needs it
+                self.df = None
+                self.set_status(stage, 'checkpoint' if self.checkpoint(stage).exists() else 'skipped')
+        return self.status
+
+    def set_status(self, stage: str, state: str, **info):
+        self.status[stage] = dict(state=state, **info)
+        LOGGER.info(f'{stage}: {state} {info if info else ""}'.strip())
+        with (self.work_dir / 'status.json').open('w') as file:
+            json.dump(self.status, file, indent=2)
+
+    def take(self, stage: str):
+        """
+        :return: the output of stage, from memory or from its checkpoint, and lets go of the reference to it
+        """
+        df, self.df = self.df, None
+        return df if df is not None else self.load(stage)
+
+    def scan(self):
+        from .df.statdf import scan_kwargs, stat_df
+        kwargs = scan_kwargs(self.config)
+        if self.workers is not None:
+            kwargs['workers'] = self.workers
+        self.df = stat_df(self.config['source'], **kwargs)
+        self.save(self.df, 'scan')
+
+    def process(self):
+        from .processing.chain import ProcessChain
+        from .processing.report import frame_bytes
+        chain = ProcessChain.from_config(self.config['processing'])
+        chain.workers = self.processes
+        df = self.take('scan')
+        chunksize = self.chunksize(df)
+        if chunksize is None:
+            df = chain.process_all(df)
+        else:
+            import pandas as pd
+            from .df import store
+            LOGGER.info(f'{frame_bytes(df)} bytes of metadata, processing in chunks of {chunksize} rows')
+            del df
+            chunks = store.iter_df(self.checkpoint('scan'), chunksize)
+            df = pd.concat(chain.process_chunks(chunks, spill_dir=self.work_dir))
+        self.save(df, 'process')
+        if chain.report is not None:
+            chain.report.to_json(self.work_dir / 'report.json')
+        self.df = df
+
+    def chunksize(self, df):
+        """
+        :return: number of rows per chunk that keeps the processing under the memory limit, None if the whole
+            DataFrame fits
+        """
+        if self.memory_limit is None or df.empty:
+            return None
+        sample = df.iloc[:1000]
+        row_bytes = sample.memory_usage(index=True, deep=True).sum() / sample.shape[0]
+        # processors add columns and make copies, so leave room for a few times the input
+        budget = self.memory_limit / 4
+        if row_bytes * df.shape[0] <= budget:
+            return None
+        return max(int(budget / row_bytes), 100)
+
+    def transfer(self) -> dict:
+        from .mover import transfer_files
+        df = self.take('process')
+        cfg = dict(self.config.get('transfer', {}))
+        if self.workers is not None:
+            cfg['workers'] = self.workers
+        cfg.setdefault('journal', self.work_dir / 'transfer.journal')
+        # e.g. the undated files of DatedDestinationGen, they stay where they are
+        missing = df[cfg.get('dest_col', 'dest')].isna()
+        if missing.any():
+            LOGGER.warning(f'{missing.sum()} files have no destination')
+            df = df[~missing]
+        stats = vars(transfer_files(df, **cfg))
+        stats['no_dest'] = int(missing.sum())
+        with self.checkpoint('transfer').open('w') as file:
+            json.dump(stats, file, indent=2)
+        return stats
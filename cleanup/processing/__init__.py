@@ -1,7 +1,34 @@
-from .base import BaseFilenameMaker
-from .basic import FolderExcluder, FileIncluder, MinFileSize, ParentCol
-from .chain import ProcessChain
-from .date import ScanPathDate, DateSelector
-from .dest import DestinationGenerator
-from .processor import ConvertIfdTag
-from .unique import UniqueIDer
+import importlib
+
+_LAZY = {
+    'BaseFilenameMaker': '.base',
+    'FolderExcluder': '.basic',
+    'FileIncluder': '.basic',
+    'MinFileSize': '.basic',
+    'ParentCol': '.basic',
+    'ProcessChain': '.chain',
+    'ContentHasher': '.content',
+    'ScanPathDate': '.date',
+    'DateSelector': '.date',
+    'DestinationGenerator': '.dest',
+    'DatedDestinationGen': '.dest',
+    'DestinationPlanner': '.dest',
+    'NearDuplicates': '.phash',
+    'ConvertIfdTag': '.processor',
+    'ChainReport': '.report',
+    'UniqueIDer': '.unique',
+}
+
+__all__ = list(_LAZY)
+
+
+def __getattr__(name):
+    if name not in _LAZY:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    value = getattr(importlib.import_module(_LAZY[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
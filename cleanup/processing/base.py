@@ -5,28 +5,40 @@ from typing import List
 
 import pandas as pd
 
+from .filter import combine
 from .processor import Processor
+from ..df import paths
 
 
 @dataclass
 class BaseFilenameMaker(Processor):
+    row_local = True
+
     regexes: List[str]
     path_col:str = 'path'
     res_col:str = 'base'
     match_col:str = 'match'
 
     def __post_init__(self):
+        # a single pass with all the regexes finds the stems that none of them match, which don't need trimming
+        self.prefilter = combine([getattr(r, 'pattern', r) for r in self.regexes], re.IGNORECASE, strip_groups=True)
         self.regexes = [re.compile(r, re.IGNORECASE) for r in self.regexes]
 
     def process(self, df: pd.DataFrame) -> pd.DataFrame:
         cols = [self.res_col, self.match_col]
-        vals = df[self.path_col].apply(self.convert_base_filename, regexes=self.regexes)
-        df[cols] = pd.DataFrame(data=vals.to_list(), index=df.index)
+        codes, stems = pd.factorize(paths.stems(df, self.path_col))
+        vals = [self.trim_stem(stem, self.regexes) if self.prefilter is None or self.prefilter.search(stem)
+                else (stem, None) for stem in stems]
+        vals = [vals[c] if c >= 0 else (None, None) for c in codes]
+        df[cols] = pd.DataFrame(data=vals, index=df.index)
         return df
 
     @staticmethod
     def convert_base_filename(path: Path, regexes) -> str:
-        filename = path.stem
+        return BaseFilenameMaker.trim_stem(Path(path).stem, regexes)
+
+    @staticmethod
+    def trim_stem(filename: str, regexes) -> str:
         trim = ''
         for rgx in regexes:
             m = rgx.search(filename)
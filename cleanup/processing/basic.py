@@ -5,6 +5,7 @@ from typing import List
 import pandas as pd
 
 from . import filter
+from ..df import paths
 from .processor import Processor
 
 logger = logging.getLogger(__name__)
@@ -12,12 +13,16 @@ logger = logging.getLogger(__name__)
 
 @dataclass
 class FolderExcluder(Processor):
+    row_local = True
+
     folders: List[str]
     source_col: str = 'path'
     res_col: str = 'included_folder'
+    # 'parent' only checks the folders of the files, once per folder, so the file names can't match
+    match_on: str = 'path'
 
     def process(self, df: pd.DataFrame) -> pd.DataFrame:
-        m = ~filter.filter_path(df, self.folders, self.source_col)
+        m = ~filter.filter_path(df, self.folders, self.source_col, match_on=self.match_on)
         logger.info(f'Included files based on their paths'.ljust(self.width) + f'{m.sum()}')
         df[self.res_col] = m
         return df
@@ -25,6 +30,8 @@ class FolderExcluder(Processor):
 
 @dataclass
 class FileIncluder(Processor):
+    row_local = True
+
     file_types: List[str]
     source_col: str = 'path'
     res_col: str = 'included_filetype'
@@ -38,6 +45,8 @@ class FileIncluder(Processor):
 
 @dataclass
 class MinFileSize(Processor):
+    row_local = True
+
     min_size: int
     source_col: str = 'st_size'
     res_col: str = 'above_min_filesize'
@@ -51,9 +60,14 @@ class MinFileSize(Processor):
 
 @dataclass
 class ParentCol(Processor):
+    row_local = True
+
     source_col:str = 'path'
     res_col: str = 'parent'
 
     def process(self, df: pd.DataFrame) -> pd.DataFrame:
-        df[self.res_col] = df[self.source_col].apply(lambda p: p.parents[0])
+        # the parent column of compact_paths is kept as it is, the cached parents are categorical
+        compact = paths.is_compact(df, 'parent', self.source_col)
+        res = paths.parents(df, self.source_col)
+        df[self.res_col] = res if compact else res.astype('string')
         return df
@@ -1,50 +1,96 @@
+import importlib
 import logging
-from dataclasses import dataclass
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List
+from typing import Iterable, Iterator, List, Mapping
 
 import pandas as pd
-import yaml
-
-from .base import BaseFilenameMaker
-from .basic import FolderExcluder, MinFileSize, FileIncluder, ParentCol
-from .date import DateSelector
-from .date import ScanPathDate
-from .dest import DestinationGenerator, DatedDestinationGen
-from .processor import ConvertIfdTag
+
+from . import parallel
+from ..df import paths
 from .processor import Processor
-from .unique import UniqueIDer, BiggestUnique, MatchingTime
+from .report import ChainReport, ProcessorStats
 
 logger = logging.getLogger(__name__)
 
+# settings of the processors that name the columns they read
+INPUT_FIELDS = ['source_col', 'source_cols', 'path_col', 'size_col', 'mask_cols', 'cols']
+
+
+class ProcessorMap(Mapping):
+    """
+    The processor classes by their key in the ``processing`` section of a yaml config, imported when first looked up
+    """
+    def __init__(self, names: dict):
+        self.names = names
+
+    def __getitem__(self, key) -> type:
+        module, name = self.names[key].rsplit('.', 1)
+        return getattr(importlib.import_module(module, __package__), name)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
 
-processor_map = {
-    'exclude_folders': FolderExcluder,
-    'filesize_min': MinFileSize,
-    'include_ext': FileIncluder,
-    'base_filename': BaseFilenameMaker,
-    'parent_col': ParentCol,
-    'pathdate': ScanPathDate,
-    'convert_ifdtag': ConvertIfdTag,
-    'select_date': DateSelector,
-    'duplicates': UniqueIDer,
-    'dest_gen': DestinationGenerator,
-    'biggest_unique': BiggestUnique,
-    'matching time': MatchingTime,
-    'dated dest': DatedDestinationGen
-}
+
+processor_map = ProcessorMap({
+    'exclude_folders': '.basic.FolderExcluder',
+    'filesize_min': '.basic.MinFileSize',
+    'include_ext': '.basic.FileIncluder',
+    'base_filename': '.base.BaseFilenameMaker',
+    'parent_col': '.basic.ParentCol',
+    'pathdate': '.date.ScanPathDate',
+    'convert_ifdtag': '.processor.ConvertIfdTag',
+    'select_date': '.date.DateSelector',
+    'duplicates': '.unique.UniqueIDer',
+    'dest_gen': '.dest.DestinationGenerator',
+    'biggest_unique': '.unique.BiggestUnique',
+    'matching time': '.unique.MatchingTime',
+    'dated dest': '.dest.DatedDestinationGen',
+    'plan_dest': '.dest.DestinationPlanner',
+    'content_hash': '.content.ContentHasher',
+    'near_duplicates': '.phash.NearDuplicates',
+})
 
 
 @dataclass
 class ProcessChain:
+    """
+    Runs a list of processors over a DataFrame
+
+    Every run measures the wall time, CPU time, rows in and out and the change in (shallow) memory use of the
+    DataFrame for each processor, and leaves them in :attr:`report`. With ``profile`` each processor is also run
+    under cProfile and the report includes its top functions.
+
+    With ``workers`` set, the runs of row local processors are spread over a process pool, see
+    :meth:`process_parallel`.
+    """
     processors: List[Processor]
+    instrument: bool = True
+    profile: bool = False
+    workers: int = None
+    partition: str = 'rows'
+    report: ChainReport = field(default=None, init=False, repr=False, compare=False)
 
     @staticmethod
     def from_yaml(yaml_path):
+        import yaml
         yaml_path = yaml_path if isinstance(yaml_path, Path) else Path(yaml_path)
         with yaml_path.open('r') as file:
             cfg = yaml.load(file, Loader=yaml.SafeLoader)['processing']
+        return ProcessChain.from_config(cfg)
 
+    @staticmethod
+    def from_config(cfg: List[dict]):
+        """
+        :param cfg: the ``processing`` section of a yaml config, a list of single key dicts that map a key of
+            :data:`processor_map` to the arguments of the processor
+        """
         def make_processor(config):
             processor_key = list(config.keys())[0]
             processor = processor_map[processor_key]
@@ -57,10 +103,183 @@ class ProcessChain:
         return ProcessChain([make_processor(p) for p in cfg])
 
     def process_all(self, df: pd.DataFrame) -> pd.DataFrame:
+        if self.workers is not None and self.workers > 1:
+            return self.process_parallel(df)
         logger.info(f'Processing'.ljust(50) + f'{df.shape[0]} files')
+        self.start_report()
         for p in self.processors:
             logger.info(repr(p))
-            df = p.process(df)
+            df = self.run(p, df)
+        df = paths.drop_cached(df)
+        self.finish_report()
         logger.info('-' * 70)
         logger.info(f'Total remaining files'.ljust(50) + f'{df.shape[0]}')
         return df
+
+    def process_parallel(self, df: pd.DataFrame, workers: int = None) -> pd.DataFrame:
+        """
+        Runs the chain with the row local stages spread over a pool of worker processes
+
+        The DataFrame is split into one part per worker, by row ranges or with ``partition='parent'`` by folder, and
+        each part goes through the whole stage in one worker. Columns of Path objects travel as strings, and the parts
+        as Arrow streams if pyarrow is installed. Processors that need every row run in this process on the merged
+        DataFrame. The result is the same as :meth:`process_all`, the reported times of the row local processors are
+        summed over the workers.
+
+        :param workers: number of processes, defaults to :attr:`workers`
+        """
+        workers = workers or self.workers or 1
+        logger.info(f'Processing with {workers} processes'.ljust(50) + f'{df.shape[0]} files')
+        self.start_report()
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for stage in self.stages():
+                if stage[0].row_local:
+                    df = self.parallel_stage(stage, df, pool, workers)
+                else:
+                    logger.info(repr(stage[0]))
+                    df = self.run(stage[0], df)
+        df = paths.drop_cached(df)
+        self.finish_report()
+        logger.info('-' * 70)
+        logger.info(f'Total remaining files'.ljust(50) + f'{df.shape[0]}')
+        return df
+
+    def parallel_stage(self, stage: List[Processor], df: pd.DataFrame, pool, workers: int) -> pd.DataFrame:
+        for p in stage:
+            logger.info(f'parallel {repr(p)}')
+        parts = parallel.partition(df, workers, self.partition)
+        if not parts:
+            for p in stage:
+                df = self.run(p, df)
+            return df
+
+        shipped, cols = parallel.ship(df)
+        futures = [pool.submit(parallel.run_partition, stage, parallel.pack(part), cols, self.instrument, self.profile)
+                   for part in parallel.split_frame(shipped, parts)]
+        del shipped
+        results = [f.result() for f in futures]
+        for res in results:
+            for p, s in zip(stage, res[4]):
+                self._stats[id(p)].add(s)
+        return parallel.merge(df, results)
+
+    def start_report(self):
+        self.report = ChainReport([ProcessorStats(type(p).__name__, repr(p)) for p in self.processors])
+        self._stats = {id(p): s for p, s in zip(self.processors, self.report.processors)}
+
+    def finish_report(self):
+        for s in self.report.processors:
+            s.finish()
+        if self.instrument:
+            logger.info(f'Processor timings:\n{self.report}')
+
+    def run(self, p: Processor, df: pd.DataFrame) -> pd.DataFrame:
+        if not self.instrument:
+            return p.process(df)
+        return self._stats[id(p)].measure(p.process, df, self.profile)
+
+    def input_columns(self) -> List[str]:
+        """
+        Columns the processors read, as far as they can be told from their source/path/mask column settings and their
+        key columns. Some of them may be made by earlier processors in the chain. Meant for loading only what's
+        needed with :func:`cleanup.df.store.load_df`.
+        """
+        res = ['path']
+        for p in self.processors:
+            for name in INPUT_FIELDS:
+                value = getattr(p, name, None)
+                res.extend([value] if isinstance(value, str) else value or [])
+            try:
+                res.extend(p.key_cols())
+            except NotImplementedError:
+                pass
+        return list(dict.fromkeys(res))
+
+    def stages(self) -> List[List[Processor]]:
+        """
+        Splits the processors into runs of consecutive row local processors and single global processors
+        """
+        stages = []
+        for p in self.processors:
+            if p.row_local and stages and stages[-1][0].row_local:
+                stages[-1].append(p)
+            else:
+                stages.append([p])
+        return stages
+
+    def process_chunks(self, chunks: Iterable[pd.DataFrame], spill_dir=None) -> Iterator[pd.DataFrame]:
+        """
+        Runs the chain over a DataFrame that's split into chunks, without ever holding all of it in memory
+
+        Row local processors are applied to each chunk as it streams past. Before a processor that needs to see every
+        row, the chunks are spilled to disk and only the columns from its :meth:`Processor.key_cols` are kept in
+        memory. Its results are then joined back onto each chunk as the chunks are read back in. The chunks are
+        re-indexed with a running index so that the rows can be matched up.
+
+        :param chunks: iterable of DataFrames, like the output of :func:`iter_chunks` or :func:`read_pickles`
+        :param spill_dir: folder to spill the chunks to, defaults to the system temp folder
+        :return: generator of processed chunks
+        """
+        self.start_report()
+        stream = reindex(chunks)
+        for stage in self.stages():
+            if stage[0].row_local:
+                stream = self.stream_stage(stage, stream)
+            else:
+                stream = self.global_stage(stage[0], stream, spill_dir)
+        for chunk in stream:
+            yield paths.drop_cached(chunk)
+        self.finish_report()
+
+    def stream_stage(self, stage: List[Processor], stream: Iterator[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+        for p in stage:
+            logger.info(f'streaming {repr(p)}')
+        for chunk in stream:
+            for p in stage:
+                chunk = self.run(p, chunk)
+            yield chunk
+
+    def global_stage(self, p: Processor, stream: Iterator[pd.DataFrame], spill_dir=None) -> Iterator[pd.DataFrame]:
+        folder = Path(tempfile.mkdtemp(prefix='chain_', dir=spill_dir))
+        try:
+            files, keys = [], []
+            for i, chunk in enumerate(stream):
+                file = folder / f'{i}.pkl'
+                chunk.to_pickle(file)
+                files.append(file)
+                keys.append(chunk[[c for c in p.key_cols() if c in chunk]])
+                del chunk
+
+            key_df = pd.concat(keys)
+            del keys
+            logger.info(repr(p))
+            logger.info(f'Processing key columns'.ljust(50) + f'{key_df.shape[0]} files')
+            res = self.run(p, key_df)
+
+            for file in files:
+                chunk = pd.read_pickle(file)
+                file.unlink()
+                for col in res.columns:
+                    chunk[col] = res.loc[chunk.index, col]
+                yield chunk
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
+
+
+def reindex(chunks: Iterable[pd.DataFrame]) -> Iterator[pd.DataFrame]:
+    offset = 0
+    for chunk in chunks:
+        chunk.index = pd.RangeIndex(offset, offset + chunk.shape[0])
+        offset += chunk.shape[0]
+        yield chunk
+
+
+def iter_chunks(df: pd.DataFrame, chunksize: int) -> Iterator[pd.DataFrame]:
+    for start in range(0, df.shape[0], chunksize):
+        yield df.iloc[start:start + chunksize].copy()
+
+
+def read_pickles(files: Iterable[Path]) -> Iterator[pd.DataFrame]:
+    for file in files:
+        logger.info(f'Loading {file}')
+        yield pd.read_pickle(file)
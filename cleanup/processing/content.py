@@ -0,0 +1,115 @@
+import hashlib
+import logging
+import mmap
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List
+
+import pandas as pd
+
+from .processor import Processor
+
+logger = logging.getLogger(__name__)
+
+
+def partial_hash(path: Path, size: int, block: int = 4096) -> str:
+    """
+    Hashes the first and last block of a file, which is the whole file if it's smaller than 2 blocks
+    """
+    h = hashlib.blake2b(digest_size=16)
+    with Path(path).open('rb') as file:
+        h.update(file.read(block))
+        if size > 2 * block:
+            file.seek(-block, 2)
+        h.update(file.read(block))
+    return h.hexdigest()
+
+
+def full_hash(path: Path, bufsize: int = 2 ** 20) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    with Path(path).open('rb', buffering=0) as file:
+        try:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                for i in range(0, len(m), bufsize):
+                    h.update(m[i:i + bufsize])
+        except (ValueError, OSError):
+            # empty files and some network filesystems can't be mapped
+            buf = bytearray(bufsize)
+            view = memoryview(buf)
+            file.seek(0)
+            n = file.readinto(buf)
+            while n:
+                h.update(view[:n])
+                n = file.readinto(buf)
+    return h.hexdigest()
+
+
+@dataclass
+class ContentHasher(Processor):
+    """
+    Creates a column that identifies files by their content
+
+    The hashing is staged so that the amount of data read is proportional to the number of collisions rather than the
+    size of the archive:
+
+    1. files with a unique ``st_size`` can't have a duplicate, so they're never opened
+    2. files that share a size have their first and last ``block`` bytes hashed
+    3. files that still collide on that partial hash get a full hash
+
+    Files that get resolved at an earlier stage keep the key from that stage. Every key starts with the file size, so
+    ``res_col`` on its own can be used as the ``source_cols`` of :class:`~cleanup.processing.unique.UniqueIDer`.
+    """
+    mask_cols: List[str] = None
+    path_col: str = 'path'
+    size_col: str = 'st_size'
+    res_col: str = 'content_hash'
+    block: int = 4096
+    workers: int = 8
+
+    def key_cols(self) -> List[str]:
+        return (self.mask_cols or []) + [self.path_col, self.size_col]
+
+    def group_cols(self) -> List[str]:
+        return [self.size_col]
+
+    def process(self, df: pd.DataFrame) -> pd.DataFrame:
+        if self.mask_cols:
+            sub = df.loc[df[self.mask_cols].all(axis=1), [self.path_col, self.size_col]]
+        else:
+            sub = df[[self.path_col, self.size_col]]
+
+        size_key = 'size:' + sub[self.size_col].astype(str)
+        res = size_key.astype(object)
+        colliding = sub[sub.duplicated(self.size_col, keep=False)]
+        logger.info(f'Files sharing a size'.ljust(self.width) + f'{colliding.shape[0]}')
+
+        partial = self.hash_all(colliding, lambda row: partial_hash(row[0], row[1], self.block))
+        res.loc[partial.index] = size_key.loc[partial.index] + ':partial:' + partial
+
+        # files that fit in the 2 partial blocks were already hashed completely
+        big = colliding[colliding[self.size_col] > 2 * self.block]
+        keys = pd.DataFrame({'size': big[self.size_col], 'hash': partial.loc[big.index]})
+        colliding = big[keys.duplicated(keep=False)]
+        logger.info(f'Files sharing a partial hash'.ljust(self.width) + f'{colliding.shape[0]}')
+
+        full = self.hash_all(colliding, lambda row: full_hash(row[0]))
+        res.loc[full.index] = size_key.loc[full.index] + ':full:' + full
+
+        df[self.res_col] = None
+        df.loc[res.index, self.res_col] = res
+        return df
+
+    def hash_all(self, df: pd.DataFrame, func) -> pd.Series:
+        rows = list(zip(df[self.path_col], df[self.size_col]))
+
+        def safe(row):
+            try:
+                return func(row)
+            except OSError as e:
+                logger.exception(repr(e))
+                # unreadable files get a key that can't collide with anything
+                return f'error:{row[0]}'
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            return pd.Series(list(pool.map(safe, rows)), index=df.index, dtype=object)
@@ -9,23 +9,36 @@ from ..df.utils import scan_pathdate
 
 @dataclass
 class ScanPathDate(Processor):
+    row_local = True
+
     source_col:str = 'path'
     res_col: str = 'pathdate'
+    # 'parent' only reads dates from the folders of the files, see scan_pathdate
+    match_on: str = 'path'
 
     def process(self, df: pd.DataFrame) -> pd.DataFrame:
-        df[self.res_col] = scan_pathdate(df, self.source_col)
+        df[self.res_col] = scan_pathdate(df, self.source_col, self.match_on)
         return df
 
 
 @dataclass
 class DateSelector(Processor):
+    row_local = True
+
     source_cols: List[str]
     res_col:str = 'selected_date'
     null_col: str = 'valid date'
 
     def process(self, df: pd.DataFrame) -> pd.DataFrame:
-        df[self.res_col] = df.apply(self.select_from_row, cols=self.source_cols, axis=1)
-        df[self.null_col] = ~pd.isnull(df['selected_date'])
+        cols = [c for c in self.source_cols if c in df]
+        if cols:
+            res = df[cols[0]]
+            for c in cols[1:]:
+                res = res.fillna(df[c])
+        else:
+            res = pd.Series(pd.NaT, index=df.index)
+        df[self.res_col] = res
+        df[self.null_col] = ~pd.isnull(df[self.res_col])
         return df
 
     @staticmethod
@@ -1,25 +1,223 @@
+import logging
+import os
+import re
 from dataclasses import dataclass
 from pathlib import Path
+from typing import Dict, List, Optional
 
+import numpy as np
 import pandas as pd
 
+from .content import full_hash
 from .processor import Processor
+from ..df import paths
+
+logger = logging.getLogger(__name__)
+
+
+def to_paths(s: pd.Series) -> pd.Series:
+    return pd.Series([Path(v) if isinstance(v, str) else np.nan for v in s], index=s.index, dtype=object)
 
 
 @dataclass
 class DestinationGenerator(Processor):
+    """
+    Puts every file directly into dest_base
+
+    The destinations are built with string operations on the whole column. Subclasses can change the folders by
+    overriding :meth:`folders`, or override :meth:`gen_dest` alone to have it applied row by row.
+    """
+    row_local = True
+
     dest_base: str
     res_col: str = 'dest'
 
     def process(self, df: pd.DataFrame) -> pd.DataFrame:
-        df[self.res_col] = df.apply(self.gen_dest, axis=1)
+        if not self.vectorized():
+            df[self.res_col] = df.apply(self.gen_dest, axis=1) if not df.empty else pd.Series(dtype=object)
+        else:
+            dest = self.folders(df) + os.sep + paths.names(df).astype('string')
+            df[self.res_col] = to_paths(dest)
+        paths.invalidate(df, self.res_col)
         return df
 
+    def vectorized(self) -> bool:
+        # True unless a subclass overrides gen_dest without overriding folders to match
+        defining = [next(c for c in type(self).__mro__ if name in vars(c)) for name in ['gen_dest', 'folders']]
+        return defining[0] is defining[1]
+
+    def folders(self, df: pd.DataFrame):
+        """
+        :return: the destination folder of every row as strings, or one for all of them
+        """
+        return os.fspath(Path(self.dest_base))
+
     def gen_dest(self, row: pd.Series) -> Path:
-        return Path(self.dest_base) / row['path'].name
+        return Path(self.dest_base) / Path(row['path']).name
+
 
 @dataclass
 class DatedDestinationGen(DestinationGenerator):
     format:str = r'%Y\%m %b'
+
+    def folders(self, df: pd.DataFrame):
+        # rows without a date get no destination
+        dates = pd.to_datetime(df['selected_date']).dt.strftime(self.format).astype('string')
+        return super().folders(df) + os.sep + dates
+
     def gen_dest(self, row: pd.Series) -> Path:
-        return Path(self.dest_base) / row['selected_date'].strftime(self.format) / row['path'].name
+        return Path(self.dest_base) / row['selected_date'].strftime(self.format) / Path(row['path']).name
+
+
+@dataclass
+class DestinationPlanner(Processor):
+    """
+    Makes the destinations of the selected files unique, so that a transfer never has to overwrite anything
+
+    Files that share a destination are told apart with numbered suffixes (``name_1.jpg``, ``name_2.jpg``, ...) in
+    the order of their source paths, so the same files always get the same names. The destination folders are listed
+    once each, and a destination that's already taken gets a suffix as well, unless the existing file has the same
+    size and content, in which case it's the file itself from an earlier transfer and the name is kept. Rows that
+    don't need a suffix are handled with vectorized operations only.
+
+    The proposed destinations are kept in proposed_col, so running the planner again on its own output (e.g. on
+    a checkpoint, or in watch mode) plans from the same proposals.
+
+    :param mask_col: only plan the rows where this column is True, None for all of them
+    :param check_existing: list the destination folders to avoid existing files
+    :param ignore_case: treat names that only differ in case as the same, by default only on Windows
+    :param hash_col: full content hashes from :class:`~cleanup.processing.content.ContentHasher`, used instead of
+        hashing the source again when it's compared to an existing file of the same size
+    :param status_col: gets 'new', 'renamed' or 'exists' for the planned rows
+    """
+    dest_col: str = 'dest'
+    mask_col: Optional[str] = 'unique'
+    path_col: str = 'path'
+    size_col: str = 'st_size'
+    proposed_col: str = 'proposed_dest'
+    status_col: str = 'dest_status'
+    check_existing: bool = True
+    ignore_case: bool = None
+    hash_col: str = 'content_hash'
+
+    def key_cols(self) -> List[str]:
+        return [c for c in [self.path_col, self.dest_col, self.mask_col, self.size_col, self.proposed_col,
+                            self.hash_col] if c]
+
+    def process(self, df: pd.DataFrame) -> pd.DataFrame:
+        ignore_case = os.name == 'nt' if self.ignore_case is None else self.ignore_case
+        df[self.proposed_col] = self.proposals(df)
+        df[self.status_col] = pd.Series(np.nan, index=df.index, dtype=object)
+
+        proposed = df[self.proposed_col].map(os.fspath, na_action='ignore').astype('string')
+        selected = proposed.notna()
+        if self.mask_col is not None:
+            selected &= df[self.mask_col].astype(bool)
+        rows = df.index[selected]
+        if rows.empty:
+            return df
+
+        parts = paths.split(proposed[selected])
+        parts['key'] = parts['name'].str.lower() if ignore_case else parts['name']
+        parts['src'] = paths.strings(df.loc[rows], self.path_col).to_numpy()
+        parts['size'] = df.loc[rows, self.size_col].to_numpy() if self.size_col in df else np.nan
+        parts['hash'] = df.loc[rows, self.hash_col].to_numpy() if self.hash_col in df else None
+        existing = self.existing(parts['parent'].unique(), ignore_case) if self.check_existing else {}
+
+        # a row keeps its proposal if no other row proposes it and there's no other file by that name
+        shared = parts.duplicated(['parent', 'key'], keep=False)
+        on_disk = pd.Series([k in existing.get(f, ()) for f, k in zip(parts['parent'], parts['key'])],
+                            index=parts.index, dtype=bool) if existing else pd.Series(False, index=parts.index)
+        status = pd.Series('new', index=parts.index, dtype=object)
+
+        conflicts = parts[shared | on_disk].sort_values(['parent', 'key', 'src'], kind='stable')
+        # numbered names can't take a name that another row proposes
+        in_conflict = parts['parent'].isin(conflicts['parent'].unique())
+        reserved = {folder: set(keys) for folder, keys in parts[in_conflict].groupby('parent')['key']}
+        claimed = {}
+        renamed = {}
+        for label, folder, name, stem, suffix, src, size, content in zip(
+                conflicts.index, conflicts['parent'], conflicts['name'], conflicts['stem'], conflicts['suffix'],
+                conflicts['src'], conflicts['size'], conflicts['hash']):
+            files = existing.get(folder, {})
+            used = claimed.setdefault(folder, set())
+            n = 0
+            while True:
+                candidate = f'{stem}_{n}{suffix}' if n else name
+                key = candidate.lower() if ignore_case else candidate
+                free = key not in used and (not n or key not in reserved[folder])
+                if free and (key not in files or self.same_file(files[key], src, size, content)):
+                    break
+                n += 1
+            used.add(key)
+            if n:
+                renamed[label] = os.path.join(folder, candidate)
+            status[label] = 'exists' if key in files else 'renamed' if n else 'new'
+
+        logger.info(f'Planned destinations'.ljust(self.width) + f'{rows.shape[0]}')
+        logger.info(f'Renamed to avoid a collision'.ljust(self.width) + f'{len(renamed)}')
+        logger.info(f'Already at their destination'.ljust(self.width) + f'{(status == "exists").sum()}')
+        df.loc[rows, self.dest_col] = df.loc[rows, self.proposed_col]
+        if renamed:
+            df.loc[list(renamed), self.dest_col] = to_paths(pd.Series(renamed, dtype=object))
+            paths.invalidate(df, self.dest_col)
+        df.loc[rows, self.status_col] = status
+        return df
+
+    def proposals(self, df: pd.DataFrame) -> pd.Series:
+        """
+        :return: the destinations before the planner changed them
+        """
+        if self.proposed_col not in df:
+            return df[self.dest_col].copy()
+        dest = df[self.dest_col].map(os.fspath, na_action='ignore').astype('string')
+        prev = df[self.proposed_col].map(os.fspath, na_action='ignore').astype('string')
+        # dest was set by an earlier run of the planner if it's the previous proposal or a numbered version of it
+        check = (prev.notna() & dest.notna() & (dest != prev)).fillna(False)
+        planned = pd.Series(False, index=df.index)
+        if check.any():
+            prev_parts, dest_parts = paths.split(prev[check]), paths.split(dest[check])
+            planned[check] = [
+                p_parent == d_parent and re.fullmatch(re.escape(p_stem) + r'_\d+' + re.escape(p_suffix), d_name)
+                is not None
+                for p_parent, p_stem, p_suffix, d_parent, d_name in zip(
+                    prev_parts['parent'], prev_parts['stem'], prev_parts['suffix'],
+                    dest_parts['parent'], dest_parts['name'])
+            ]
+        return df[self.dest_col].where(~planned, df[self.proposed_col])
+
+    @staticmethod
+    def existing(folders, ignore_case: bool) -> Dict[str, Dict[str, os.DirEntry]]:
+        """
+        Lists each folder once
+
+        :return: the files in each folder that exists, by name (lower case with ignore_case)
+        """
+        res = {}
+        for folder in folders:
+            try:
+                with os.scandir(folder) as it:
+                    entries = {e.name.lower() if ignore_case else e.name: e for e in it}
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            if entries:
+                res[folder] = entries
+        return res
+
+    @staticmethod
+    def same_file(entry: os.DirEntry, src: str, size, content=None) -> bool:
+        """
+        :return: whether the existing file is a copy of src, i.e. has the same size and the same content. The
+            content is only read if the sizes match, and the full hash of src is taken from content if it has one.
+        """
+        try:
+            if not entry.is_file() or pd.isna(size) or entry.stat().st_size != size:
+                return False
+            if isinstance(content, str) and ':full:' in content:
+                src_hash = content.rsplit(':', 1)[1]
+            else:
+                src_hash = full_hash(Path(src))
+            return full_hash(Path(entry.path)) == src_hash
+        except OSError as e:
+            logger.warning(f'could not compare "{src}" to "{entry.path}": {repr(e)}')
+            return False
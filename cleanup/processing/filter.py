@@ -1,11 +1,85 @@
-from typing import List
+import re
+from typing import List, Optional
 
 import pandas as pd
 
+from ..df import paths
+
 
 def filter_extension(df, include_list, path_col='path'):
-    return pd.DataFrame(data={e: df[path_col].apply(lambda p: p.suffix.upper()) == e.upper() for e in include_list}).any(axis=1)
+    include = {e.upper() for e in include_list}
+    return paths.map_unique(paths.suffixes(df, path_col), lambda s: s.str.upper().isin(include)).eq(True)
+
+
+# characters that make a pattern more than a sequence of literal characters and wildcards
+META = set('^$*+?{}[]\\|()')
+
+
+def trie_regex(patterns: List[str], lower: bool = False) -> str:
+    """
+    Builds a regex that finds a match in the same strings as the alternation of patterns, with the common prefixes
+    merged into a trie so that each position of the searched string is only tried against the possible next characters
+
+    :param patterns: sequences of literal characters and ``.`` wildcards
+    :param lower: merge the patterns case-insensitively
+    """
+    trie = {}
+    for p in patterns:
+        node = trie
+        for ch in (p.lower() if lower else p):
+            node = node.setdefault(ch, {})
+        node[''] = {}
+
+    def build(node):
+        if '' in node:
+            # a pattern ends here, longer ones starting with it can't add any matches
+            return ''
+        alts = [(ch if ch == '.' else re.escape(ch)) + build(sub) for ch, sub in sorted(node.items())]
+        return alts[0] if len(alts) == 1 else '(?:' + '|'.join(alts) + ')'
+
+    return build(trie)
+
+
+def combine(patterns: List[str], flags: int = 0, strip_groups: bool = False) -> Optional[re.Pattern]:
+    """
+    Compiles a list of regexes into one pattern that matches wherever any of them matches
+
+    Only meant for finding out whether there's a match, the groups and the span of the match aren't those of the
+    original patterns.
+
+    :param strip_groups: turn named groups into plain groups, so that patterns with the same group names can be
+        combined
+    :return: the combined pattern, or None if the patterns can't be combined, e.g. because of backreferences
+    """
+    if not patterns or any(re.search(r'\(\?P=|\\[1-9]', p) for p in patterns):
+        return None
+    if all(p and not META.intersection(p) for p in patterns):
+        return re.compile(trie_regex(patterns, bool(flags & re.IGNORECASE)), flags)
+    if strip_groups:
+        patterns = [re.sub(r'\(\?P<\w+>', '(?:', p) for p in patterns]
+    try:
+        return re.compile('|'.join(f'(?:{p})' for p in patterns), flags)
+    except re.error:
+        return None
+
+
+def filter_path(df: pd.DataFrame, filter_list: List[str], path_col: str = 'path', case: bool = False,
+                match_on: str = 'path') -> pd.Series:
+    """
+    :param match_on: 'path' to search the whole paths, 'parent' to only search their folders, once per folder
+    :return: True where the path contains a match of any of the regexes in filter_list
+    """
+    if match_on == 'parent':
+        return paths.map_unique(paths.parents(df, path_col),
+                                lambda s: filter_strings(s.astype('string'), filter_list, case)).eq(True)
+    elif match_on != 'path':
+        raise ValueError(f'Invalid match_on: {match_on}')
+    return filter_strings(paths.strings(df, path_col), filter_list, case)
 
 
-def filter_path(df: pd.DataFrame, filter_list: List[str], path_col: str = 'path', case: bool = False) -> pd.Series:
-    return pd.DataFrame(data={folder: df[path_col].apply(str).str.contains(folder, case=case) for folder in filter_list}).any(axis=1)
+def filter_strings(strings: pd.Series, filter_list: List[str], case: bool = False) -> pd.Series:
+    rgx = combine(filter_list, 0 if case else re.IGNORECASE)
+    if rgx is not None:
+        return strings.str.contains(rgx, na=False).astype(bool)
+    return pd.DataFrame(data={folder: strings.str.contains(folder, case=case) for folder in filter_list},
+                        index=strings.index).any(axis=1)
@@ -0,0 +1,182 @@
+"""
+Helpers for running the row local stages of a :class:`~cleanup.processing.chain.ProcessChain` in a process pool
+
+Path objects are expensive to pickle, so columns of them are sent to the workers as plain strings and turned back
+into paths on the other side. Columns that come back unchanged aren't sent back at all, the parent process keeps
+its own copy. With pyarrow installed, the parts travel as Arrow IPC streams, which are written and read column by
+column instead of pickling every string on its own, see :func:`pack`.
+"""
+import json
+import os
+from pathlib import Path, PurePath
+from typing import List, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from ..df import paths
+from .processor import Processor
+from .report import ProcessorStats
+
+
+def path_columns(df: pd.DataFrame) -> List[str]:
+    """
+    :return: the object columns that hold Path objects
+    """
+    res = []
+    for col in df.columns[df.dtypes == object]:
+        valid = df[col].dropna()
+        if not valid.empty and isinstance(valid.iloc[0], PurePath):
+            res.append(col)
+    return res
+
+
+def to_str(s: pd.Series) -> pd.Series:
+    return pd.Series([os.fspath(v) if isinstance(v, PurePath) else v for v in s], index=s.index, dtype=object)
+
+
+def to_path(s: pd.Series) -> pd.Series:
+    return pd.Series([Path(v) if isinstance(v, str) else v for v in s], index=s.index, dtype=object)
+
+
+def partition(df: pd.DataFrame, n: int, by: str = 'rows', path_col: str = 'path') -> List[np.ndarray]:
+    """
+    Splits the row positions of df into n parts
+
+    :param by: 'rows' for contiguous ranges of rows, 'parent' to keep the files of each folder together
+    :return: list of arrays of row positions, empty parts left out
+    """
+    if by == 'rows':
+        parts = np.array_split(np.arange(df.shape[0]), n)
+    elif by == 'parent':
+        codes = pd.factorize(paths.parents(df, path_col))[0]
+        buckets = codes % n
+        parts = [np.flatnonzero(buckets == i) for i in range(n)]
+    else:
+        raise ValueError(f'Invalid partitioning: {by}')
+    return [p for p in parts if p.shape[0] > 0]
+
+
+def ship(df: pd.DataFrame) -> Tuple[pd.DataFrame, List[str]]:
+    """
+    Converts the path columns of df to strings for sending it to another process
+    """
+    cols = path_columns(df)
+    if cols:
+        df = df.copy(deep=False)
+        for col in cols:
+            df[col] = to_str(df[col])
+    return df, cols
+
+
+def unship(df: pd.DataFrame, cols: List[str]) -> pd.DataFrame:
+    for col in cols:
+        df[col] = to_path(df[col])
+    return df
+
+
+# key of the schema metadata that records the object columns, which Arrow would turn into string columns
+META_KEY = b'cleanup_objects'
+
+
+def pack(df: pd.DataFrame) -> Union[bytes, pd.DataFrame]:
+    """
+    Writes df to an Arrow IPC stream for sending it to another process
+
+    :return: the stream, or df itself if pyarrow isn't installed or can't hold one of the columns, like the IfdTag
+        objects of exifread
+    """
+    try:
+        import pyarrow as pa
+    except ImportError:
+        return df
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=True)
+    except (pa.ArrowException, TypeError, ValueError):
+        return df
+    objects = [str(c) for c in df.columns[df.dtypes == object]]
+    table = table.replace_schema_metadata({**table.schema.metadata, META_KEY: json.dumps(objects).encode()})
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def unpack(data: Union[bytes, pd.DataFrame]) -> pd.DataFrame:
+    """
+    Reverses :func:`pack`
+    """
+    if isinstance(data, pd.DataFrame):
+        return data
+    import pyarrow as pa
+    table = pa.ipc.open_stream(data).read_all()
+    df = table.to_pandas()
+    for col in json.loads(table.schema.metadata[META_KEY]):
+        df[col] = df[col].astype(object)
+    return df
+
+
+def split_frame(df: pd.DataFrame, parts: List[np.ndarray]) -> List[pd.DataFrame]:
+    """
+    Takes the rows of each part out of df, indexed by their position so that :func:`merge` can put them back in order
+    """
+    res = []
+    for pos in parts:
+        part = df.iloc[pos].copy(deep=False)
+        part.index = pd.Index(pos)
+        res.append(part)
+    return res
+
+
+def run_partition(stage: List[Processor], df, cols: List[str], instrument=True, profile=False):
+    """
+    Runs a stage of row local processors on a part of the rows, in a worker process
+
+    :param df: the part, as returned by :func:`pack`
+    :param cols: columns of df that were shipped as strings
+    :return: (:func:`pack` ed result with its path columns as strings, path columns of the result, columns to take
+        from the input unchanged, column order, stats of each processor)
+    """
+    df = unpack(df)
+    sent = df.copy(deep=False)
+    df = unship(df, cols)
+    stats = [ProcessorStats(type(p).__name__, repr(p)) for p in stage]
+    for p, s in zip(stage, stats):
+        df = s.measure(p.process, df, profile) if instrument else p.process(df)
+    for s in stats:
+        s.finish()
+
+    order = list(df.columns)
+    df, res_cols = ship(df)
+    same = [c for c in cols if c in df and c in sent and df[c].equals(sent[c])]
+    return pack(df.drop(columns=same)), res_cols, same, order, stats
+
+
+def merge(df: pd.DataFrame, results: list) -> pd.DataFrame:
+    """
+    Puts the results of :func:`run_partition` back together in the row order and with the index of df
+    """
+    same = set.intersection(*(set(r[2]) for r in results))
+    frames = []
+    for frame, _, part_same, _, _ in results:
+        frame = unpack(frame)
+        for col in set(part_same) - same:
+            frame[col] = to_str(df[col].iloc[frame.index])
+        frames.append(frame)
+
+    for col in frames[0].columns:
+        # concat falls back to object if the categories of the parts differ
+        dtypes = [f[col].dtype for f in frames]
+        if all(isinstance(d, pd.CategoricalDtype) for d in dtypes) and len(set(dtypes)) > 1:
+            cats = union_categoricals([f[col] for f in frames]).categories
+            frames = [f.assign(**{col: f[col].cat.set_categories(cats)}) for f in frames]
+
+    res = pd.concat(frames)
+    if not res.index.is_monotonic_increasing:
+        res = res.sort_index(kind='stable')
+    for col in same:
+        res[col] = df[col].to_numpy()[res.index]
+    unship(res, set().union(*(r[1] for r in results)) - same)
+    res.index = df.index[res.index]
+    return res[results[0][3]]
@@ -0,0 +1,190 @@
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+from .processor import Processor
+
+logger = logging.getLogger(__name__)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+def dhash(img, hash_size: int = 8) -> int:
+    """
+    Difference hash: shrinks the image to (hash_size + 1) x hash_size grayscale pixels and sets one bit for every pixel
+    that's brighter than its right neighbor
+    """
+    from PIL import Image
+
+    img = img.convert('L').resize((hash_size + 1, hash_size), Image.BILINEAR)
+    px = list(img.getdata())
+    res = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            i = row * (hash_size + 1) + col
+            res = (res << 1) | (px[i] > px[i + 1])
+    return res
+
+
+def image_hash(path: Path, hash_size: int = 8, prefer_thumbnail: bool = True):
+    """
+    Computes the :func:`dhash` of an image file
+
+    The EXIF thumbnail is used if there is one, otherwise the JPEG is decoded in draft mode, which lets the decoder
+    scale down by up to 8x instead of decoding every pixel.
+
+    :return: the hash as an int, or None if the file couldn't be read as an image
+    """
+    import exifread
+    from PIL import Image
+
+    try:
+        if prefer_thumbnail:
+            with Path(path).open('rb') as file:
+                thumb = exifread.process_file(file, details=True, stop_tag='JPEGThumbnail').get('JPEGThumbnail')
+            if thumb:
+                with Image.open(io.BytesIO(thumb)) as img:
+                    return dhash(img, hash_size)
+
+        with Image.open(path) as img:
+            img.draft('L', (hash_size * 8, hash_size * 8))
+            return dhash(img, hash_size)
+    except Exception as e:
+        logger.debug('could not hash "%s": %r', path, e)
+        return None
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree of integer hashes using the Hamming distance
+
+    Each node keeps its children keyed by their distance to it, so by the triangle inequality a query only has to
+    descend into the children whose key is within ``threshold`` of the query's distance to the node.
+    """
+    def __init__(self):
+        self.root = None
+
+    def add(self, h: int):
+        if self.root is None:
+            self.root = (h, {})
+            return
+        node = self.root
+        while True:
+            d = hamming(h, node[0])
+            if d == 0:
+                return
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = (h, {})
+                return
+            node = child
+
+    def query(self, h: int, threshold: int) -> List[Tuple[int, int]]:
+        """
+        :return: list of (hash, distance) for every hash in the tree within threshold of h
+        """
+        res = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(h, node[0])
+            if d <= threshold:
+                res.append((node[0], d))
+            stack.extend(child for key, child in node[1].items() if d - threshold <= key <= d + threshold)
+        return res
+
+
+def group_hashes(hashes: List[int], threshold: int) -> Dict[int, int]:
+    """
+    Clusters hashes around seeds: the first hash that isn't in a cluster yet becomes the seed of a new one, which
+    takes every other hash within threshold of it that isn't in a cluster yet
+
+    Matches aren't chained, so every hash is within threshold of its representative, though two hashes of the same
+    cluster can be up to twice that apart.
+
+    :param hashes: hashes in the order they should be considered as seeds
+    :return: dict mapping each hash to the representative hash (the seed) of its cluster
+    """
+    tree = BKTree()
+    for h in hashes:
+        tree.add(h)
+
+    reps = {}
+    for h in hashes:
+        if h in reps:
+            continue
+        for other, d in tree.query(h, threshold):
+            reps.setdefault(other, h)
+    return reps
+
+
+@dataclass
+class NearDuplicates(Processor):
+    """
+    Finds resized/re-encoded copies of images by comparing perceptual hashes
+
+    Files whose hashes are within ``threshold`` bits of the hash of a group's first file end up with the same value in
+    ``group_col`` (see :func:`group_hashes`), which can then be used as the ``source_cols`` of
+    :class:`~cleanup.processing.unique.UniqueIDer`. ``dist_col`` holds the distance to the representative hash of the
+    group, which is never more than threshold. Requires Pillow.
+    """
+    mask_cols: List[str] = None
+    path_col: str = 'path'
+    hash_col: str = 'phash'
+    group_col: str = 'near_group'
+    dist_col: str = 'near_dist'
+    threshold: int = 4
+    hash_size: int = 8
+    prefer_thumbnail: bool = True
+    workers: int = None
+    chunksize: int = 64
+
+    def key_cols(self) -> List[str]:
+        return (self.mask_cols or []) + [self.path_col, self.hash_col]
+
+    def process(self, df: pd.DataFrame) -> pd.DataFrame:
+        if self.mask_cols:
+            sub = df[df[self.mask_cols].all(axis=1)]
+        else:
+            sub = df
+
+        if self.hash_col in sub:
+            hashes = sub[self.hash_col].copy()
+        else:
+            hashes = pd.Series(None, index=sub.index, dtype=object)
+        todo = hashes[hashes.isna()].index
+        logger.info(f'Hashing images'.ljust(self.width) + f'{todo.shape[0]}')
+        hashes.loc[todo] = self.hash_paths(sub.loc[todo, self.path_col].to_list())
+
+        valid = hashes.dropna()
+        # the hashes of the first files are the seeds
+        reps = group_hashes(list(dict.fromkeys(valid)), self.threshold)
+        rep = valid.map(reps)
+
+        # the first file that has the representative hash labels the group
+        labels = pd.Series(valid.index, index=valid.to_numpy()).groupby(level=0).first()
+        df[self.hash_col] = hashes.reindex(df.index)
+        df[self.group_col] = rep.map(labels).reindex(df.index)
+        df[self.dist_col] = pd.Series(
+            [hamming(h, r) for h, r in zip(valid, rep)], index=valid.index, dtype=float
+        ).reindex(df.index)
+
+        logger.info(f'Near duplicate groups'.ljust(self.width) + f'{(rep.value_counts() > 1).sum()}')
+        return df
+
+    def hash_paths(self, paths: List[Path]) -> List[int]:
+        if not paths:
+            return []
+        with ProcessPoolExecutor(max_workers=self.workers or os.cpu_count()) as pool:
+            return list(pool.map(
+                image_hash, paths, [self.hash_size] * len(paths), [self.prefer_thumbnail] * len(paths),
+                chunksize=self.chunksize
+            ))
@@ -1,7 +1,7 @@
 import logging
 from dataclasses import dataclass
 from datetime import datetime
-from typing import Tuple, List
+from typing import Tuple, List, Optional
 
 import pandas as pd
 from exifread.classes import IfdTag
@@ -10,28 +10,80 @@ logger = logging.getLogger(__name__)
 
 class Processor:
     width: int = 50
+    # row local processors only look at one row at a time, so they can be run on any subset of the rows
+    row_local = False
 
     def process(self, df: pd.DataFrame) -> pd.DataFrame:
         raise NotImplementedError
 
+    def key_cols(self) -> List[str]:
+        """
+        Columns that a processor that isn't row local needs to see for every row. The chunked execution of
+        :class:`~cleanup.processing.chain.ProcessChain` only keeps these columns in memory for the whole DataFrame.
+        """
+        raise NotImplementedError(f'{self.__class__.__name__} does not define its key columns')
+
+    def group_cols(self) -> Optional[List[str]]:
+        """
+        Columns that split the rows into groups that a processor that isn't row local handles independently of each
+        other. The incremental updates of :class:`~cleanup.watch.IncrementalChain` only rerun it on the groups that
+        changed. None if it needs to see every row.
+        """
+        return None
+
+
+def in_range(dates: pd.Series) -> pd.Series:
+    """
+    :return: mask of the dates that fit a datetime64[ns] column
+    """
+    return (dates >= pd.Timestamp.min) & (dates <= pd.Timestamp.max)
+
 
 @dataclass
 class ConvertIfdTag(Processor):
+    row_local = True
+
     cols: Tuple[str] = ('Image DateTime', 'EXIF DateTimeOriginal')
     formats: Tuple[str] = ('%Y:%m:%d', '%d/%m/%Y', '%Y_%m_%d')
 
     def process(self, df: pd.DataFrame) -> pd.DataFrame:
         for c in self.cols:
-            if c in df:
-                df[c] = df[c].apply(self.convert, formats=self.formats)
+            if c in df and pd.api.types.is_datetime64_any_dtype(df[c]):
+                # already typed, e.g. read by cleanup.df.exif.read_exif_fast, truncated to the day like the text
+                df[c] = df[c].where(df[c].dt.year <= 2100).dt.normalize()
+            elif c in df:
+                df[c] = self.convert_series(df[c], self.formats)
             else:
                 print(f'{c} is not in {df.columns}')
         return df
 
+    @staticmethod
+    def convert_series(s: pd.Series, formats: List[str]) -> pd.Series:
+        """
+        Vectorized version of :meth:`convert`, each format is only tried on the values the previous ones didn't parse
+        """
+        text = s.map(lambda v: v.values if isinstance(v, IfdTag) else v if isinstance(v, str) else None)
+        text = text.str.split(' ').str[0]
+        res = pd.Series(pd.NaT, index=s.index, dtype='datetime64[ns]')
+        for fmt in formats:
+            todo = res.isna() & text.notna()
+            if not todo.any():
+                break
+            parsed = pd.to_datetime(text[todo], format=fmt, errors='coerce')
+            # bogus dates like 9999:12:31 don't fit the nanosecond range, convert gives NaT after 2100 anyway
+            res[todo] = parsed.where(in_range(parsed) & (parsed.dt.year <= 2100))
+
+        is_dt = s.map(lambda v: isinstance(v, datetime)).astype(bool)
+        if is_dt.any():
+            # convert returns these unchanged
+            parsed = pd.to_datetime(s[is_dt])
+            res[is_dt] = parsed.where(in_range(parsed))
+        return res
+
     @staticmethod
     def convert(ifd: IfdTag, formats:List[str]) -> datetime:
-        if isinstance(ifd, IfdTag):
-            s = ifd.values.split(' ')[0]
+        if isinstance(ifd, (IfdTag, str)):
+            s = (ifd.values if isinstance(ifd, IfdTag) else ifd).split(' ')[0]
             for fmt in formats:
                 try:
                     res = datetime.strptime(s, fmt)
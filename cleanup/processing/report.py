@@ -0,0 +1,119 @@
+import cProfile
+import io
+import json
+import pstats
+import time
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import List
+
+import pandas as pd
+
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    """
+    Shallow memory use of a DataFrame, object columns only count their pointers
+    """
+    return int(df.memory_usage(index=True, deep=False).sum())
+
+
+@dataclass
+class ProcessorStats:
+    """
+    Measurements of one processor of a :class:`~cleanup.processing.chain.ProcessChain`, summed over every chunk it
+    processed
+    """
+    name: str
+    processor: str = None
+    calls: int = 0
+    wall: float = 0.
+    cpu: float = 0.
+    rows_in: int = 0
+    rows_out: int = 0
+    mem_delta: int = 0
+    profile: str = None
+
+    def __post_init__(self):
+        self._profiler = None
+
+    def measure(self, func, df: pd.DataFrame, profile=False) -> pd.DataFrame:
+        """
+        Runs func on df and adds its measurements
+        """
+        rows, mem = df.shape[0], frame_bytes(df)
+        if profile and self._profiler is None:
+            self._profiler = cProfile.Profile()
+        wall, cpu = time.perf_counter(), time.process_time()
+        if profile:
+            self._profiler.enable()
+        try:
+            res = func(df)
+        finally:
+            if profile:
+                self._profiler.disable()
+        self.wall += time.perf_counter() - wall
+        self.cpu += time.process_time() - cpu
+        self.calls += 1
+        self.rows_in += rows
+        self.rows_out += res.shape[0]
+        self.mem_delta += frame_bytes(res) - mem
+        return res
+
+    def add(self, other: 'ProcessorStats'):
+        """
+        Adds the measurements of the same processor from another process
+        """
+        for name in ['calls', 'wall', 'cpu', 'rows_in', 'rows_out', 'mem_delta']:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        if self.profile is None:
+            self.profile = other.profile
+
+    def finish(self, top=25):
+        """
+        Renders the collected profile, the functions with the highest cumulative time first
+        """
+        if self._profiler is not None:
+            out = io.StringIO()
+            pstats.Stats(self._profiler, stream=out).sort_stats('cumulative').print_stats(top)
+            self.profile = out.getvalue()
+            self._profiler = None
+
+
+@dataclass
+class ChainReport:
+    """
+    Per processor measurements of one run of a :class:`~cleanup.processing.chain.ProcessChain`
+    """
+    processors: List[ProcessorStats] = field(default_factory=list)
+
+    @property
+    def wall(self) -> float:
+        return sum(p.wall for p in self.processors)
+
+    @property
+    def cpu(self) -> float:
+        return sum(p.cpu for p in self.processors)
+
+    def to_dict(self) -> dict:
+        return {'wall': self.wall, 'cpu': self.cpu, 'processors': [asdict(p) for p in self.processors]}
+
+    def to_json(self, path=None, **kwargs) -> str:
+        """
+        :param path: file to write the report to
+        :return: the report as a JSON string
+        """
+        res = json.dumps(self.to_dict(), **kwargs)
+        if path is not None:
+            Path(path).write_text(res)
+        return res
+
+    def to_df(self) -> pd.DataFrame:
+        return pd.DataFrame([asdict(p) for p in self.processors]).drop(columns=['processor', 'profile'])
+
+    def __str__(self):
+        lines = [f'{"processor":<30}{"wall s":>10}{"cpu s":>10}{"rows in":>12}{"rows out":>12}{"mem MB":>10}']
+        for p in self.processors:
+            lines.append(f'{p.name:<30}{p.wall:>10.2f}{p.cpu:>10.2f}{p.rows_in:>12}{p.rows_out:>12}'
+                         f'{p.mem_delta / 2 ** 20:>10.1f}')
+        lines.append(f'{"total":<30}{self.wall:>10.2f}{self.cpu:>10.2f}')
+        return '\n'.join(lines)
@@ -2,10 +2,12 @@ import logging
 from dataclasses import dataclass
 from typing import Iterable, List
 
+import numpy as np
 import pandas as pd
 
 from .processor import Processor
 from .. import utils
+from ..df import paths
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +18,14 @@ class UniqueIDer(Processor):
     source_cols: List[str]
     priority_keyword: List[str] = None
     w:int = 35
+    # extra columns used by the selection strategy
+    strategy_cols = []
+
+    def key_cols(self) -> List[str]:
+        return list(dict.fromkeys(self.mask_cols + self.source_cols + ['path'] + self.strategy_cols))
+
+    def group_cols(self) -> List[str]:
+        return list(self.source_cols)
 
     @utils.timer
     def process(self, df: pd.DataFrame):
@@ -26,7 +36,7 @@ class UniqueIDer(Processor):
 
         if len(self.mask_cols) > 0:
             logger.info(f"Applying 'continue' mask")
-            process_df = df[df[self.mask_cols].all(axis=1)].sort_values('path', ascending=False)
+            process_df = df[df[self.mask_cols].all(axis=1)].sort_values('path', ascending=False, kind='stable')
         else:
             process_df = df
 
@@ -37,17 +47,64 @@ class UniqueIDer(Processor):
         logger.info(f'{(~dups).sum()} unique, {dups.sum()} duplicate')
 
         logger.info(f'Processing groups of duplicates')
-        grouped = process_df[dups].groupby(self.source_cols)
+        dup_df = process_df[dups]
+        grouped = dup_df.groupby(self.source_cols)
         logger.info(f'{grouped.ngroups} groups, {grouped.size().mean():.1f} avg files')
-        for idx, group in grouped:
-            i, reason = self.select_index(group)
-            df.loc[i, 'unique'] = True
-            df.loc[i, 'reason'] = reason
-            # df.loc[idx[idx != i], 'reason'] = f'dup: {idx}'
+        selected = self.resolve_groups(dup_df)
+        df.loc[selected.index, 'unique'] = True
+        df.loc[selected.index, 'reason'] = selected
 
         logger.info(f'{df["unique"].sum()} total unique files')
         return df
 
+    def resolve_groups(self, dup_df: pd.DataFrame) -> pd.Series:
+        """
+        Selects one file from each group of duplicates
+
+        :param dup_df: DataFrame of all the duplicated files
+        :return: Series of the reasons, indexed by the selected files
+        """
+        if self.overrides_select(UniqueIDer):
+            return self.resolve_loop(dup_df)
+
+        priority = self.priority_mask(dup_df)
+        return self.first_by(dup_df, [~priority], priority.map({True: 'priority', False: 'first in list'}))
+
+    def overrides_select(self, cls) -> bool:
+        return type(self).select_index is not cls.select_index
+
+    def resolve_loop(self, dup_df: pd.DataFrame) -> pd.Series:
+        """
+        Fallback for subclasses that only implement :meth:`select_index`, which gets called once per group
+        """
+        res = [self.select_index(group) for idx, group in dup_df.groupby(self.source_cols)]
+        return pd.Series([r[1] for r in res], index=[r[0] for r in res], dtype=object)
+
+    def first_by(self, dup_df: pd.DataFrame, keys: List[pd.Series], reasons: pd.Series) -> pd.Series:
+        """
+        Selects the first file of each group after sorting by keys, ties are broken by the order of dup_df
+
+        :param dup_df: DataFrame of all the duplicated files
+        :param keys: Series to sort each group by, aligned with dup_df
+        :param reasons: reason for selecting each file, aligned with dup_df
+        :return: Series of the reasons, indexed by the selected files
+        """
+        order = pd.DataFrame({f'key{i}': k.to_numpy() for i, k in enumerate(keys)})
+        order.insert(0, 'group', dup_df.groupby(self.source_cols, sort=False).ngroup().to_numpy())
+        order['pos'] = np.arange(dup_df.shape[0])
+        # groupby drops rows with null keys, so those never get selected
+        order = order.dropna(subset=['group'])
+        first = order.sort_values(list(order.columns), kind='stable').drop_duplicates('group')['pos'].to_numpy()
+        return pd.Series(reasons.to_numpy()[first], index=dup_df.index[first], dtype=object)
+
+    def priority_mask(self, df: pd.DataFrame) -> pd.Series:
+        if self.priority_keyword is None:
+            return pd.Series(False, index=df.index)
+        elif isinstance(self.priority_keyword, Iterable) and not isinstance(self.priority_keyword, str):
+            return paths.strings(df).str.contains('|'.join(self.priority_keyword), case=False).astype(bool)
+        else:
+            return paths.strings(df).str.contains(self.priority_keyword, regex=False).astype(bool)
+
     def select_index(self, group: pd.DataFrame):
         """
         Selects a single integer index from a DataFrame
@@ -71,11 +128,36 @@ class UniqueIDer(Processor):
 
 @dataclass
 class BiggestUnique(UniqueIDer):
+    strategy_cols = ['st_size']
+
+    def resolve_groups(self, dup_df: pd.DataFrame) -> pd.Series:
+        if self.overrides_select(BiggestUnique):
+            return self.resolve_loop(dup_df)
+        return self.first_by(dup_df, [-dup_df['st_size']], pd.Series('biggest', index=dup_df.index))
+
     def select_index(self, group: pd.DataFrame):
         return group['st_size'].idxmax(), 'biggest'
 
 @dataclass
 class MatchingTime(UniqueIDer):
+    strategy_cols = ['st_size', 'st_mtime', 'filename_date', 'valid date']
+
+    def resolve_groups(self, dup_df: pd.DataFrame) -> pd.Series:
+        if self.overrides_select(MatchingTime):
+            return self.resolve_loop(dup_df)
+
+        matching_dates = self.matching_dates(dup_df)
+        # the first matching file wins, otherwise the biggest one
+        size_key = (-dup_df['st_size']).where(~matching_dates, 0)
+        reasons = matching_dates.map({True: 'matched mtime', False: 'biggest'})
+        return self.first_by(dup_df, [~matching_dates, size_key], reasons)
+
+    @staticmethod
+    def matching_dates(df: pd.DataFrame) -> pd.Series:
+        mtime = pd.to_datetime(df['st_mtime']).dt.normalize()
+        filename_date = pd.to_datetime(df['filename_date']).dt.normalize()
+        return (mtime == filename_date) & df['valid date'].astype(bool)
+
     def select_index(self, group: pd.DataFrame):
         matching_dates = group.apply(lambda row: row['st_mtime'].date() == row['filename_date'].date(), axis=1) & group['valid date']
         if matching_dates.any():
@@ -1,6 +1,12 @@
 import ftplib
+import json
 import logging
-from pathlib import Path
+import os
+import posixpath
+import queue
+import threading
+from datetime import datetime, timezone
+from pathlib import Path, PurePosixPath
 from . import log
 
 LOGGER = logging.getLogger(__name__)
@@ -13,7 +19,24 @@ def pull_from_phone(
         phone_path=None,
         ext='jpg',
         user='android',
-        passwd='android'):
+        passwd='android',
+        manifest=None,
+        refresh=False):
+    """
+    Downloads the files with the given extension from a phone's FTP server into local_path
+
+    Files are downloaded to a ``.part`` file, resumed from where they stopped if that file is already there, checked
+    against the size reported by the server and only then renamed, so an interrupted run never leaves a truncated
+    file behind under the real name. The files keep the modification time of the server, and a file is skipped if
+    there's a local file with the same name, size and modification time, see :func:`is_complete`. Files from
+    different folders that have the same name are numbered, see :class:`LocalNames`.
+
+    :param manifest: file that records the remote listing and the finished downloads, see :class:`Manifest`
+    :param refresh: list the phone again even if the manifest has a complete listing
+    """
+    local_path = Path(local_path)
+    manifest = Manifest(manifest) if manifest is not None else None
+    names = LocalNames(local_path)
     ftp = ftplib.FTP()
     ftp.connect(host, port)
     try:
@@ -22,24 +45,180 @@ def pull_from_phone(
         ftp.login(user, passwd)
         LOGGER.debug(f'Logged in with: {user}, {passwd}')
 
-        for file in ftp_files(ftp, phone_path):
-            if file.suffix == f'.{ext}':
-                res = local_path / file.name
-                if res.exists():
-                    LOGGER.info(f'file already exists: "{res}"')
+        for remote, facts in listing(ftp, phone_path, manifest, refresh):
+            if PurePosixPath(remote).suffix == f'.{ext}':
+                res = names(remote)
+                if is_complete(res, remote, facts, manifest):
+                    LOGGER.info('file already exists: "%s"', res)
                     continue
                 else:
                     if not res.parents[0].exists():
                         res.parents[0].mkdir()
-                        LOGGER.debug(f'Created dir: "{res.parents[0]}"')
+                        LOGGER.debug('Created dir: "%s"', res.parents[0])
 
-                    with res.open('wb') as res_file:
-                        ftp.retrbinary(f'RETR {file}', res_file.write)
-                    LOGGER.info(f'ftp success: "{file}", "{res}"')
+                    try:
+                        fetch(ftp, remote, res, facts)
+                    except (ftplib.Error, ValueError) as e:
+                        # e.g. a size mismatch, the connection is still good for the next file
+                        LOGGER.error('ftp failed: "%s", "%s", %r', remote, res, e)
+                        continue
+                    LOGGER.info('ftp success: "%s", "%s"', remote, res)
+                    if manifest is not None:
+                        manifest.finish(remote, facts)
     except Exception as e:
         LOGGER.exception(repr(e))
     finally:
         ftp.quit()
+        if manifest is not None:
+            manifest.close()
+
+
+class Manifest:
+    """
+    Append-only JSON lines record of a phone's file listing and of the files that were downloaded from it
+
+    Once a listing has been completely recorded, later runs read it from the manifest instead of walking the phone's
+    folders again, and only fetch the files that aren't marked as finished.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.lock = threading.Lock()
+        self.listing = {}
+        self.complete = False
+        self.done = {}
+        if self.path.exists():
+            with self.path.open('r', encoding='utf-8') as file:
+                for line in file:
+                    try:
+                        self.replay(json.loads(line))
+                    except ValueError:
+                        # the last line can be cut off if a run was killed while writing it
+                        continue
+        self.file = self.path.open('a', encoding='utf-8')
+
+    def replay(self, record):
+        if 'file' in record:
+            self.listing[record['file']] = record['facts']
+        elif 'done' in record:
+            self.done[record['done']] = (record.get('size'), record.get('modify'))
+        elif 'complete' in record:
+            self.complete = True
+        elif 'reset' in record:
+            self.listing, self.complete = {}, False
+
+    def write(self, record):
+        with self.lock:
+            self.replay(record)
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+
+    def entries(self, ftp, path, refresh=False):
+        if self.complete and not refresh:
+            LOGGER.info(f'Using the listing from {self.path}: {len(self.listing)} files')
+            yield from list(self.listing.items())
+            return
+
+        self.write({'reset': True})
+        for remote, facts in ftp_entries(ftp, path):
+            self.write({'file': remote, 'facts': facts})
+            yield remote, facts
+        self.write({'complete': True})
+
+    def finish(self, remote, facts):
+        self.write({'done': remote, 'size': facts.get('size'), 'modify': facts.get('modify')})
+
+    def close(self):
+        self.file.close()
+
+
+def listing(ftp, path, manifest=None, refresh=False):
+    if manifest is None:
+        return ftp_entries(ftp, path)
+    return manifest.entries(ftp, path, refresh)
+
+
+class LocalNames:
+    """
+    Gives every remote file a name of its own in local_path
+
+    The remote file name is used, unless a file from another folder already got it, in which case it's numbered like
+    ``IMG_1_1.jpg``. The names are handed out in the order of the listing, which is the same on every run that uses
+    the listing of a manifest.
+    """
+    def __init__(self, local_path):
+        self.local_path = Path(local_path)
+        self.lock = threading.Lock()
+        self.owners = {}
+        self.names = {}
+
+    def __call__(self, remote) -> Path:
+        with self.lock:
+            if remote not in self.names:
+                path = PurePosixPath(remote)
+                name, n = path.name, 0
+                while self.owners.setdefault(name, remote) != remote:
+                    n += 1
+                    name = f'{path.stem}_{n}{path.suffix}'
+                self.names[remote] = name
+            return self.local_path / self.names[remote]
+
+
+def modify_time(facts):
+    """
+    :return: the 'modify' fact (``YYYYMMDDHHMMSS[.sss]`` in UTC) as seconds since the epoch, None if there isn't one
+    """
+    try:
+        value = facts['modify']
+        res = datetime.strptime(value[:14], '%Y%m%d%H%M%S').replace(tzinfo=timezone.utc).timestamp()
+        return res + float(value[14:] or 0)
+    except (KeyError, ValueError, TypeError):
+        return None
+
+
+def is_complete(res: Path, remote, facts, manifest=None) -> bool:
+    """
+    :return: whether res already is the remote file: recorded as finished in the manifest with the same size and
+        modification time (manifests from before the modification time was recorded only have the size), or with
+        the same size and (to the second) modification time as the facts of the server
+    """
+    if not res.exists():
+        return False
+    if manifest is not None and remote in manifest.done:
+        size, modify = manifest.done[remote]
+        if size == facts.get('size') and modify in (None, facts.get('modify')):
+            return True
+    st = res.stat()
+    if 'size' in facts and st.st_size != int(facts['size']):
+        return False
+    mtime = modify_time(facts)
+    return mtime is None or int(st.st_mtime) == int(mtime)
+
+
+def fetch(ftp, remote, res: Path, facts, blocksize=2 ** 13):
+    """
+    Downloads one file through a ``.part`` file, resuming with a REST offset when part of it is already there
+
+    :raises ftplib.Error: if the downloaded size doesn't match the size fact from the server
+    """
+    part = res.with_name(res.name + '.part')
+    size = int(facts['size']) if 'size' in facts else None
+    offset = part.stat().st_size if part.exists() else 0
+    if size is None or offset > size:
+        offset = 0
+
+    if size is None or offset < size:
+        if offset:
+            LOGGER.debug('Resuming at %d bytes: "%s"', offset, remote)
+        with part.open('ab' if offset else 'wb') as res_file:
+            ftp.retrbinary(f'RETR {remote}', res_file.write, blocksize=blocksize, rest=offset or None)
+
+    got = part.stat().st_size
+    if size is not None and got != size:
+        raise ftplib.Error(f'size mismatch for {remote}: expected {size}, got {got}')
+    mtime = modify_time(facts)
+    if mtime is not None:
+        os.utime(part, (mtime, mtime))
+    part.replace(res)
 
 
 def ftp_files(ftp, path):
@@ -50,11 +229,131 @@ def ftp_files(ftp, path):
             yield Path(path) / f[0]
 
 
-def transferred_files(ftplog):
-    for line in log.filter(log.line_gen(ftplog), 'ftp success'):
-        yield (log.get_paths(line))
+def connect(host, port, user='android', passwd='android', timeout=60):
+    ftp = ftplib.FTP(timeout=timeout)
+    ftp.connect(host, port)
+    ftp.login(user, passwd)
+    return ftp
+
+
+def ftp_entries(ftp, path):
+    """
+    Recursively lists the files under path along with their mlsd facts
+
+    :return: generator of (remote path, facts) tuples
+    """
+    for name, facts in ftp.mlsd(path, facts=['type', 'size', 'modify']):
+        if facts.get('type') == 'dir':
+            yield from ftp_entries(ftp, posixpath.join(path or '', name))
+        elif facts.get('type', 'file') == 'file':
+            yield posixpath.join(path or '', name), facts
+
+
+def pull_parallel(
+        host,
+        port,
+        local_path,
+        phone_path=None,
+        ext='jpg',
+        user='android',
+        passwd='android',
+        connections=4,
+        blocksize=2 ** 16,
+        timeout=60,
+        manifest=None,
+        refresh=False):
+    """
+    Parallel version of :func:`pull_from_phone`
+
+    One connection walks the phone's folders and feeds a queue, while ``connections`` other connections download
+    from it, so downloads start as soon as the first folder is listed. Files are named, skipped, resumed and verified
+    the same way as in :func:`pull_from_phone`, so no two downloads ever write to the same file.
+
+    :param blocksize: block size used by ``retrbinary``
+    :param manifest: file that records the remote listing and the finished downloads, see :class:`Manifest`
+    :param refresh: list the phone again even if the manifest has a complete listing
+    :return: dict with the number of files that were downloaded, skipped and failed
+    """
+    local_path = Path(local_path)
+    manifest = Manifest(manifest) if manifest is not None else None
+    local_path.mkdir(parents=True, exist_ok=True)
+    names = LocalNames(local_path)
+    work = queue.Queue(maxsize=10 * connections)
+    counts = {'downloaded': 0, 'skipped': 0, 'failed': 0}
+    lock = threading.Lock()
+
+    def count(key):
+        with lock:
+            counts[key] += 1
+
+    def walk():
+        ftp = None
+        try:
+            if manifest is None or refresh or not manifest.complete:
+                ftp = connect(host, port, user, passwd, timeout)
+                LOGGER.debug(f'Connected to {host}:{port}')
+            for remote, facts in listing(ftp, phone_path, manifest, refresh):
+                if PurePosixPath(remote).suffix == f'.{ext}':
+                    # named here, in the order of the listing
+                    work.put((remote, facts, names(remote)))
+        except Exception as e:
+            LOGGER.exception(repr(e))
+        finally:
+            for _ in range(connections):
+                work.put(None)
+            if ftp is not None:
+                ftp.quit()
+
+    def download():
+        ftp = None
+        while True:
+            item = work.get()
+            if item is None:
+                break
+            remote, facts, res = item
+            try:
+                if is_complete(res, remote, facts, manifest):
+                    LOGGER.info('file already exists: "%s"', res)
+                    count('skipped')
+                    continue
+                if ftp is None:
+                    ftp = connect(host, port, user, passwd, timeout)
+                fetch(ftp, remote, res, facts, blocksize)
+                LOGGER.info('ftp success: "%s", "%s"', remote, res)
+                if manifest is not None:
+                    manifest.finish(remote, facts)
+                count('downloaded')
+            except ftplib.all_errors as e:
+                LOGGER.error('ftp failed: "%s", "%s", %r', remote, res, e)
+                count('failed')
+                # start over with a fresh connection for the next file
+                if ftp is not None:
+                    ftp.close()
+                    ftp = None
+            except Exception as e:
+                # e.g. a malformed size fact, the worker has to keep taking items or the walker blocks on the queue
+                LOGGER.exception('ftp failed: "%s", "%s", %r', remote, res, e)
+                count('failed')
+        if ftp is not None:
+            ftp.quit()
+
+    threads = [threading.Thread(target=walk)] + [threading.Thread(target=download) for _ in range(connections)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if manifest is not None:
+        manifest.close()
+
+    LOGGER.info(f'{counts}')
+    return counts
+
+
+def transferred_files(ftplog, cache=True):
+    for paths in log.keyword_paths(ftplog, 'ftp success', cache):
+        yield list(paths)
 
 
-def skipped_files(ftplog):
-    for line in log.filter(log.line_gen(ftplog), 'file already exists'):
-        yield (log.get_paths(line))
+def skipped_files(ftplog, cache=True):
+    for paths in log.keyword_paths(ftplog, 'file already exists', cache):
+        yield list(paths)
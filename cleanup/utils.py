@@ -11,6 +11,6 @@ def timer(func):
     def wrapper(*args, **kwargs):
         start = time.perf_counter()
         res = func(*args, **kwargs)
-        print(f'Finished {func.__name__!r} in {timedelta(seconds=time.perf_counter() - start)}')
+        LOGGER.info(f'Finished {func.__name__!r} in {timedelta(seconds=time.perf_counter() - start)}')
         return res
     return wrapper
@@ -0,0 +1,441 @@
+"""
+Watch mode: keeps a processed DataFrame up to date as files land in, change in or disappear from a folder
+
+A :class:`Watcher` reports which files changed, :class:`IncrementalChain` reads the metadata of just those files and
+reruns the processors on the rows they affect, and :func:`watch` ties the two together in a loop.
+"""
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, Set
+
+import numpy as np
+import pandas as pd
+
+from .df import paths
+from .df.scan import scan_paths, walk
+from .df.statdf import finish_df, stat_df
+from .processing.chain import ProcessChain
+
+LOGGER = logging.getLogger(__name__)
+
+# from linux/inotify.h
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+EVENT = struct.Struct('iIII')
+
+
+@dataclass
+class Changes:
+    """
+    Files that were created or modified and files or folders that were deleted, as path strings. If rescan is set,
+    events were lost and the whole tree has to be scanned again.
+    """
+    changed: Set[str] = field(default_factory=set)
+    deleted: Set[str] = field(default_factory=set)
+    rescan: bool = False
+
+    def __bool__(self):
+        return bool(self.changed or self.deleted or self.rescan)
+
+    def add(self, other: 'Changes'):
+        self.changed = (self.changed - other.deleted) | other.changed
+        self.deleted = (self.deleted - other.changed) | other.deleted
+        self.rescan = self.rescan or other.rescan
+
+
+def relevant(name: str) -> bool:
+    # the same files as cleanup.df.scan.walk, minus the temporary files of the transfers
+    return '.' in name and not name.endswith('.part')
+
+
+class Watcher:
+    def poll(self, timeout: float) -> Changes:
+        """
+        Waits up to timeout seconds for changes
+        """
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class PollingWatcher(Watcher):
+    """
+    Finds changes by comparing the size and modification time of every file with the previous walk of the tree
+    """
+    def __init__(self, root, interval: float = 5.):
+        self.root = os.fspath(root)
+        self.interval = interval
+        self.snapshot = self.walk()
+
+    def walk(self) -> Dict[str, tuple]:
+        res = {}
+        for entry in walk(self.root):
+            if relevant(entry.name):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                res[entry.path] = (st.st_size, st.st_mtime_ns)
+        return res
+
+    def poll(self, timeout: float) -> Changes:
+        time.sleep(min(timeout, self.interval))
+        snapshot = self.walk()
+        res = Changes(
+            changed={p for p, st in snapshot.items() if self.snapshot.get(p) != st},
+            deleted=set(self.snapshot) - set(snapshot),
+        )
+        self.snapshot = snapshot
+        return res
+
+
+class InotifyWatcher(Watcher):
+    """
+    Linux inotify watches on every folder of the tree, through ctypes
+
+    Files are reported once they're closed after writing or moved into the tree, so half written files don't show up.
+    """
+    def __init__(self, root):
+        self.root = os.fspath(root)
+        self.libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.folders = {}
+        self.add_tree(self.root)
+
+    def add(self, folder: str):
+        wd = self.libc.inotify_add_watch(self.fd, os.fsencode(folder), WATCH_MASK)
+        if wd < 0:
+            LOGGER.warning(f'could not watch "{folder}": {os.strerror(ctypes.get_errno())}')
+        else:
+            self.folders[wd] = folder
+
+    def add_tree(self, folder: str, changes: Changes = None):
+        """
+        Watches folder and every folder below it, and reports the files already in them as changed
+        """
+        self.add(folder)
+        for dirpath, dirnames, filenames in os.walk(folder):
+            for name in dirnames:
+                self.add(os.path.join(dirpath, name))
+            if changes is not None:
+                changes.changed.update(os.path.join(dirpath, n) for n in filenames if relevant(n))
+
+    def poll(self, timeout: float) -> Changes:
+        res = Changes()
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return res
+        try:
+            buf = os.read(self.fd, 2 ** 16)
+        except BlockingIOError:
+            return res
+
+        pos = 0
+        while pos < len(buf):
+            wd, mask, cookie, length = EVENT.unpack_from(buf, pos)
+            name = os.fsdecode(buf[pos + EVENT.size:pos + EVENT.size + length].rstrip(b'\0'))
+            pos += EVENT.size + length
+            if mask & IN_Q_OVERFLOW:
+                LOGGER.warning('inotify queue overflowed, rescanning')
+                res.rescan = True
+                continue
+            if mask & IN_IGNORED:
+                self.folders.pop(wd, None)
+                continue
+            if wd not in self.folders or not name:
+                continue
+
+            path = os.path.join(self.folders[wd], name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self.add_tree(path, res)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    res.add(Changes(deleted={path}))
+            elif relevant(name):
+                if mask & (IN_CLOSE_WRITE | IN_MOVED_TO):
+                    res.add(Changes(changed={path}))
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    res.add(Changes(deleted={path}))
+        return res
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+
+
+def make_watcher(root, polling: bool = None, interval: float = 5.) -> Watcher:
+    """
+    :param polling: force (True) or refuse (False) the polling watcher, by default it's only used where inotify
+        isn't available
+    """
+    if not polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(root)
+        except (OSError, AttributeError) as e:
+            if polling is False:
+                raise
+            LOGGER.warning(f'inotify is not available, polling every {interval} s: {repr(e)}')
+    return PollingWatcher(root, interval)
+
+
+class IncrementalChain:
+    """
+    A processed DataFrame of a folder that's kept up to date by rerunning a :class:`ProcessChain` on what changed
+
+    Changed files get their metadata read again and go through the row local processors on their own. Before a
+    processor that needs to see more than one row, the rows of the groups it handles that the changes touch (see
+    :meth:`Processor.group_cols <cleanup.processing.processor.Processor.group_cols>`) are pulled in, so for
+    :class:`~cleanup.processing.unique.UniqueIDer` only the groups of duplicates that gained or lost a file are
+    decided again. Processors without group columns get rerun on every row. The pulled in rows also go through the
+    rest of the chain again, since their values may have changed. The rows of each update are kept as a batch of
+    their own, and only merged into :attr:`df` when it's read or after :attr:`MAX_PARTS` batches.
+
+    :param source: folder to keep track of
+    :param chain: processors to run
+    :param df: the processed DataFrame of source, made with a full scan if None
+    :param scan_kwargs: passed to :func:`~cleanup.df.stat_df` for the full scan, and the ones it shares with
+        :func:`~cleanup.df.scan.scan_paths` to it for the changed files, which then get the same ``keep_cols`` and
+        ``compact`` treatment as the full scan
+    """
+    SCAN_ARGS = ['min_size', 'os_meta', 'exif_meta', 'stop_tag', 'workers', 'fast_exif']
+    # batches of added rows that are kept before they're merged into the DataFrame
+    MAX_PARTS = 16
+
+    def __init__(self, source, chain: ProcessChain, df: pd.DataFrame = None, **scan_kwargs):
+        self.source = Path(source)
+        self.chain = chain
+        self.scan_kwargs = scan_kwargs
+        if df is None:
+            df = self.full_scan()
+        self.set_df(df)
+
+    def full_scan(self) -> pd.DataFrame:
+        kwargs = dict(self.scan_kwargs)
+        kwargs.setdefault('workers', 1)
+        return self.chain.process_all(stat_df(self.source, **kwargs))
+
+    def set_df(self, df: pd.DataFrame):
+        # the DataFrame is kept as the frame of the last merge followed by the batches of rows added since, with the
+        # labels of the rows that were taken out of each of them again, see merge
+        self.parts = [df.reset_index(drop=True)]
+        self.dropped = [set()]
+        self.labels = dict(zip(map(os.fspath, self.parts[0]['path']), self.parts[0].index))
+        self.next_label = self.parts[0].shape[0]
+
+    @property
+    def df(self) -> pd.DataFrame:
+        """
+        The processed DataFrame of the folder
+        """
+        if len(self.parts) > 1 or self.dropped[0]:
+            self.merge()
+        return self.parts[0]
+
+    def merge(self):
+        """
+        Puts the batches of added rows and the frame of the last merge together into one DataFrame
+        """
+        frames = [part[~part.index.isin(list(dropped))] if dropped else part
+                  for part, dropped in zip(self.parts, self.dropped)]
+        df = restore_dtypes(pd.concat(frames), self.parts[0]).sort_index() if len(frames) > 1 else frames[0]
+        self.parts, self.dropped = [df], [set()]
+
+    def take(self, select: Callable[[pd.DataFrame], np.ndarray]) -> pd.DataFrame:
+        """
+        Takes rows out of the DataFrame without copying the parts they're taken from
+
+        :param select: gets a part of the DataFrame and returns a mask of the rows to take from it
+        :return: the rows taken
+        """
+        taken = []
+        for part, dropped in zip(self.parts, self.dropped):
+            if part.empty:
+                continue
+            mask = np.asarray(select(part), dtype=bool)
+            if dropped:
+                mask &= ~part.index.isin(list(dropped))
+            if mask.any():
+                taken.append(part[mask])
+                dropped.update(part.index[mask])
+        if not taken:
+            return self.parts[0].iloc[:0]
+        return restore_dtypes(pd.concat(taken), self.parts[0]) if len(taken) > 1 else taken[0]
+
+    def read(self, files) -> pd.DataFrame:
+        kwargs = {k: v for k, v in self.scan_kwargs.items() if k in self.SCAN_ARGS}
+        # the same columns and dtypes as the full scan
+        df = finish_df(scan_paths(sorted(files), **kwargs), self.scan_kwargs.get('keep_cols'),
+                       kwargs.get('min_size'), self.scan_kwargs.get('compact', False))
+        df.index = pd.RangeIndex(self.next_label, self.next_label + df.shape[0])
+        self.next_label += df.shape[0]
+        return df
+
+    def remove(self, files, folders=()) -> pd.DataFrame:
+        """
+        Takes the rows of files and of everything in folders out of the DataFrame
+
+        :return: the removed rows
+        """
+        labels = [self.labels.pop(f) for f in files if f in self.labels]
+        prefixes = tuple(f.rstrip(os.sep) + os.sep for f in folders)
+        if prefixes:
+            # a single pass over the files for all the folders
+            inside = [p for p in self.labels if p.startswith(prefixes)]
+            labels.extend(self.labels.pop(p) for p in inside)
+        labels = pd.Index(labels)
+        return self.take(lambda part: part.index.isin(labels))
+
+    def update(self, changes: Changes) -> pd.DataFrame:
+        """
+        Applies a set of changes
+
+        :return: the rows that were added or had any of their values recomputed
+        """
+        if changes.rescan:
+            LOGGER.info(f'rescanning "{self.source}"')
+            self.set_df(self.full_scan())
+            return self.df
+
+        changed = {os.fspath(Path(p)) for p in changes.changed}
+        deleted = {os.fspath(Path(p)) for p in changes.deleted}
+        # only deleted paths that aren't files can be folders
+        removed = self.remove(changed | deleted, [p for p in deleted if p not in self.labels])
+        work = self.read(changed)
+        LOGGER.info(f'{len(changed)} changed and {len(changes.deleted)} deleted files, '
+                    f'{work.shape[0]} read, {removed.shape[0]} rows removed')
+
+        for stage in self.chain.stages():
+            if stage[0].row_local:
+                for p in stage:
+                    work = p.process(work) if work.shape[0] else work
+            else:
+                work = self.pull(stage[0], work, removed)
+                work = stage[0].process(work) if work.shape[0] else work
+
+        work = paths.drop_cached(work)
+        for label, path in zip(work.index, map(os.fspath, work['path'])):
+            self.labels[path] = label
+        # appended as a batch of its own, the whole DataFrame is only put together when it's read
+        self.parts.append(work)
+        self.dropped.append(set())
+        if len(self.parts) > self.MAX_PARTS:
+            self.merge()
+        return work
+
+    def pull(self, p, work: pd.DataFrame, removed: pd.DataFrame) -> pd.DataFrame:
+        """
+        Moves the rows that p has to see again from the DataFrame into the rows being worked on
+        """
+        cols = p.group_cols()
+        if cols is None:
+            pulled = self.take(lambda part: np.ones(part.shape[0], dtype=bool))
+        elif not self.labels:
+            return work
+        else:
+            keys = pd.concat([work.reindex(columns=cols), removed.reindex(columns=cols)]).dropna()
+            if keys.empty:
+                return work
+            keys = pd.MultiIndex.from_frame(keys)
+            pulled = self.take(lambda part: pd.MultiIndex.from_frame(part[cols]).isin(keys))
+
+        LOGGER.info(f'{repr(p)}: rerunning on {pulled.shape[0]} + {work.shape[0]} rows')
+        return pd.concat([work, pulled]) if not work.empty else pulled.copy()
+
+
+def restore_dtypes(df: pd.DataFrame, like: pd.DataFrame) -> pd.DataFrame:
+    """
+    Casts the columns of df back to the dtypes in like where concatenating with partly processed rows changed them
+    """
+    for col in like.columns.intersection(df.columns):
+        if isinstance(like[col].dtype, pd.CategoricalDtype):
+            # the categories of the new rows may not be among the old ones
+            if not isinstance(df[col].dtype, pd.CategoricalDtype):
+                df[col] = df[col].astype('category')
+        elif df[col].dtype != like[col].dtype:
+            try:
+                df[col] = df[col].astype(like[col].dtype)
+            except (TypeError, ValueError):
+                pass
+    return df
+
+
+def log_destinations(rows: pd.DataFrame):
+    if 'dest' not in rows:
+        return
+    selected = rows[rows['unique'].astype(bool)] if 'unique' in rows else rows
+    for src, dest in zip(selected['path'], selected['dest']):
+        LOGGER.info('destination: "%s", "%s"', src, dest)
+
+
+def watch(source,
+          chain: ProcessChain,
+          callback: Callable[[pd.DataFrame], None] = log_destinations,
+          polling: bool = None,
+          interval: float = 5.,
+          settle: float = 1.,
+          df: pd.DataFrame = None,
+          stop: Callable[[], bool] = None,
+          **scan_kwargs) -> IncrementalChain:
+    """
+    Keeps the processed DataFrame of a folder up to date until interrupted
+
+    :param source: folder to watch
+    :param chain: processors to run on the files
+    :param callback: called with the rows that were added or recomputed after each batch of changes, logs the
+        destination of the selected files by default
+    :param polling: see :func:`make_watcher`
+    :param interval: seconds between the walks of the polling watcher
+    :param settle: seconds without any new events before a batch of changes gets processed
+    :param df: processed DataFrame of source to start from, otherwise the folder is scanned
+    :param stop: returns True when the loop should end
+    :param scan_kwargs: passed to :class:`IncrementalChain`
+    :return: the :class:`IncrementalChain`, with the last state of the DataFrame
+    """
+    with make_watcher(source, polling, interval) as watcher:
+        state = IncrementalChain(source, chain, df, **scan_kwargs)
+        LOGGER.info(f'watching "{source}" with {type(watcher).__name__}: {state.df.shape[0]} files')
+        try:
+            while stop is None or not stop():
+                changes = watcher.poll(interval)
+                if not changes:
+                    continue
+                # let a burst of events settle before processing it
+                more = watcher.poll(settle)
+                while more:
+                    changes.add(more)
+                    more = watcher.poll(settle)
+                start = time.perf_counter()
+                rows = state.update(changes)
+                LOGGER.info(f'updated {rows.shape[0]} rows in {time.perf_counter() - start:.2f} s')
+                if callback is not None:
+                    callback(rows)
+        except KeyboardInterrupt:
+            LOGGER.info('stopped watching')
+    return state
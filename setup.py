@@ -15,5 +15,13 @@ setup(
         'ipywidgets',
         'qgrid',
     ],
-    packages=['cleanup']
+    extras_require={
+        'arrow': ['pyarrow'],
+        # NearDuplicates in cleanup.processing.phash
+        'phash': ['pillow'],
+    },
+    packages=find_packages(include=['cleanup', 'cleanup.*']),
+    entry_points={
+        'console_scripts': ['cleanup=cleanup.cli:main'],
+    },
 )
@@ -0,0 +1,60 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from bench import synth
+from cleanup.df.ascan import LatencyFS, ascan_df
+from cleanup.df.scan import scan_df
+
+
+class AsyncScanTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        synth.make_tree(self.root / 'a', 60, sizes=(40000, 80000), seed=1)
+        synth.make_tree(self.root / 'b', 60, sizes=(40000, 80000), seed=2)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_same_as_scan_df(self):
+        expected = scan_df(self.root, exif_meta=True, fast_exif=True, workers=1)
+        expected = expected.sort_values('path', key=lambda s: s.map(str), ignore_index=True)
+        res = ascan_df(self.root, exif_meta=True, fast_exif=True)
+        self.assertEqual(res['path'].to_list(), expected['path'].to_list())
+        self.assertEqual(list(res.columns), list(expected.columns))
+        for col in ['st_size', 'st_mtime', 'Image DateTime']:
+            self.assertEqual(res[col].to_list(), expected[col].to_list(), col)
+
+    def test_latency(self):
+        fs = LatencyFS(.01, mounts=[self.root / 'a', self.root / 'b'])
+        start = time.perf_counter()
+        res = ascan_df(self.root, min_size=None, exif_meta=True, fast_exif=True, fs=fs, max_inflight=64,
+                       per_mount=8)
+        elapsed = time.perf_counter() - start
+
+        # one call for each folder listing, stat and header read
+        self.assertGreater(res.shape[0], 120)
+        self.assertGreater(fs.calls, 2 * res.shape[0])
+        self.assertLess(elapsed, fs.calls * fs.latency / 4)
+
+        # the limit holds on each mount, but the mounts are read from at the same time
+        mounts = [str(self.root / 'a'), str(self.root / 'b')]
+        self.assertLessEqual(max(fs.peak[m] for m in mounts), 8)
+        self.assertGreater(sum(fs.peak[m] for m in mounts), 8)
+
+    def test_mount_boundary(self):
+        fs = LatencyFS(0, mounts=[self.root / 'a', self.root / 'a' / 'b'])
+        for path, mount in [(self.root / 'a' / 'x.jpg', self.root / 'a'),
+                            (self.root / 'a' / 'b', self.root / 'a' / 'b'),
+                            (self.root / 'a' / 'b' / 'x.jpg', self.root / 'a' / 'b'),
+                            (self.root / 'a' / 'bc' / 'x.jpg', self.root / 'a'),
+                            (self.root / 'ab' / 'x.jpg', '')]:
+            fs.peak = {}
+            fs.delay(str(path))
+            self.assertEqual(list(fs.peak), [str(mount)], path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+from bench import synth
+from cleanup.df.cache import CacheStats, MetadataCache
+from cleanup.df.statdf import stat_df
+
+
+class MetadataCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name) / 'photos'
+        synth.make_tree(self.root, 40, dup_rate=0, exclude_rate=0, other_rate=0, no_exif_rate=0,
+                        sizes=(60000, 90000))
+        self.files = sorted(self.root.rglob('*.jpg'))
+        self.cache = MetadataCache(Path(self.tmp.name) / 'meta.db')
+
+    def tearDown(self):
+        self.cache.close()
+        self.tmp.cleanup()
+
+    def scan(self, **kwargs):
+        self.cache.stats = CacheStats()
+        df = stat_df(self.root, exif_meta=True, workers=2, cache=self.cache, **kwargs)
+        return df.sort_values('path', key=lambda s: s.map(str), ignore_index=True)
+
+    def check_frame(self, df, **kwargs):
+        expected = stat_df(self.root, exif_meta=True, workers=2, **kwargs)
+        expected = expected.sort_values('path', key=lambda s: s.map(str), ignore_index=True)
+        self.assertEqual(list(df.columns), list(expected.columns))
+        # the exifread tags don't compare equal to each other, their printed values do. Reading the files changes
+        # their access times.
+        cols = [c for c in df.columns if not c.startswith('st_atime')]
+        self.assertTrue(df[cols].astype(str).equals(expected[cols].astype(str)))
+
+    def test_rescan(self):
+        df = self.scan()
+        self.assertEqual(vars(self.cache.stats), dict(hits=0, misses=40, stored=40, deleted=0))
+        self.assertEqual(len(self.cache), 40)
+        self.check_frame(df)
+
+        df = self.scan()
+        self.assertEqual(vars(self.cache.stats), dict(hits=40, misses=0, stored=0, deleted=0))
+        self.check_frame(df)
+
+        # a new date in a file of the same size, a touched file, a deleted one and a new one
+        changed, touched, deleted = self.files[:3]
+        data = synth.jpeg_bytes(datetime(2001, 2, 3, 4, 5, 6), changed.stat().st_size)
+        changed.write_bytes(data[:changed.stat().st_size])
+        st = touched.stat()
+        os.utime(touched, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        deleted.unlink()
+        (self.root / 'new.jpg').write_bytes(synth.jpeg_bytes(datetime(2002, 1, 1), 70000))
+
+        df = self.scan()
+        self.assertEqual(vars(self.cache.stats), dict(hits=37, misses=3, stored=3, deleted=1))
+        self.assertEqual(len(self.cache), 40)
+        self.assertEqual(str(df.loc[df['path'] == changed, 'Image DateTime'].iloc[0]), '2001:02:03 04:05:06')
+        self.assertNotIn(deleted, set(df['path']))
+        self.check_frame(df)
+
+    def test_reader(self):
+        self.scan()
+        # the fast reader gives different values, so it doesn't use the entries of exifread
+        df = self.scan(fast_exif=True)
+        self.assertEqual((self.cache.stats.hits, self.cache.stats.misses), (0, 40))
+        self.check_frame(df, fast_exif=True)
+        df = self.scan(fast_exif=True)
+        self.assertEqual((self.cache.stats.hits, self.cache.stats.misses), (40, 0))
+        self.check_frame(df, fast_exif=True)
+
+    def test_prune_prefix(self):
+        self.scan()
+        # scanning a subfolder only prunes the entries under it
+        sub = self.files[0].parent
+        other = [p for p in self.files if p.parent != sub]
+        for p in sub.glob('*.jpg'):
+            p.unlink()
+        self.cache.stats = CacheStats()
+        stat_df(sub, exif_meta=True, workers=1, cache=self.cache)
+        self.assertEqual(len(self.cache), len(other))
+        self.assertEqual(set(self.cache.entries()), {os.path.abspath(p) for p in other})
+
+
+if __name__ == '__main__':
+    unittest.main()
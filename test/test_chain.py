@@ -0,0 +1,106 @@
+import json
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+
+from cleanup.df.paths import compact_paths
+from cleanup.processing import FolderExcluder, FileIncluder, MinFileSize, ScanPathDate, DateSelector, \
+    DestinationGenerator, ProcessChain
+from cleanup.processing import parallel
+from cleanup.processing.chain import iter_chunks
+from cleanup.processing.unique import BiggestUnique
+from .test_unique import make_df
+
+try:
+    import pyarrow as arrow
+except ImportError:
+    arrow = None
+
+
+def make_chain():
+    return ProcessChain([
+        FolderExcluder(['backup']),
+        FileIncluder(['.jpg']),
+        MinFileSize(1000),
+        ScanPathDate(),
+        DateSelector(['pathdate', 'st_mtime']),
+        BiggestUnique(['included_folder', 'included_filetype'], ['filename', 'st_size']),
+        DestinationGenerator('dest'),
+    ])
+
+
+def make_chain_df(n=5000):
+    df = make_df(n)
+    df['path'] = [Path('2019-03-04') / p if i % 3 else Path('undated') / p for i, p in enumerate(df['path'])]
+    return df
+
+
+class ChainTest(unittest.TestCase):
+    def test_stages(self):
+        stages = make_chain().stages()
+        self.assertEqual([len(s) for s in stages], [5, 1, 1])
+
+    def test_chunked(self):
+        chain = make_chain()
+        df = make_chain_df()
+        serial = chain.process_all(df.copy())
+        self.assertFalse(serial.columns.str.startswith('_cache_').any())
+        chunked = pd.concat(chain.process_chunks(iter_chunks(df.copy(), 700)))
+        pd.testing.assert_frame_equal(serial, chunked)
+
+    def test_compact(self):
+        chain = make_chain()
+        df = make_chain_df()
+        legacy = chain.process_all(df.copy())
+        compact = chain.process_all(compact_paths(df.copy()))
+        for col in ['included_folder', 'included_filetype', 'pathdate', 'selected_date', 'unique', 'reason']:
+            pd.testing.assert_series_equal(legacy[col], compact[col], check_dtype=False)
+        self.assertEqual(legacy['dest'].to_list(), compact['dest'].to_list())
+
+    def test_parallel(self):
+        df = make_chain_df()
+        df.index = df.index * 2
+        serial = make_chain().process_all(df.copy())
+        for partition in ['rows', 'parent']:
+            chain = make_chain()
+            chain.workers, chain.partition = 2, partition
+            pd.testing.assert_frame_equal(serial, chain.process_all(df.copy()))
+            self.assertEqual(chain.report.processors[0].calls, 2)
+
+    def test_pack(self):
+        df, _ = parallel.ship(make_chain().process_all(make_chain_df(200)))
+        df.index = df.index * 2
+        packed = parallel.pack(df)
+        if arrow is None:
+            self.assertIs(packed, df)
+        else:
+            self.assertIsInstance(packed, bytes)
+            pd.testing.assert_frame_equal(parallel.unpack(packed), df)
+
+        # values Arrow can't hold, and no pyarrow at all, fall back to pickling the frame
+        odd = df.assign(tag=[object()] * df.shape[0])
+        self.assertIs(parallel.pack(odd), odd)
+        with mock.patch.dict('sys.modules', {'pyarrow': None}):
+            self.assertIs(parallel.pack(df), df)
+
+    def test_report(self):
+        chain = make_chain()
+        df = make_chain_df()
+        chain.process_all(df.copy())
+        report = chain.report
+        self.assertEqual(len(report.processors), len(chain.processors))
+        self.assertTrue(all(p.calls == 1 and p.rows_in == df.shape[0] for p in report.processors))
+        self.assertGreater(report.processors[0].mem_delta, 0)
+        self.assertIsNone(report.processors[0].profile)
+
+        chain.profile = True
+        list(chain.process_chunks(iter_chunks(df.copy(), 700)))
+        data = json.loads(chain.report.to_json())
+        self.assertEqual([p['calls'] for p in data['processors']], [8, 8, 8, 8, 8, 1, 8])
+        self.assertIn('cumulative', data['processors'][0]['profile'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from click.testing import CliRunner
+
+from bench import synth
+from cleanup import cli
+from cleanup.df.statdf import stat_df
+
+HEAVY = ['pandas', 'numpy', 'yaml', 'exifread']
+
+
+def import_times(*modules):
+    """
+    Imports modules in a fresh interpreter with ``-X importtime``
+
+    :return: (cumulative import time of each module that was imported in microseconds, modules that were loaded)
+    """
+    code = f'import sys; import {", ".join(modules)}; print(" ".join(sys.modules))'
+    res = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                         capture_output=True, text=True, check=True, cwd=Path(__file__).parents[1])
+    times = {}
+    for line in res.stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return times, set(res.stdout.split())
+
+
+class ImportTest(unittest.TestCase):
+    def test_light_imports(self):
+        modules = ['cleanup', 'cleanup.log', 'cleanup.transfer', 'cleanup.cli']
+        times, loaded = import_times(*modules)
+        self.assertEqual([m for m in HEAVY if m in loaded], [])
+        total = sum(times[m] for m in modules if m in times) / 1e6
+        self.assertLess(total, .2, f'importing {modules} took {total:.3f} s')
+
+    def test_lazy_names(self):
+        _, loaded = import_times('cleanup.processing')
+        self.assertNotIn('pandas', loaded)
+
+        from cleanup.processing import UniqueIDer
+        from cleanup.processing.chain import processor_map
+        self.assertIs(processor_map['duplicates'], UniqueIDer)
+        self.assertIn('UniqueIDer', dir(sys.modules['cleanup.processing']))
+        with self.assertRaises(AttributeError):
+            getattr(sys.modules['cleanup.processing'], 'Missing')
+
+
+class CliTest(unittest.TestCase):
+    def test_grep(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            logfile = Path(tmp) / 'test.log'
+            logfile.write_text('INFO:a:new file: "x.jpg"\nINFO:a:end copy: "x.jpg", "y.jpg"\nERROR:a:failed\n')
+            res = CliRunner().invoke(cli.main, ['grep', str(logfile), 'INFO', 'copy'])
+        self.assertEqual(res.exit_code, 0, res.output)
+        self.assertEqual(res.output, 'INFO:a:end copy: "x.jpg", "y.jpg"\n')
+
+    def test_scan_workers(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            synth.make_tree(Path(tmp) / 'photos', 10)
+            out = str(Path(tmp) / 'df.pkl')
+            for args, kwargs in [([], dict(workers=8, async_io=False)),
+                                 (['--async-io'], dict(workers=None, async_io=True, per_mount=64)),
+                                 (['--async-io', '--workers', '32', '--per-mount', '4'],
+                                  dict(workers=32, per_mount=4))]:
+                with self.subTest(args=args), mock.patch('cleanup.df.stat_df', wraps=stat_df) as scan:
+                    res = CliRunner().invoke(cli.main, ['scan', str(Path(tmp) / 'photos'), out] + args)
+                    self.assertEqual(res.exit_code, 0, res.output)
+                    self.assertEqual({k: scan.call_args.kwargs[k] for k in kwargs}, kwargs)
+
+
+if __name__ == '__main__':
+    unittest.main()
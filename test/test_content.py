@@ -0,0 +1,89 @@
+import hashlib
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+
+from cleanup.processing import content
+from cleanup.processing.content import ContentHasher, full_hash, partial_hash
+
+
+def blake(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class ContentHasherTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        big = b'a' * 4096 + b'middle' + b'z' * 4096
+        self.files = {
+            'unique': b'u' * 5000,
+            # small files that share a size, the partial hash covers them completely
+            'small_1': b'1' * 3000,
+            'small_2': b'2' * 3000,
+            'small_copy': b'1' * 3000,
+            # same first and last block, only the middle tells them apart
+            'big_1': big,
+            'big_2': big.replace(b'middle', b'MIDDLE'),
+            'big_copy': big,
+            # same size as big_1 but a different first block, resolved by the partial hash
+            'big_3': b'b' * 4096 + b'middle' + b'z' * 4096,
+        }
+        self.paths = {}
+        for name, data in self.files.items():
+            self.paths[name] = root / f'{name}.jpg'
+            self.paths[name].write_bytes(data)
+        self.df = pd.DataFrame({'path': list(self.paths.values()),
+                                'st_size': [len(d) for d in self.files.values()]},
+                               index=list(self.files))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_hashes(self):
+        data = self.files['big_1']
+        self.assertEqual(full_hash(self.paths['big_1']), blake(data))
+        self.assertEqual(partial_hash(self.paths['big_1'], len(data)), blake(data[:4096] + data[-4096:]))
+        self.assertEqual(partial_hash(self.paths['small_1'], 3000), blake(self.files['small_1']))
+
+    def test_staged_keys(self):
+        with mock.patch.object(content, 'full_hash', wraps=full_hash) as full, \
+                mock.patch.object(content, 'partial_hash', wraps=partial_hash) as partial:
+            keys = ContentHasher().process(self.df)['content_hash']
+
+        # the file with a unique size is never opened
+        self.assertEqual(keys['unique'], 'size:5000')
+        self.assertNotIn(self.paths['unique'], [c.args[0] for c in partial.call_args_list])
+        self.assertEqual(partial.call_count, 7)
+
+        self.assertEqual(keys['small_1'], 'size:3000:partial:' + blake(self.files['small_1']))
+        self.assertEqual(keys['small_1'], keys['small_copy'])
+        self.assertNotEqual(keys['small_1'], keys['small_2'])
+        self.assertTrue(keys['big_3'].startswith(f'size:{len(self.files["big_3"])}:partial:'))
+
+        # only the big files that collide on the partial hash are read completely
+        self.assertEqual(sorted(c.args[0].stem for c in full.call_args_list), ['big_1', 'big_2', 'big_copy'])
+        self.assertEqual(keys['big_1'], f'size:{len(self.files["big_1"])}:full:' + blake(self.files['big_1']))
+        self.assertEqual(keys['big_1'], keys['big_copy'])
+        self.assertNotEqual(keys['big_1'], keys['big_2'])
+
+    def test_mask(self):
+        self.df['included'] = True
+        self.df.loc['small_copy', 'included'] = False
+        keys = ContentHasher(mask_cols=['included']).process(self.df)['content_hash']
+        self.assertIsNone(keys['small_copy'])
+        self.assertEqual(keys['small_1'], 'size:3000:partial:' + blake(self.files['small_1']))
+
+    def test_unreadable(self):
+        self.paths['small_2'].unlink()
+        with self.assertLogs(content.logger, 'ERROR'):
+            keys = ContentHasher().process(self.df)['content_hash']
+        self.assertEqual(keys['small_2'], f'size:3000:partial:error:{self.paths["small_2"]}')
+        self.assertEqual(keys['small_1'], keys['small_copy'])
+
+
+if __name__ == '__main__':
+    unittest.main()
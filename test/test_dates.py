@@ -0,0 +1,88 @@
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+from exifread.classes import IfdTag
+
+from cleanup.df.utils import scan_date, scan_pathdate
+from cleanup.processing import ConvertIfdTag, DateSelector
+
+PATHS = [
+    Path('Pictures') / '2019' / '05 May' / 'IMG_1234.jpg',
+    Path('Pictures') / 'IMG_20190506_101112.jpg',
+    Path('Pictures') / '2019-05-00' / 'a.jpg',
+    Path('Pictures') / '2019-02-30' / 'a.jpg',
+    Path('Pictures') / '1949-05-06' / 'a.jpg',
+    Path('Pictures') / '2019-13-06' / 'a.jpg',
+    Path('Pictures') / 'no date' / 'a.jpg',
+    Path('20180101') / '2019-05-06' / 'a.jpg',
+]
+
+
+def tag(value):
+    return IfdTag(value, 0x132, 2, value, 0, len(value))
+
+
+TAGS = [
+    tag('2019:05:06 10:11:12'),
+    tag('06/05/2019 10:11:12'),
+    tag('2019_05_06'),
+    tag('0000:00:00 00:00:00'),
+    tag('2150:01:01 00:00:00'),
+    tag('garbage'),
+    datetime(2018, 1, 2),
+    datetime(2018, 1, 2, 3, 4, 5),
+    None,
+]
+
+
+class DateTest(unittest.TestCase):
+    def test_scan_pathdate(self):
+        df = pd.DataFrame({'path': PATHS})
+        expected = pd.Series([scan_date(p) or pd.NaT for p in PATHS], dtype='datetime64[ns]')
+        pd.testing.assert_series_equal(scan_pathdate(df).astype('datetime64[ns]'), expected, check_names=False)
+
+    def test_folder_memo(self):
+        # dates close to the end of a folder can be changed by the file name
+        paths = [Path('a') / f'x{folder}' / name for folder in ['2019-05-06', '201905', '2019', 'Trip 2019_0', 'b']
+                 for name in ['06.jpg', '0607.jpg', 'IMG_20180102.jpg', 'a.jpg']]
+        df = pd.DataFrame({'path': paths})
+        expected = pd.Series([scan_date(p) or pd.NaT for p in paths], dtype='datetime64[ns]')
+        pd.testing.assert_series_equal(scan_pathdate(df).astype('datetime64[ns]'), expected, check_names=False)
+
+        folders = pd.Series([scan_date(p.parent) or pd.NaT for p in paths], dtype='datetime64[ns]')
+        pd.testing.assert_series_equal(scan_pathdate(df, match_on='parent').astype('datetime64[ns]'), folders,
+                                       check_names=False)
+
+    def test_convert_ifdtag(self):
+        proc = ConvertIfdTag(cols=('Image DateTime',))
+        df = pd.DataFrame({'Image DateTime': TAGS})
+        expected = pd.Series([proc.convert(t, proc.formats) for t in TAGS], dtype='datetime64[ns]')
+        res = proc.process(df)['Image DateTime']
+        pd.testing.assert_series_equal(res.astype('datetime64[ns]'), expected, check_names=False)
+
+    def test_out_of_bounds(self):
+        # dates that don't fit datetime64[ns] are NaT instead of an error
+        proc = ConvertIfdTag(cols=('Image DateTime',))
+        values = ['9999:12:31 00:00:00', '2500:01:01 00:00:00', '1600:01:01 00:00:00', '31/12/9999',
+                  '2019:05:06 10:11:12']
+        df = pd.DataFrame({'Image DateTime': [tag(v) for v in values] + [datetime(1500, 1, 1)]})
+        res = proc.process(df)['Image DateTime']
+        self.assertEqual(res.isna().to_list(), [True] * 4 + [False, True])
+        self.assertEqual(res[4], pd.Timestamp(2019, 5, 6))
+
+    def test_select_date(self):
+        df = pd.DataFrame({
+            'EXIF DateTimeOriginal': pd.to_datetime(['2019-01-01', None, None]),
+            'pathdate': pd.to_datetime([None, '2018-01-01', None]),
+        })
+        proc = DateSelector(['EXIF DateTimeOriginal', 'missing', 'pathdate'])
+        expected = df.apply(proc.select_from_row, cols=proc.source_cols, axis=1)
+        res = proc.process(df)
+        pd.testing.assert_series_equal(res['selected_date'], expected, check_names=False)
+        self.assertEqual(res['valid date'].to_list(), [True, True, False])
+
+
+if __name__ == '__main__':
+    unittest.main()
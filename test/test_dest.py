@@ -0,0 +1,102 @@
+import tempfile
+import unittest
+from dataclasses import dataclass
+from pathlib import Path
+
+import pandas as pd
+
+from bench import synth
+from cleanup.df.paths import compact_paths
+from cleanup.processing import DatedDestinationGen, DestinationGenerator, DestinationPlanner
+from cleanup.processing.content import full_hash
+
+
+@dataclass
+class Flat(DestinationGenerator):
+    def gen_dest(self, row: pd.Series) -> Path:
+        return Path(self.dest_base) / f'{row["st_size"]}.jpg'
+
+
+class GeneratorTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.df = synth.make_df(500)
+        self.df['selected_date'] = self.df['st_mtime']
+
+    def check(self, proc, df):
+        expected = [proc.gen_dest(row) for _, row in df.iterrows()]
+        self.assertEqual(proc.process(df.copy())['dest'].to_list(), expected)
+
+    def test_vectorized(self):
+        for proc in [DestinationGenerator('sorted'), DatedDestinationGen('sorted'),
+                     DatedDestinationGen('sorted', format='%Y/%m')]:
+            self.assertTrue(proc.vectorized())
+            self.check(proc, self.df)
+            self.check(proc, compact_paths(self.df.copy()))
+
+    def test_fallback(self):
+        self.assertFalse(Flat('sorted').vectorized())
+        self.check(Flat('sorted'), self.df)
+
+
+class PlannerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dest = Path(self.tmp.name) / 'dest'
+        self.dest.mkdir()
+        src = Path(self.tmp.name) / 'src'
+        self.df = pd.DataFrame({
+            'path': [src / p for p in ['b/a.jpg', 'a/a.jpg', 'c/a.jpg', 'd/a_1.jpg', 'e/x.jpg', 'f/y.jpg',
+                                       'g/z.jpg', 'h/n.jpg', 'i/IMG_0001.CR2']],
+            'st_size': [10, 20, 30, 40, 50, 60, 70, 80, 1000],
+            'unique': [True] * 7 + [False, True],
+        })
+        for path, size in zip(self.df['path'], self.df['st_size']):
+            path.parent.mkdir(parents=True)
+            path.write_bytes(path.name.encode()[:1] * size)
+        self.df['dest'] = [self.dest / p.name for p in self.df['path']]
+        # an earlier transfer of f/y.jpg, an unrelated file by the name of g/z.jpg, and another camera's file with
+        # the same name and size as i/IMG_0001.CR2
+        (self.dest / 'y.jpg').write_bytes(b'y' * 60)
+        (self.dest / 'z.jpg').write_bytes(b'x' * 5)
+        (self.dest / 'IMG_0001.CR2').write_bytes(b'J' * 1000)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def test_plan(self):
+        df = DestinationPlanner().process(self.df.copy())
+        names = [p.name for p in df['dest']]
+        # ordered by source path, a_1.jpg is left to the file that has that name
+        self.assertEqual(names, ['a_2.jpg', 'a.jpg', 'a_3.jpg', 'a_1.jpg', 'x.jpg', 'y.jpg', 'z_1.jpg', 'n.jpg',
+                                 'IMG_0001_1.CR2'])
+        self.assertEqual(df['dest_status'].drop(7).to_list(),
+                         ['renamed', 'new', 'renamed', 'new', 'new', 'exists', 'renamed', 'renamed'])
+        self.assertTrue(pd.isna(df['dest_status'].iloc[7]))
+        self.assertEqual(df['proposed_dest'].to_list(), self.df['dest'].to_list())
+
+        # planning again gives the same result, also with the renamed files transferred
+        for src, dest in zip(df['path'].iloc[:3], df['dest'].iloc[:3]):
+            dest.write_bytes(src.read_bytes())
+        again = DestinationPlanner().process(df.copy())
+        self.assertEqual(again['dest'].to_list(), df['dest'].to_list())
+        self.assertEqual(again['dest_status'].to_list()[:3], ['exists'] * 3)
+
+    def test_content_hash(self):
+        # the full hash of the source is used if it's there, the existing file is still read
+        self.df['content_hash'] = None
+        self.df.loc[8, 'content_hash'] = 'size:1000:full:' + full_hash(self.dest / 'IMG_0001.CR2')
+        df = DestinationPlanner().process(self.df.copy())
+        self.assertEqual(df.loc[8, 'dest'].name, 'IMG_0001.CR2')
+        self.assertEqual(df.loc[8, 'dest_status'], 'exists')
+
+    def test_ignore_case(self):
+        df = self.df.iloc[:2].copy()
+        df['dest'] = [self.dest / 'A.JPG', self.dest / 'a.jpg']
+        res = DestinationPlanner(ignore_case=True).process(df.copy())
+        self.assertEqual([p.name for p in res['dest']], ['A_1.JPG', 'a.jpg'])
+        res = DestinationPlanner(ignore_case=False).process(df.copy())
+        self.assertEqual([p.name for p in res['dest']], ['A.JPG', 'a.jpg'])
+
+
+if __name__ == '__main__':
+    unittest.main()
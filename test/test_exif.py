@@ -0,0 +1,140 @@
+import struct
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from bench import synth
+from cleanup.df.exif import read_exif_fast
+from cleanup.df.statdf import stat_df
+from cleanup.df.utils import read_exif
+from cleanup.processing.processor import ConvertIfdTag
+
+DATE = b'2019:05:06 07:08:09\x00'
+
+
+def tiff(endian: str, width_type: int = 3) -> bytes:
+    """
+    TIFF structure with Make, DateTime and an EXIF IFD with DateTimeOriginal and the dimensions, the width as a SHORT
+    or a LONG and the length as a LONG
+    """
+    def ifd(entries, offset):
+        data_offset = offset + 2 + 12 * len(entries) + 4
+        head, data = struct.pack(endian + 'H', len(entries)), b''
+        for tag, typ, count, value in entries:
+            if isinstance(value, bytes):
+                head += struct.pack(endian + 'HHLL', tag, typ, count, data_offset + len(data))
+                data += value
+            elif typ == 3:
+                # SHORT values are left aligned in the 4 bytes
+                head += struct.pack(endian + 'HHLHH', tag, typ, count, value, 0)
+            else:
+                head += struct.pack(endian + 'HHLL', tag, typ, count, value)
+        return head + struct.pack(endian + 'L', 0) + data
+
+    ifd0 = [(0x010F, 2, 6, b'Canon\x00'), (0x0132, 2, len(DATE), DATE), (0x8769, 4, 1, 0)]
+    exif_offset = 8 + len(ifd(ifd0, 8))
+    ifd0[-1] = (0x8769, 4, 1, exif_offset)
+    exif = [(0x9003, 2, len(DATE), DATE), (0xA002, width_type, 1, 4000), (0xA003, 4, 1, 70000)]
+    header = (b'II*\x00' if endian == '<' else b'MM\x00*') + struct.pack(endian + 'L', 8)
+    return header + ifd(ifd0, 8) + ifd(exif, exif_offset)
+
+
+def jpeg(body: bytes, before: bytes = b'') -> bytes:
+    app1 = b'Exif\x00\x00' + body
+    return b'\xff\xd8' + before + b'\xff\xe1' + struct.pack('>H', len(app1) + 2) + app1 + b'\xff\xda' + b'\x00' * 100
+
+
+EXPECTED = {
+    'Image Model': None,
+    'Image DateTime': datetime(2019, 5, 6, 7, 8, 9),
+    'EXIF DateTimeOriginal': datetime(2019, 5, 6, 7, 8, 9),
+    'EXIF ExifImageWidth': 4000,
+    'EXIF ExifImageLength': 70000,
+}
+TAGS = list(EXPECTED) + ['Image Make']
+
+
+class ReadExifFastTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read(self, data: bytes, name='a.jpg', tags=TAGS):
+        path = self.root / name
+        path.write_bytes(data)
+        return read_exif_fast(path, tags)
+
+    def check(self, data: bytes, name='a.jpg', compare=True):
+        res = self.read(data, name)
+        expected = {k: v for k, v in EXPECTED.items() if v is not None}
+        expected['Image Make'] = 'Canon'
+        self.assertEqual(res, expected)
+        if compare:
+            # same values as exifread
+            tags = read_exif(self.root / name)
+            for k, v in res.items():
+                self.assertEqual(v.strftime('%Y:%m:%d %H:%M:%S') if isinstance(v, datetime) else str(v),
+                                 str(tags[k]), k)
+
+    def test_byte_order(self):
+        for endian in '<>':
+            with self.subTest(endian=endian):
+                self.check(jpeg(tiff(endian)))
+                self.check(tiff(endian), 'a.tif')
+
+    def test_dimension_types(self):
+        for width_type in [3, 4]:
+            for endian in '<>':
+                with self.subTest(width_type=width_type, endian=endian):
+                    self.assertEqual(self.read(jpeg(tiff(endian, width_type)))['EXIF ExifImageWidth'], 4000)
+
+    def test_beyond_first_read(self):
+        # an ICC profile in APP2 segments pushes the EXIF segment past the first 64 KiB
+        app2 = b'ICC_PROFILE\x00' + b'\x00' * 40000
+        before = (b'\xff\xe2' + struct.pack('>H', len(app2) + 2) + app2) * 2
+        data = jpeg(tiff('>'), before)
+        self.assertGreater(data.index(b'Exif'), 2 ** 16)
+        # exifread doesn't find it there
+        self.check(data, compare=False)
+        # and with a small first read, the IFDs and values are read as needed too
+        path = self.root / 'a.jpg'
+        self.assertEqual(read_exif_fast(path, TAGS, size=16)['EXIF ExifImageLength'], 70000)
+
+    def test_bad_input(self):
+        self.assertEqual(self.read(b''), {})
+        self.assertEqual(self.read(b'\x89PNG\r\n\x1a\n' + b'\x00' * 100, 'a.png'), {})
+        self.assertEqual(self.read(b'not an image', 'a.txt'), {})
+        self.assertEqual(self.read(jpeg(b'')), {})
+        self.assertEqual(self.read(synth.jpeg_bytes(size=1000)), {})
+        data = jpeg(tiff('<'))
+        for end in [3, 20, 40, 60, 100, 150]:
+            with self.subTest(end=end):
+                self.assertIsInstance(self.read(data[:end]), dict)
+
+
+class DateAgreementTest(unittest.TestCase):
+    def test_selected_dates(self):
+        # the dates from both readers end up the same after ConvertIfdTag
+        with tempfile.TemporaryDirectory() as tmp:
+            synth.make_tree(tmp, 20, dup_rate=0, other_rate=0, exclude_rate=0, sizes=(60000, 70000))
+            res = []
+            for fast in [False, True]:
+                df = stat_df(tmp, exif_meta=True, fast_exif=fast, workers=1)
+                df = df.sort_values('path', key=lambda s: s.map(str), ignore_index=True)
+                dates = ConvertIfdTag().process(df)[['Image DateTime', 'EXIF DateTimeOriginal']]
+                res.append(dates.astype('datetime64[ns]'))
+        pd.testing.assert_frame_equal(res[0], res[1])
+        for col, dates in res[1].items():
+            dates = dates.dropna()
+            self.assertFalse(dates.empty)
+            self.assertTrue((dates == dates.dt.normalize()).all(), col)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import re
+import unittest
+from unittest import mock
+from pathlib import Path
+
+import pandas as pd
+
+from cleanup.df import paths
+from cleanup.processing import BaseFilenameMaker
+from cleanup.processing.filter import combine, filter_path
+
+PATHS = [Path('Pictures/Backup/IMG_1.jpg'), Path('Pictures/2019/IMG_2 (1).jpg'), Path('.thumbnails/IMG_3-edited.jpg'),
+         Path('Pictures/backups old/DSC_4_1.jpg'), Path('Pictures/2019/notes.txt'), None]
+
+
+class FilterTest(unittest.TestCase):
+    def setUp(self):
+        self.df = pd.DataFrame({'path': PATHS})
+
+    def check_path(self, folders, case=False):
+        strings = self.df['path'].map(str, na_action='ignore')
+        expected = [any(re.search(f, s, 0 if case else re.IGNORECASE) for f in folders) if isinstance(s, str)
+                    else False for s in strings]
+        self.assertEqual(filter_path(self.df, folders, case=case).to_list(), expected)
+
+    def test_filter_path(self):
+        self.check_path(['backup', 'back', '.thumbnails', 'Recycle Bin'])
+        self.check_path(['Backup'], case=True)
+        self.check_path([r'IMG_\d \(1\)', r'(\d)_\1'])
+        self.assertFalse(filter_path(self.df, []).any())
+
+    def test_match_on_parent(self):
+        m = filter_path(self.df, ['backup', 'edited'], match_on='parent')
+        self.assertEqual(m.to_list(), [True, False, False, True, False, False])
+
+    def test_cached_features(self):
+        df = self.df.iloc[:5].copy()
+        with mock.patch.object(paths, 'split', wraps=paths.split) as split:
+            suffixes = paths.suffixes(df)
+            stems = paths.stems(df)
+            self.assertEqual(split.call_count, 1)
+        self.assertIn('_cache_path_suffix', df)
+        self.assertEqual(suffixes.to_list(), ['.jpg'] * 4 + ['.txt'])
+        self.assertEqual(stems.to_list()[-1], 'notes')
+
+        # rows added later get their features computed
+        df = pd.concat([df, pd.DataFrame({'path': [Path('x/y.png')]})], ignore_index=True)
+        self.assertEqual(paths.suffixes(df).iloc[-1], '.png')
+        self.assertEqual(list(paths.drop_cached(df).columns), ['path'])
+
+    def test_cache_invalidation(self):
+        df = self.df.iloc[:5].copy()
+        self.assertEqual(paths.names(df).iloc[0], 'IMG_1.jpg')
+        self.assertEqual(paths.strings(df).iloc[0], str(PATHS[0]))
+
+        # a replaced column gets its features computed again, whichever is asked for first
+        df['path'] = [Path('other') / p.with_suffix('.png').name for p in df['path']]
+        self.assertEqual(paths.strings(df).iloc[0], str(Path('other/IMG_1.png')))
+        self.assertEqual(paths.names(df).to_list()[-1], 'notes.png')
+        self.assertEqual(paths.parents(df).iloc[2], 'other')
+
+        # in place changes of single rows have to invalidate the cache
+        df.loc[1, 'path'] = Path('x/y.gif')
+        paths.invalidate(df, 'path')
+        self.assertEqual(paths.suffixes(df).iloc[1], '.gif')
+
+    def test_other_feature_cols(self):
+        # columns that happen to be called like a feature aren't taken for it, only the ones of compact_paths
+        expected = [str(p.parent) for p in PATHS[:5]]
+        for parent in [[Path('elsewhere')] * 5, pd.Series(['elsewhere'] * 5, dtype='string')]:
+            df = self.df.iloc[:5].copy()
+            df['parent'] = parent
+            self.assertEqual(paths.parents(df).astype(str).to_list(), expected)
+            df['stem'] = 'x'
+            self.assertEqual(paths.stems(df).to_list()[-1], 'notes')
+
+        df = paths.compact_paths(self.df.iloc[:5].copy())
+        self.assertTrue(paths.is_compact(df, 'parent'))
+        pd.testing.assert_series_equal(paths.parents(df), df['parent'])
+        self.assertFalse(paths.is_compact(df, 'name'))
+
+    def test_parent_col(self):
+        from cleanup.processing import ParentCol
+        df = ParentCol().process(self.df.copy())
+        self.assertEqual(df['parent'].dtype, 'string')
+        self.assertEqual(df['parent'].iloc[0], str(Path('Pictures/Backup')))
+
+    def test_combine(self):
+        self.assertIsNone(combine([r'(?P<a>x)(?P=a)']))
+        self.assertIsNone(combine([]))
+        self.assertEqual(combine(['ab', 'abc', 'ad']).pattern, 'a(?:b|d)')
+
+    def test_base_filename(self):
+        regexes = [r'(?P<trim>_\d+)$', r'(?P<trim> \(\d\))$', r'(?P<trim>-edited)$']
+        df = BaseFilenameMaker(regexes).process(self.df.iloc[:5].copy())
+        self.assertEqual(df['base'].to_list(), ['IMG', 'IMG_2', 'IMG_3', 'DSC_4', 'notes'])
+        self.assertEqual(df['match'].to_list()[:4], ['_1', ' (1)', '-edited', '_1'])
+        self.assertTrue(pd.isna(df['match'].iloc[4]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+import logging
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from cleanup import log, logindex
+from cleanup.logindex import LogIndex
+
+LINES = [
+    'INFO:cleanup.df.statdf:constructing df from: "photos"',
+    'INFO:cleanup.df.scan:reading exif data: "photos/a.jpg"',
+    'ERROR:cleanup.df.scan:OSError(5, \'Input/output error\')',
+    'INFO:cleanup.mover:new file: "photos/a.jpg", "dest/a.jpg"',
+    'INFO:cleanup.mover:end copy: "photos/a.jpg", "dest/a.jpg"',
+    '2020-01-02 03:04:05,678 INFO:cleanup.mover:end copy: "photos/b.jpg", "dest/b.jpg"',
+]
+
+
+def setUpModule():
+    # the indexes of the log helpers go to the user's cache folder
+    global CACHE, ENV
+    CACHE = tempfile.TemporaryDirectory()
+    ENV = mock.patch.dict(os.environ, {'XDG_CACHE_HOME': CACHE.name})
+    ENV.start()
+
+
+def tearDownModule():
+    ENV.stop()
+    CACHE.cleanup()
+
+
+class LogIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.logfile = Path(self.tmp.name) / 'test.log'
+        self.logfile.write_text('\n'.join(LINES) + '\n')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_queries(self):
+        self.assertEqual(list(log.new_files(self.logfile)), [Path('dest/a.jpg')])
+        self.assertEqual(list(log.copied_files(self.logfile)), [
+            (Path('photos/a.jpg'), Path('dest/a.jpg')),
+            (Path('photos/b.jpg'), Path('dest/b.jpg')),
+        ])
+        self.assertEqual(list(log.errors(self.logfile)), [(LINES[2], Path('photos/a.jpg'))])
+        self.assertEqual(log.index(self.logfile).df['timestamp'].notna().sum(), 1)
+
+    def test_incremental(self):
+        cache = Path(self.tmp.name) / 'cache' / 'test.idx'
+        cache.parent.mkdir()
+        self.assertEqual(len(LogIndex(self.logfile, cache)), len(LINES))
+        self.assertTrue(cache.exists())
+        with self.logfile.open('a') as file:
+            file.write('INFO:cleanup.mover:end copy: "photos/c.jpg", "dest/c.jpg"\nINFO:cleanup.mover:partial')
+        with mock.patch.object(logindex.LOGGER, 'info') as info:
+            idx = LogIndex(self.logfile, cache)
+        # extended, not built again
+        info.assert_not_called()
+        self.assertEqual(len(idx), len(LINES) + 1)
+        self.assertEqual(list(idx.keyword_paths('end copy'))[-1], (Path('photos/c.jpg'), Path('dest/c.jpg')))
+
+        # a rewritten log gets indexed from scratch
+        self.logfile.write_text(LINES[1] + '\n')
+        self.assertEqual(len(LogIndex(self.logfile, cache)), 1)
+
+        # so does another log that uses the same cache file
+        other = Path(self.tmp.name) / 'other.log'
+        other.write_text(LINES[1] + '\n' + LINES[2] + '\n')
+        self.assertEqual(len(LogIndex(other, cache)), 2)
+
+    def test_cache_location(self):
+        # nothing is written next to the log
+        LogIndex(self.logfile)
+        LogIndex(self.logfile, cache=True)
+        self.assertEqual(sorted(p.name for p in Path(self.tmp.name).iterdir()), ['test.log'])
+        self.assertEqual(logindex.cache_file(self.logfile).parent, Path(CACHE.name) / 'cleanup' / 'logindex')
+        self.assertTrue(logindex.cache_file(self.logfile).exists())
+
+        # a cache that can't be written is left out
+        with self.assertLogs('cleanup.logindex', 'WARNING'):
+            idx = LogIndex(self.logfile, self.logfile / 'test.idx')
+        self.assertEqual(len(idx), len(LINES))
+
+    def test_helpers_cache(self):
+        # the helpers keep the index on disk by default, so a repeated query only reads the new lines
+        self.assertEqual(len(list(log.copied_files(self.logfile))), 2)
+        with self.logfile.open('a') as file:
+            file.write('INFO:cleanup.mover:end copy: "photos/c.jpg", "dest/c.jpg"\n')
+        with mock.patch.object(logindex.LOGGER, 'info') as info:
+            self.assertEqual(len(list(log.copied_files(self.logfile))), 3)
+        info.assert_not_called()
+        with mock.patch.object(logindex.LOGGER, 'info') as info:
+            self.assertEqual(len(list(log.copied_files(self.logfile, cache=None))), 3)
+        info.assert_called()
+
+
+class StructuredLogTest(unittest.TestCase):
+    def test_json_lines(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            logfile = Path(tmp) / 'test.log'
+            handler = logging.FileHandler(logfile, encoding='utf-8')
+            handler.setFormatter(log.JsonFormatter())
+            logger = logging.getLogger('cleanup.mover')
+            logger.addHandler(handler)
+            try:
+                logger.warning('new file: "%s", "%s"', 'photos/a.jpg', 'dest/a.jpg', extra={'size': 10})
+                logger.warning('end copy: "%s", "%s"', 'photos/a.jpg', 'dest/a.jpg')
+            finally:
+                logger.removeHandler(handler)
+                handler.close()
+
+            self.assertIn('"size": 10', logfile.read_text().splitlines()[0])
+            self.assertEqual(list(log.new_files(logfile)), [Path('dest/a.jpg')])
+            self.assertEqual(list(log.copied_files(logfile)), [(Path('photos/a.jpg'), Path('dest/a.jpg'))])
+            self.assertTrue(next(log.line_gen(logfile)).endswith('WARNING:cleanup.mover:new file: "photos/a.jpg", "dest/a.jpg"'))
+
+    def test_not_json(self):
+        # e.g. the continuation of a multi-line message that happens to start with a brace
+        lines = ['{"time": 0, "level": "INFO", "logger": "cleanup.mover", '
+                 '"msg": "end copy: \\"photos/a.jpg\\", \\"dest/a.jpg\\""}',
+                 '{not json',
+                 '{"no": "fields"}',
+                 'INFO:cleanup.mover:end copy: "photos/b.jpg", "dest/b.jpg"']
+        with tempfile.TemporaryDirectory() as tmp:
+            logfile = Path(tmp) / 'test.log'
+            logfile.write_text('\n'.join(lines) + '\n')
+            rendered = list(log.line_gen(logfile))
+            self.assertEqual(rendered[1:4], lines[1:])
+            self.assertEqual(list(log.copied_files(logfile)), [
+                (Path('photos/a.jpg'), Path('dest/a.jpg')),
+                (Path('photos/b.jpg'), Path('dest/b.jpg')),
+            ])
+            self.assertEqual(list(log.filter(log.line_gen(logfile), '{not')), ['{not json'])
+
+
+class ConfigureTest(unittest.TestCase):
+    def test_queue_with_handlers(self):
+        root = logging.getLogger()
+        handlers, level = root.handlers[:], root.level
+        root.addHandler(logging.NullHandler())
+        with tempfile.TemporaryDirectory() as tmp:
+            logfile = Path(tmp) / 'test.log'
+            listener = log.configure(logfile, stream_level=logging.CRITICAL, queue=True)
+            try:
+                logging.getLogger('cleanup.mover').info('new file: "%s", "%s"', 'a.jpg', 'dest/a.jpg')
+            finally:
+                listener.stop()
+                for handler in listener.handlers:
+                    handler.close()
+                root.handlers[:] = handlers
+                root.setLevel(level)
+            self.assertIn('INFO:cleanup.mover:new file: "a.jpg", "dest/a.jpg"', logfile.read_text())
+
+
+if __name__ == '__main__':
+    unittest.main()
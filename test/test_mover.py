@@ -0,0 +1,148 @@
+import contextlib
+import errno
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+
+from cleanup import mover
+
+
+class TransferTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.src = Path(self.tmp.name) / 'src'
+        self.dest = Path(self.tmp.name) / 'dest'
+        self.files = {}
+        for i in range(10):
+            path = self.src / f'folder{i % 3}' / f'IMG_{i}.jpg'
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(bytes([i]) * (100 + i))
+            self.files[path] = path.read_bytes()
+        self.df = pd.DataFrame({'path': list(self.files), 'unique': True})
+        self.df['dest'] = [self.dest / f'{p.parent.name}_{p.name}' for p in self.df['path']]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def check_dest(self):
+        for src, dest in zip(self.df['path'], self.df['dest']):
+            self.assertEqual(dest.read_bytes(), self.files[src])
+        self.assertEqual(sorted(p.name for p in self.dest.iterdir()), sorted(p.name for p in self.df['dest']))
+
+    def test_copy(self):
+        stats = mover.transfer_files(self.df, 'copy', workers=4)
+        self.assertEqual((stats.done, stats.skipped, stats.failed), (10, 0, 0))
+        self.check_dest()
+        self.assertTrue(all(p.exists() for p in self.files))
+        src, dest = self.df['path'][0], self.df['dest'][0]
+        self.assertEqual(os.stat(src).st_mtime, os.stat(dest).st_mtime)
+
+        # nothing is overwritten on a second run
+        self.assertEqual(mover.transfer_files(self.df, 'copy').skipped, 10)
+
+    def test_move(self):
+        stats = mover.transfer_files(self.df, 'move', workers=4)
+        self.assertEqual(stats.done, 10)
+        self.check_dest()
+        self.assertFalse(any(p.exists() for p in self.files))
+
+    def test_link(self):
+        stats = mover.transfer_files(self.df, 'link', workers=4)
+        self.assertEqual(stats.done, 10)
+        self.check_dest()
+        for src, dest in zip(self.df['path'], self.df['dest']):
+            self.assertTrue(os.path.samefile(src, dest))
+
+    def test_mask(self):
+        self.df['unique'] = [True, False] * 5
+        self.assertEqual(mover.transfer_files(self.df, 'copy').done, 5)
+        self.assertEqual(len(list(self.dest.iterdir())), 5)
+
+    def test_journal(self):
+        journal = Path(self.tmp.name) / 'transfer.journal'
+        first = self.df.iloc[:4]
+        self.assertEqual(mover.transfer_files(first, 'move', journal=journal).done, 4)
+
+        # the moved files are gone from src, a rerun only does the rest
+        stats = mover.transfer_files(self.df, 'move', journal=journal)
+        self.assertEqual((stats.done, stats.resumed, stats.failed), (6, 4, 0))
+        self.check_dest()
+        self.assertEqual(len(journal.read_text().splitlines()), 10)
+
+    def test_same_dest(self):
+        self.df['dest'] = self.dest / 'IMG.jpg'
+        self.dest.mkdir()
+        for mode in ['move', 'copy']:
+            with self.subTest(mode=mode):
+                stats = mover.transfer_files(self.df, mode, workers=8)
+                self.assertEqual((stats.done, stats.conflicts), (int(mode == 'move'), 9))
+                self.assertEqual([p.name for p in self.dest.iterdir()], ['IMG.jpg'])
+                # only the first file left its folder, every other file is still there
+                self.assertEqual(sum(p.exists() for p in self.files), 9)
+
+    def test_no_dest(self):
+        # e.g. the undated files of DatedDestinationGen
+        self.df.loc[[1, 2], 'dest'] = float('nan')
+        cwd = os.getcwd()
+        os.chdir(self.tmp.name)
+        try:
+            with self.assertLogs(mover.LOGGER, 'WARNING'):
+                stats = mover.transfer_files(self.df, 'move')
+        finally:
+            os.chdir(cwd)
+        self.assertEqual((stats.done, stats.skipped, stats.conflicts), (8, 2, 0))
+        self.assertEqual(sorted(p.name for p in Path(self.tmp.name).iterdir()), ['dest', 'src'])
+        self.assertTrue(all(p.exists() for p in self.df['path'][[1, 2]]))
+
+    def test_no_clobber(self):
+        # even when the check for an existing dest is passed, nothing is replaced
+        src, dest = self.df['path'][0], self.df['dest'][0]
+        self.dest.mkdir()
+        dest.write_bytes(b'other')
+        for func in mover.MODES.values():
+            with self.subTest(func=func.__name__):
+                with self.assertRaises(FileExistsError):
+                    func(src, dest)
+                self.assertEqual(dest.read_bytes(), b'other')
+                self.assertEqual(src.read_bytes(), self.files[src])
+        self.assertEqual([p.name for p in self.dest.iterdir()], [dest.name])
+
+    def test_short_copy(self):
+        src, dest = self.df['path'][0], self.df['dest'][0]
+        self.dest.mkdir()
+        for name, before in [('copy_file_range', ['_reflink']), ('sendfile', ['_reflink', '_copy_range'])]:
+            if not hasattr(os, name):
+                continue
+            with self.subTest(name=name), contextlib.ExitStack() as stack:
+                for func in before:
+                    stack.enter_context(mock.patch.object(mover, func, return_value=False))
+                # nothing sent, the next method copies the file
+                with mock.patch(f'os.{name}', return_value=0):
+                    mover.copy_file(src, dest)
+                self.assertEqual(dest.read_bytes(), self.files[src])
+                dest.unlink()
+
+                # stopped part way, nothing is left behind
+                with mock.patch(f'os.{name}', side_effect=[10, 0]), self.assertRaises(OSError):
+                    mover.copy_file(src, dest)
+                self.assertEqual(list(self.dest.iterdir()), [])
+
+    def test_no_hardlinks(self):
+        self.dest.mkdir()
+        with mock.patch('os.link', side_effect=OSError(errno.EPERM, 'not supported')):
+            self.assertEqual(mover.transfer_files(self.df, 'move').done, 10)
+            self.check_dest()
+            src = self.dest / 'again.jpg'
+            src.write_bytes(b'new')
+            with self.assertRaises(FileExistsError):
+                mover.copy_file(src, self.df['dest'][0])
+        self.assertEqual(self.df['dest'][0].read_bytes(), self.files[self.df['path'][0]])
+        self.assertEqual(len(list(self.dest.iterdir())), 11)
+
+
+if __name__ == '__main__':
+    unittest.main()
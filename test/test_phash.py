@@ -0,0 +1,85 @@
+import random
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+from cleanup.processing.phash import BKTree, NearDuplicates, group_hashes, hamming
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+class BKTreeTest(unittest.TestCase):
+    def test_query(self):
+        rng = random.Random(0)
+        hashes = [rng.getrandbits(64) for _ in range(500)]
+        # some hashes close to the first one
+        hashes += [hashes[0] ^ (1 << i) ^ (1 << (i + 7)) for i in range(10)]
+        tree = BKTree()
+        for h in hashes + hashes[:10]:
+            tree.add(h)
+        for h, threshold in [(hashes[0], 2), (hashes[1], 10), (hashes[0] ^ 1, 3), (0, 20)]:
+            expected = sorted((o, hamming(h, o)) for o in set(hashes) if hamming(h, o) <= threshold)
+            self.assertEqual(sorted(tree.query(h, threshold)), expected)
+        self.assertEqual(BKTree().query(1, 5), [])
+
+
+class GroupTest(unittest.TestCase):
+    def test_no_chaining(self):
+        # 0 and 15 are both within 2 of 3, but 4 bits apart
+        self.assertEqual(group_hashes([0, 3, 15], 2), {0: 0, 3: 0, 15: 15})
+        self.assertEqual(group_hashes([3, 0, 15], 2), {3: 3, 0: 3, 15: 3})
+
+    def test_within_threshold(self):
+        rng = random.Random(1)
+        bases = [rng.getrandbits(64) for _ in range(20)]
+        hashes = list(dict.fromkeys(b ^ (rng.getrandbits(64) & rng.getrandbits(64) & rng.getrandbits(64))
+                                    for b in bases for _ in range(10)))
+        reps = group_hashes(hashes, 6)
+        self.assertEqual(set(reps), set(hashes))
+        for h, rep in reps.items():
+            self.assertLessEqual(hamming(h, rep), 6)
+            self.assertEqual(reps[rep], rep)
+
+
+def blocks(seed: int):
+    rng = random.Random(seed)
+    img = Image.new('RGB', (360, 240))
+    for x in range(0, 360, 40):
+        for y in range(0, 240, 30):
+            img.paste(tuple(rng.randrange(256) for _ in range(3)), (x, y, x + 40, y + 30))
+    return img
+
+
+class NearDuplicatesTest(unittest.TestCase):
+    def test_process(self):
+        df = pd.DataFrame({
+            'path': [Path(f'{i}.jpg') for i in range(6)],
+            'phash': pd.Series([0b0, 0b11, 0b1111, 0b11, None, 2 ** 40], dtype=object),
+            'included': [True] * 4 + [False] * 2,
+        })
+        res = NearDuplicates(mask_cols=['included'], threshold=2).process(df)
+        self.assertEqual(res['near_group'].to_list()[:4], [0, 0, 2, 0])
+        self.assertEqual(res['near_dist'].to_list()[:4], [0, 2, 0, 2])
+        self.assertTrue(res[['near_group', 'near_dist']].iloc[4:].isna().all().all())
+
+    @unittest.skipIf(Image is None, 'Pillow is not installed')
+    def test_images(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            tmp = Path(tmp)
+            a, b = blocks(0), blocks(1)
+            a.save(tmp / 'a.jpg', quality=95)
+            a.resize((90, 60)).save(tmp / 'a_small.jpg', quality=50)
+            b.save(tmp / 'b.jpg')
+            df = pd.DataFrame({'path': sorted(tmp.iterdir())})
+            res = NearDuplicates(workers=1, prefer_thumbnail=False).process(df)
+        self.assertEqual(res['near_group'].to_list(), [0, 0, 2])
+        self.assertTrue((res['near_dist'] <= 4).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import yaml
+from click.testing import CliRunner
+
+from bench import synth
+from cleanup import cli
+from cleanup.pipeline import Pipeline, checkpoint_format
+
+
+def make_config(root: Path) -> dict:
+    return {
+        'source': str(root / 'archive'),
+        'work_dir': str(root / 'work'),
+        'filesize_min': None,
+        'exif': True,
+        'fast_exif': True,
+        'scan_workers': 2,
+        'processing': [
+            {'exclude_folders': synth.EXCLUDED},
+            {'include_ext': ['.jpg']},
+            {'convert_ifdtag': {'cols': ['Image DateTime']}},
+            {'pathdate': {}},
+            {'select_date': ['Image DateTime', 'pathdate', 'st_mtime']},
+            {'duplicates': {'mask_cols': ['included_folder', 'included_filetype'],
+                            'source_cols': ['filename', 'st_size']}},
+            {'dest_gen': str(root / 'sorted')},
+        ],
+        'transfer': {'mode': 'copy', 'workers': 2},
+    }
+
+
+class PipelineTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        synth.make_tree(self.root / 'archive', 200, sizes=(60000, 100000))
+        self.config = make_config(self.root)
+        self.yaml = self.root / 'config.yaml'
+        self.yaml.write_text(yaml.safe_dump(self.config))
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def invoke(self, *args):
+        res = CliRunner().invoke(cli.main, ['run', str(self.yaml), '--format', 'pickle', *args])
+        self.assertEqual(res.exit_code, 0, res.output)
+        return json.loads((self.root / 'work' / 'status.json').read_text())
+
+    def test_run(self):
+        status = self.invoke('--dry-run')
+        self.assertEqual([status[s]['state'] for s in ['scan', 'process', 'transfer']], ['done', 'done', 'skipped'])
+        self.assertFalse((self.root / 'sorted').exists())
+
+        # scan and processing are taken from their checkpoints
+        status = self.invoke()
+        self.assertEqual([status[s]['state'] for s in ['scan', 'process', 'transfer']],
+                         ['checkpoint', 'checkpoint', 'done'])
+        processed = Pipeline(self.config, fmt='pickle').load('process')
+        selected = processed[processed['unique']]
+        self.assertEqual(status['transfer']['done'], selected.shape[0])
+        self.assertEqual(sorted(p.name for p in (self.root / 'sorted').iterdir()),
+                         sorted(p.name for p in selected['dest']))
+
+        # a forced scan reruns everything after it, the transfer journal skips what was copied
+        status = self.invoke('--force', 'scan')
+        self.assertEqual(status['transfer']['done'], 0)
+        self.assertEqual(status['transfer']['resumed'], selected.shape[0])
+
+    @unittest.skipIf(checkpoint_format() == 'pickle', 'pyarrow is not installed')
+    def test_memory_limit(self):
+        whole = Pipeline(self.config, self.root / 'whole')
+        whole.run(['scan', 'process'])
+        chunked = Pipeline(self.config, self.root / 'chunked', memory_limit=2 ** 10)
+        chunked.run(['scan', 'process'])
+        self.assertEqual(chunked.chunksize(whole.load('scan')), 100)
+        self.assertGreater(whole.load('scan').shape[0], 200)
+
+        whole, chunked = whole.load('process'), chunked.load('process')
+        for col in ['path', 'unique', 'dest', 'selected_date']:
+            self.assertEqual(whole[col].to_list(), chunked[col].to_list(), col)
+
+    def test_memory_limit_pickle(self):
+        # a pickle can't be read in chunks, so the limit couldn't be kept
+        with self.assertRaises(ValueError):
+            Pipeline(self.config, fmt='pickle', memory_limit=2 ** 10)
+
+    def test_no_dest(self):
+        pipeline = Pipeline(self.config, fmt='pickle')
+        pipeline.run(['scan', 'process'])
+        processed = pipeline.load('process')
+        selected = processed['unique'].astype(bool)
+        processed.loc[processed.index[selected][:3], 'dest'] = None
+        pipeline.save(processed, 'process')
+
+        status = pipeline.run(['transfer'])
+        self.assertEqual((status['transfer']['done'], status['transfer']['no_dest']), (selected.sum() - 3, 3))
+        self.assertFalse((self.root / 'None').exists())
+        self.assertEqual(len(list((self.root / 'sorted').iterdir())), selected.sum() - 3)
+
+    def test_missing_checkpoint(self):
+        with self.assertRaises(FileNotFoundError):
+            Pipeline(self.config, fmt='pickle').run(['process'])
+
+
+if __name__ == '__main__':
+    unittest.main()
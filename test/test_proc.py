@@ -1,15 +1,31 @@
-from cleanup import sorter
+import tempfile
 import unittest
-import pandas as pd
+
+from bench import synth
+from bench.run import make_chain
+from cleanup.df import stat_df
+
 
 class ProcTest(unittest.TestCase):
     def setUp(self) -> None:
-        self.df = pd.read_pickle(r'test.pkl')
+        self.tmp = tempfile.TemporaryDirectory()
+        synth.make_tree(self.tmp.name, 300, sizes=(60000, 100000))
+        self.df = stat_df(self.tmp.name, min_size=None, exif_meta=True, fast_exif=True, workers=2)
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
 
     def test_proc(self):
-        s = sorter.UniqueIDer(self.df)
-        s.process()
-        return
+        df = make_chain().process_all(self.df)
+        included = df[df[['included_folder', 'included_filetype']].all(axis=1)]
+        counts = included['filename'].value_counts()
+        copies = included[included['filename'].isin(counts[counts > 1].index)]
+        self.assertFalse(copies.empty)
+        self.assertTrue(copies['duplicated'].all())
+        self.assertTrue(copies.groupby('filename')['unique'].sum().eq(1).all())
+        self.assertTrue(included['selected_date'].notna().all())
+        self.assertFalse(df.loc[df['path'].map(lambda p: p.parts[-3] in synth.EXCLUDED), 'included_folder'].any())
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,54 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from bench import synth
+from cleanup.df.scan import walk
+from cleanup.df.statdf import stat_df
+
+
+def by_path(df):
+    return df.sort_values('path', key=lambda s: s.map(str), ignore_index=True)
+
+
+class ScanTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        synth.make_tree(self.root, 60, sizes=(30000, 90000), seed=3)
+        # files without an extension, a small file, an empty folder and a folder with a '.' in its name
+        (self.root / 'README').write_bytes(b'x' * 60000)
+        (self.root / 'misc').mkdir()
+        (self.root / 'misc' / 'Thumbs').write_bytes(b'x' * 60000)
+        (self.root / 'small.jpg').write_bytes(synth.jpeg_bytes(size=100))
+        (self.root / 'empty').mkdir()
+        (self.root / 'album.d').mkdir()
+        (self.root / 'album.d' / 'IMG_1.jpg').write_bytes(synth.jpeg_bytes(size=70000))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_walk(self):
+        expected = {p for p in self.root.rglob('*.*') if p.is_file()}
+        self.assertEqual({Path(e.path) for e in walk(self.root)}, expected)
+        self.assertNotIn(self.root / 'README', expected)
+        self.assertIn(self.root / 'album.d' / 'IMG_1.jpg', expected)
+
+    def test_same_as_serial(self):
+        for min_size in [50000, None]:
+            expected = by_path(stat_df(self.root, min_size=min_size, exif_meta=True))
+            self.assertGreater(expected.shape[0], 40)
+            self.assertEqual(min_size is None, (self.root / 'small.jpg') in set(expected['path']))
+            for workers, processes in [(1, False), (4, False), (2, True)]:
+                with self.subTest(min_size=min_size, workers=workers, processes=processes):
+                    res = by_path(stat_df(self.root, min_size=min_size, exif_meta=True, workers=workers,
+                                          processes=processes))
+                    self.assertEqual(list(res.columns), list(expected.columns))
+                    self.assertEqual(res['path'].to_list(), expected['path'].to_list())
+                    # reading the files changes their access times, the exifread tags compare by their values
+                    cols = [c for c in res.columns if not c.startswith('st_atime')]
+                    self.assertTrue(res[cols].astype(str).equals(expected[cols].astype(str)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import pandas as pd
+
+from bench import synth
+from bench.run import make_chain
+from cleanup.df import store
+from cleanup.processing import ConvertIfdTag
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+
+class NormalizeTest(unittest.TestCase):
+    def test_normalize(self):
+        df = synth.make_df(500)
+        norm, path_cols = store.normalize(df)
+        self.assertEqual(path_cols, ['path'])
+        self.assertIsInstance(norm['path'].iloc[0], str)
+        self.assertIsInstance(df['path'].iloc[0], Path)
+
+        # the stored text of the tags is converted to the same dates as the tags themselves
+        proc = ConvertIfdTag(cols=('Image DateTime',))
+        pd.testing.assert_series_equal(proc.process(df.copy())['Image DateTime'],
+                                       proc.process(norm)['Image DateTime'])
+
+
+@unittest.skipIf(pyarrow is None, 'pyarrow is not installed')
+class StoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.folder = Path(self.tmp.name)
+        self.df = make_chain().process_all(synth.make_df(2000))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_roundtrip(self):
+        for name in ['df.parquet', 'df.feather']:
+            store.save_df(self.df, self.folder / name)
+            res = store.load_df(self.folder / name)
+            self.assertEqual(res['path'].to_list(), self.df['path'].to_list())
+            self.assertEqual(res['dest'].to_list(), self.df['dest'].to_list())
+            self.assertEqual(res['unique'].to_list(), self.df['unique'].to_list())
+
+            cols = make_chain().input_columns()
+            self.assertEqual(list(store.load_df(self.folder / name, columns=cols).columns),
+                             [c for c in cols if c in self.df])
+
+    def test_convert_pickles(self):
+        self.df.to_pickle(self.folder / 'a.pkl')
+        files = store.convert_pickles(self.folder, 'feather')
+        self.assertEqual(files, [self.folder / 'a.feather'])
+        self.assertEqual(store.load_df(files[0], columns=['path'])['path'].to_list(), self.df['path'].to_list())
+
+
+if __name__ == '__main__':
+    unittest.main()
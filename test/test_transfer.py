@@ -0,0 +1,150 @@
+import ftplib
+import logging
+import os
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from cleanup import transfer
+
+try:
+    from pyftpdlib.authorizers import DummyAuthorizer
+    from pyftpdlib.handlers import FTPHandler
+    from pyftpdlib.servers import ThreadedFTPServer
+except ImportError:
+    ThreadedFTPServer = None
+
+
+@unittest.skipIf(ThreadedFTPServer is None, 'pyftpdlib is not installed')
+class FTPTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.remote = Path(self.tmp.name) / 'phone'
+        self.local = Path(self.tmp.name) / 'local'
+        for folder in ['DCIM/Camera', 'DCIM/Screenshots', 'Download']:
+            (self.remote / folder).mkdir(parents=True)
+        self.files = {}
+        for i in range(20):
+            folder = ['DCIM/Camera', 'DCIM/Screenshots', 'Download'][i % 3]
+            data = bytes([i]) * (1000 + 997 * i)
+            (self.remote / folder / f'IMG_{i}.jpg').write_bytes(data)
+            self.files[f'IMG_{i}.jpg'] = data
+        (self.remote / 'Download' / 'notes.txt').write_text('not a picture')
+
+        authorizer = DummyAuthorizer()
+        authorizer.add_user('android', 'android', str(self.remote), perm='elr')
+        handler = type('Handler', (FTPHandler,), {'authorizer': authorizer})
+        logging.getLogger('pyftpdlib').setLevel(logging.WARNING)
+        self.server = ThreadedFTPServer(('127.0.0.1', 0), handler)
+        self.port = self.server.socket.getsockname()[1]
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self.serve, daemon=True)
+        self.thread.start()
+
+    def serve(self):
+        # the server has to be closed from the thread running its loop
+        while not self.stop.is_set():
+            self.server.serve_forever(timeout=.05, blocking=False)
+        self.server.close_all()
+
+    def tearDown(self):
+        self.stop.set()
+        self.thread.join()
+        self.tmp.cleanup()
+
+    def check_local(self):
+        self.assertEqual({p.name: p.read_bytes() for p in self.local.iterdir()}, self.files)
+
+    def test_pull_parallel(self):
+        counts = transfer.pull_parallel('127.0.0.1', self.port, self.local, '/', connections=3, blocksize=512)
+        self.assertEqual(counts, {'downloaded': 20, 'skipped': 0, 'failed': 0})
+        self.check_local()
+
+        # a truncated file gets downloaded again, complete ones are skipped
+        (self.local / 'IMG_5.jpg').write_bytes(b'x')
+        counts = transfer.pull_parallel('127.0.0.1', self.port, self.local, '/', connections=3)
+        self.assertEqual(counts, {'downloaded': 1, 'skipped': 19, 'failed': 0})
+        self.check_local()
+
+    def test_same_name(self):
+        # files with the same name in different folders each get a file of their own, even when their downloads
+        # run at the same time
+        for i, folder in enumerate(['DCIM/Camera', 'DCIM/Screenshots', 'Download']):
+            (self.remote / folder / 'dup.jpg').write_bytes(bytes([100 + i]) * 50000)
+        counts = transfer.pull_parallel('127.0.0.1', self.port, self.local, '/', connections=3, blocksize=512)
+        self.assertEqual(counts, {'downloaded': 23, 'skipped': 0, 'failed': 0})
+        local = {p.name: p.read_bytes() for p in self.local.iterdir()}
+        self.assertEqual({n: local.pop(n) for n in self.files}, self.files)
+        self.assertEqual(sorted(local), ['dup.jpg', 'dup_1.jpg', 'dup_2.jpg'])
+        self.assertEqual(sorted(local.values()), [bytes([100 + i]) * 50000 for i in range(3)])
+
+        # the names are the same on the next run
+        counts = transfer.pull_parallel('127.0.0.1', self.port, self.local, '/', connections=3)
+        self.assertEqual(counts, {'downloaded': 0, 'skipped': 23, 'failed': 0})
+
+    def test_modify(self):
+        counts = transfer.pull_parallel('127.0.0.1', self.port, self.local, '/', connections=3)
+        self.assertEqual(counts['downloaded'], 20)
+        # the local files keep the modification time of the server
+        remote = self.remote / 'DCIM' / 'Screenshots' / 'IMG_4.jpg'
+        self.assertEqual(int((self.local / 'IMG_4.jpg').stat().st_mtime), int(remote.stat().st_mtime))
+
+        # a file that changed on the phone without changing its size is downloaded again
+        data = bytes([99]) * len(self.files['IMG_4.jpg'])
+        remote.write_bytes(data)
+        os.utime(remote, (remote.stat().st_atime, remote.stat().st_mtime + 60))
+        self.files['IMG_4.jpg'] = data
+        counts = transfer.pull_parallel('127.0.0.1', self.port, self.local, '/', connections=3)
+        self.assertEqual(counts, {'downloaded': 1, 'skipped': 19, 'failed': 0})
+        self.check_local()
+
+    def test_resume(self):
+        self.local.mkdir()
+        data = self.files['IMG_7.jpg']
+        (self.local / 'IMG_7.jpg.part').write_bytes(data[:1000])
+        transfer.pull_from_phone('127.0.0.1', self.port, self.local, '/')
+        self.check_local()
+
+    def test_worker_errors(self):
+        # errors other than the ones of ftplib don't stop the workers, so the walker doesn't block on the full queue
+        res = {}
+        with mock.patch.object(transfer, 'fetch', side_effect=ValueError('bad size fact')):
+            thread = threading.Thread(target=lambda: res.update(transfer.pull_parallel(
+                '127.0.0.1', self.port, self.local, '/', connections=1)), daemon=True)
+            thread.start()
+            thread.join(30)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(res, {'downloaded': 0, 'skipped': 0, 'failed': 20})
+
+    def test_size_mismatch(self):
+        # one bad file doesn't end the sequential run
+        fetch = transfer.fetch
+
+        def bad_fetch(ftp, remote, res, facts, *args):
+            if res.name == 'IMG_5.jpg':
+                raise ftplib.Error(f'size mismatch for {remote}')
+            fetch(ftp, remote, res, facts, *args)
+
+        with mock.patch.object(transfer, 'fetch', bad_fetch):
+            transfer.pull_from_phone('127.0.0.1', self.port, self.local, '/')
+        del self.files['IMG_5.jpg']
+        self.check_local()
+
+    def test_manifest(self):
+        manifest = Path(self.tmp.name) / 'manifest.jsonl'
+        counts = transfer.pull_parallel('127.0.0.1', self.port, self.local, '/', manifest=manifest)
+        self.assertEqual(counts['downloaded'], 20)
+
+        # the second run works from the recorded listing, so it doesn't see the new file until a refresh
+        (self.remote / 'Download' / 'new.jpg').write_bytes(b'new')
+        self.files['new.jpg'] = b'new'
+        counts = transfer.pull_parallel('127.0.0.1', self.port, self.local, '/', manifest=manifest)
+        self.assertEqual(counts, {'downloaded': 0, 'skipped': 20, 'failed': 0})
+        transfer.pull_from_phone('127.0.0.1', self.port, self.local, '/', manifest=manifest, refresh=True)
+        self.check_local()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from cleanup.processing.unique import UniqueIDer, BiggestUnique, MatchingTime
+
+
+def loop(cls):
+    # overriding select_index forces the per-group fallback
+    class Loop(cls):
+        def select_index(self, group):
+            return super().select_index(group)
+    return Loop
+
+
+def make_df(n=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    folders = ['Lightroom', 'phone', 'backup', 'Misc', 'lightroom export']
+    mtime = pd.Timestamp('2019-01-01') + pd.to_timedelta(rng.integers(0, 20, n), unit='D')
+    df = pd.DataFrame({
+        'path': [Path(rng.choice(folders)) / f'IMG_{i % 300}.jpg' for i in range(n)],
+        'filename': [f'IMG_{i % 300}.jpg' for i in range(n)],
+        'st_size': rng.integers(0, 50, n).astype(float) * 1000,
+        'st_mtime': mtime,
+        'filename_date': mtime + pd.to_timedelta(rng.integers(0, 2, n), unit='D'),
+        'valid date': rng.random(n) > .2,
+        'included': rng.random(n) > .1,
+    })
+    df.loc[rng.random(n) > .95, 'st_size'] = np.nan
+    return df
+
+
+class UniqueTest(unittest.TestCase):
+    def check(self, cls, **kwargs):
+        for mask_cols in ([], ['included']):
+            kwargs['mask_cols'] = mask_cols
+            kwargs.setdefault('source_cols', ['filename', 'st_size'])
+            fast = cls(**kwargs).process(make_df())
+            slow = loop(cls)(**kwargs).process(make_df())
+            pd.testing.assert_frame_equal(fast, slow)
+            self.assertTrue(fast['reason'].ne('').any())
+
+    def test_first(self):
+        self.check(UniqueIDer)
+
+    def test_priority_list(self):
+        self.check(UniqueIDer, priority_keyword=['lightroom', 'phone'])
+
+    def test_priority_str(self):
+        self.check(UniqueIDer, priority_keyword='Lightroom')
+
+    def test_biggest(self):
+        self.check(BiggestUnique, source_cols=['filename'])
+
+    def test_matching_time(self):
+        self.check(MatchingTime, source_cols=['filename'])
+
+
+if __name__ == '__main__':
+    unittest.main()
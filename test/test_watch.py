@@ -0,0 +1,129 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from bench import synth
+from bench.run import make_chain
+from cleanup.df import stat_df
+from cleanup.watch import Changes, IncrementalChain, InotifyWatcher, PollingWatcher
+
+SCAN = dict(min_size=None, exif_meta=True, fast_exif=True, workers=1)
+COLS = ['unique', 'duplicated', 'reason', 'dest', 'selected_date']
+
+
+class WatcherTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        (self.root / 'a').mkdir()
+        (self.root / 'a' / 'old.jpg').write_bytes(b'x')
+        (self.root / 'a' / 'gone.jpg').write_bytes(b'x')
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def change(self):
+        (self.root / 'a' / 'new.jpg').write_bytes(b'x')
+        (self.root / 'a' / 'old.jpg').write_bytes(b'xyz')
+        (self.root / 'a' / 'gone.jpg').unlink()
+        (self.root / 'b').mkdir()
+        (self.root / 'b' / 'sub.jpg').write_bytes(b'x')
+        (self.root / 'b' / 'file.part').write_bytes(b'x')
+
+    def check(self, watcher, timeout):
+        self.change()
+        changes = Changes()
+        more = watcher.poll(timeout)
+        while more:
+            changes.add(more)
+            more = watcher.poll(timeout)
+        expected = {os.path.join(self.root, *p) for p in [('a', 'new.jpg'), ('a', 'old.jpg'), ('b', 'sub.jpg')]}
+        self.assertEqual(changes.changed, expected)
+        self.assertEqual(changes.deleted, {os.path.join(self.root, 'a', 'gone.jpg')})
+        self.assertFalse(changes.rescan)
+
+    def test_polling(self):
+        with PollingWatcher(self.root, interval=0) as watcher:
+            self.check(watcher, 0)
+
+    @unittest.skipUnless(sys.platform.startswith('linux'), 'inotify is only available on linux')
+    def test_inotify(self):
+        with InotifyWatcher(self.root) as watcher:
+            self.check(watcher, .2)
+
+
+class IncrementalTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.files = synth.make_tree(self.root, 200, sizes=(60000, 100000))
+
+    def tearDown(self) -> None:
+        self.tmp.cleanup()
+
+    def assert_matches_full_scan(self, df, **kwargs):
+        full = make_chain().process_all(stat_df(self.root, **SCAN, **kwargs))
+        self.assertEqual(sorted(df['path']), sorted(full['path']))
+        res = df.set_index('path').loc[full['path'], COLS]
+        full = full.set_index('path')[COLS]
+        for col in COLS:
+            self.assertEqual(res[col].to_list(), full[col].to_list(), col)
+
+    def test_update(self):
+        self.check_update()
+
+    def test_compact(self):
+        state = self.check_update(compact=True)
+        self.assertEqual(state.df['path'].dtype, 'string')
+        self.assertIsInstance(state.df['parent'].dtype, pd.CategoricalDtype)
+
+    def test_batches(self):
+        state = IncrementalChain(self.root, make_chain(), **SCAN)
+        jpgs = [p for p in self.files if p.suffix == '.jpg']
+        # new copies and a deleted file, without reading the DataFrame in between
+        for i, original in enumerate(jpgs[:3]):
+            copy = self.root / f'copies{i}' / original.name
+            copy.parent.mkdir()
+            shutil.copy2(original, copy)
+            state.update(Changes(changed={str(copy)}))
+        jpgs[3].unlink()
+        state.update(Changes(deleted={str(jpgs[3])}))
+        self.assertEqual(len(state.parts), 5)
+        self.assert_matches_full_scan(state.df)
+        self.assertEqual(len(state.parts), 1)
+
+    def check_update(self, **kwargs):
+        state = IncrementalChain(self.root, make_chain(), **SCAN, **kwargs)
+        df = state.df
+        included = df[df[['included_folder', 'included_filetype']].all(axis=1)]
+        original = Path(included[included['unique']]['path'].iloc[0])
+
+        # a new copy of an included file, that file itself deleted, and an unrelated file rewritten
+        copy = self.root / 'copies' / original.name
+        copy.parent.mkdir()
+        shutil.copy2(original, copy)
+        original.unlink()
+        modified = next(p for p in self.files if p.suffix == '.jpg' and p != original)
+        modified.write_bytes(synth.jpeg_bytes(datetime(2001, 2, 3), 70000))
+
+        rows = state.update(Changes(changed={str(copy), str(modified)}, deleted={str(original)}))
+        self.assertIn(copy, set(map(Path, rows['path'])))
+        self.assertLess(rows.shape[0], df.shape[0])
+        self.assertEqual(list(state.df.columns), list(df.columns))
+        self.assert_matches_full_scan(state.df, **kwargs)
+
+        # deleting a whole folder
+        shutil.rmtree(copy.parent)
+        state.update(Changes(deleted={str(copy.parent)}))
+        self.assert_matches_full_scan(state.df, **kwargs)
+        return state
+
+
+if __name__ == '__main__':
+    unittest.main()